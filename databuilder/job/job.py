@@ -2,14 +2,18 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import logging
+from typing import Optional
 
 from pyhocon import ConfigTree
 from statsd import StatsClient
 
 from databuilder import Scoped
 from databuilder.job.base_job import Job
-from databuilder.publisher.base_publisher import NoopPublisher, Publisher
+from databuilder.publisher.base_publisher import (
+    NoopPublisher, Publisher, StreamingPublisher,
+)
 from databuilder.task.base_task import Task
+from databuilder.utils.dedup import DedupRegistry, set_dedup_registry
 
 LOGGER = logging.getLogger(__name__)
 
@@ -18,6 +22,8 @@ class DefaultJob(Job):
     # Config keys
     IS_STATSD_ENABLED = 'is_statsd_enabled'
     JOB_IDENTIFIER = 'identifier'
+    # Maximum number of keys remembered by the dedup registry of the job
+    DEDUP_REGISTRY_MAX_KEYS = 'dedup_registry_max_keys'
 
     """
     Default job that expects a task, and optional publisher
@@ -26,17 +32,25 @@ class DefaultJob(Job):
     Note that job.identifier is part of metrics prefix and choose unique & readable identifier for the job.
 
     To configure statsd itself, use environment variable: https://statsd.readthedocs.io/en/v3.2.1/configure.html
+
+    Models dedupe low-cardinality nodes, such as Database, Cluster and Schema, with the dedup registry of the job,
+    which is cleared when the job is closed. A custom DedupRegistry can be provided to plug in a different strategy.
     """
 
     def __init__(self,
                  conf: ConfigTree,
                  task: Task,
-                 publisher: Publisher = NoopPublisher()) -> None:
+                 publisher: Publisher = NoopPublisher(),
+                 dedup_registry: Optional[DedupRegistry] = None) -> None:
         self.task = task
         self.conf = conf
         self.publisher = publisher
         self.scoped_conf = Scoped.get_scoped_conf(self.conf,
                                                   self.get_scope())
+        if dedup_registry is None:
+            max_keys = self.scoped_conf.get_int(DefaultJob.DEDUP_REGISTRY_MAX_KEYS, 100000)
+            dedup_registry = DedupRegistry(max_keys=max_keys)
+        self.dedup_registry = dedup_registry
         if self.scoped_conf.get_bool(DefaultJob.IS_STATSD_ENABLED, False):
             prefix = f'amundsen.databuilder.job.{self.scoped_conf.get_string(DefaultJob.JOB_IDENTIFIER)}'
             LOGGER.info('Setting statsd for job metrics with prefix: %s', prefix)
@@ -48,8 +62,18 @@ class DefaultJob(Job):
         pass
 
     def _init(self) -> None:
+        set_dedup_registry(self.dedup_registry)
+        Job.closer.register(self._close_dedup_registry)
         self.task.init(self.conf)
 
+    def _close_dedup_registry(self) -> None:
+        set_dedup_registry(None)
+        self.dedup_registry.clear()
+
+    def _init_publisher(self) -> None:
+        self.publisher.init(Scoped.get_scoped_conf(self.conf, self.publisher.get_scope()))
+        Job.closer.register(self.publisher.close)
+
     def launch(self) -> None:
         """
         Launch a job by initializing job, run task and publish.
@@ -62,13 +86,19 @@ class DefaultJob(Job):
         try:
             is_success = True
             self._init()
+            # A streaming publisher consumes what the task loads while the task is running
+            is_streaming = isinstance(self.publisher, StreamingPublisher)
+            if is_streaming:
+                self._init_publisher()
+                self.publisher.start()  # type: ignore
+
             try:
                 self.task.run()
             finally:
                 self.task.close()
 
-            self.publisher.init(Scoped.get_scoped_conf(self.conf, self.publisher.get_scope()))
-            Job.closer.register(self.publisher.close)
+            if not is_streaming:
+                self._init_publisher()
             self.publisher.publish()
 
         except Exception as e:
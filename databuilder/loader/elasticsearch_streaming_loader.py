@@ -0,0 +1,37 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+from pyhocon import ConfigTree
+
+from databuilder.loader.base_loader import Loader
+from databuilder.models.elasticsearch_document import ElasticsearchDocument
+from databuilder.publisher.elasticsearch_streaming_publisher import ElasticsearchStreamingPublisher
+
+
+class ElasticsearchStreamingLoader(Loader):
+    """
+    Hands off Elasticsearch documents to ElasticsearchStreamingPublisher, instead of writing them into a JSON file as
+    FSElasticsearchJSONLoader does. The same publisher instance should be given to the job.
+    """
+
+    def __init__(self, publisher: ElasticsearchStreamingPublisher) -> None:
+        self._publisher = publisher
+
+    def init(self, conf: ConfigTree) -> None:
+        pass
+
+    def load(self, record: ElasticsearchDocument) -> None:
+        """
+        :param record:
+        :return:
+        """
+        if not record:
+            return
+
+        if not isinstance(record, ElasticsearchDocument):
+            raise Exception("Record not of type 'ElasticsearchDocument'!")
+
+        self._publisher.put(record)
+
+    def get_scope(self) -> str:
+        return 'loader.elasticsearch_streaming'
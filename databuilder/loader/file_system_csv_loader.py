@@ -14,7 +14,8 @@ LOGGER = logging.getLogger(__name__)
 
 class FileSystemCSVLoader(Loader):
     """
-    Loader class to write csv files to Local FileSystem
+    Loader class to write csv files to Local FileSystem.
+    Rows are written through a buffer of buffer_size bytes, which is flushed when it's full or on close.
     """
 
     def init(self, conf: ConfigTree) -> None:
@@ -25,8 +26,9 @@ class FileSystemCSVLoader(Loader):
         self.conf = conf
         self.file_path = self.conf.get_string('file_path')
         self.file_mode = self.conf.get_string('mode', 'w')
+        self.buffer_size = self.conf.get_int('buffer_size', 1048576)
 
-        self.file_handler = open(self.file_path, self.file_mode)
+        self.file_handler = open(self.file_path, self.file_mode, buffering=self.buffer_size)
 
     def load(self, record: Any) -> None:
         """
@@ -43,7 +45,6 @@ class FileSystemCSVLoader(Loader):
             self.writer.writeheader()
 
         self.writer.writerow(vars(record))
-        self.file_handler.flush()
 
     def close(self) -> None:
         """
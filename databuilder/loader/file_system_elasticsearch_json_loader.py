@@ -2,19 +2,32 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import os
+from typing import Callable
 
 from pyhocon import ConfigTree
 
 from databuilder.loader.base_loader import Loader
 from databuilder.models.elasticsearch_document import ElasticsearchDocument
+from databuilder.utils import compression
+
+# Supported JSON encoders
+JSON = 'json'
+ORJSON = 'orjson'
 
 
 class FSElasticsearchJSONLoader(Loader):
     """
     Loader class to produce Elasticsearch bulk load file to Local FileSystem
+
+    The file is written through a buffer of buffer_size bytes, and optionally compressed with compression codec
+    (gzip or zstd), which ElasticsearchPublisher reads transparently. Documents are encoded with json_encoder, which
+    is either json of the standard library or orjson, a faster encoder that needs to be installed.
     """
     FILE_PATH_CONFIG_KEY = 'file_path'
     FILE_MODE_CONFIG_KEY = 'mode'
+    COMPRESSION_CONFIG_KEY = 'compression'
+    BUFFER_SIZE_CONFIG_KEY = 'buffer_size'
+    JSON_ENCODER_CONFIG_KEY = 'json_encoder'
 
     def init(self, conf: ConfigTree) -> None:
         """
@@ -28,7 +41,31 @@ class FSElasticsearchJSONLoader(Loader):
 
         file_dir = self.file_path.rsplit('/', 1)[0]
         self._ensure_directory_exists(file_dir)
-        self.file_handler = open(self.file_path, self.file_mode)
+        self.file_handler = compression.open_text_writer(
+            self.file_path,
+            codec=self.conf.get_string(FSElasticsearchJSONLoader.COMPRESSION_CONFIG_KEY, None),
+            append=self.file_mode.startswith('a'),
+            buffer_size=self.conf.get_int(FSElasticsearchJSONLoader.BUFFER_SIZE_CONFIG_KEY, 1024 * 1024))
+        self._encode = self._get_encoder(self.conf.get_string(FSElasticsearchJSONLoader.JSON_ENCODER_CONFIG_KEY, JSON))
+
+    @staticmethod
+    def _get_encoder(json_encoder: str) -> Callable[[ElasticsearchDocument], str]:
+        """
+        :param json_encoder: Name of the JSON encoder
+        :return: A function that encodes a document into a JSON line
+        """
+        if json_encoder == JSON:
+            return lambda record: record.to_json()
+
+        if json_encoder == ORJSON:
+            try:
+                import orjson
+            except ImportError:
+                raise ImportError('orjson is required for orjson encoder. '
+                                  'Install it with: pip install amundsen-databuilder[orjson]')
+            return lambda record: orjson.dumps(record.to_dict(), option=orjson.OPT_APPEND_NEWLINE).decode('utf-8')
+
+        raise Exception(f'Unsupported JSON encoder: {json_encoder}. Supported encoders: {[JSON, ORJSON]}')
 
     def _ensure_directory_exists(self, path: str) -> None:
         """
@@ -53,8 +90,7 @@ class FSElasticsearchJSONLoader(Loader):
         if not isinstance(record, ElasticsearchDocument):
             raise Exception("Record not of type 'ElasticsearchDocument'!")
 
-        self.file_handler.write(record.to_json())
-        self.file_handler.flush()
+        self.file_handler.write(self._encode(record))
 
     def close(self) -> None:
         """
@@ -5,9 +5,10 @@ import csv
 import logging
 import os
 import shutil
-from csv import DictWriter
+import tempfile
+import zlib
 from typing import (
-    Any, Dict, FrozenSet,
+    IO, Any, Dict, FrozenSet, List, Optional, Tuple, Union, cast,
 )
 
 from pyhocon import ConfigFactory, ConfigTree
@@ -15,34 +16,105 @@ from pyhocon import ConfigFactory, ConfigTree
 from databuilder.job.base_job import Job
 from databuilder.loader.base_loader import Loader
 from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.publisher.neo4j_csv_publisher import (
+    NULL_MARKER, NULLABLE_SUFFIX, SHARD_FILE_NAME_FORMAT,
+)
 from databuilder.serializers import neo4_serializer
+from databuilder.utils import compression, parquet
 from databuilder.utils.closer import Closer
+from databuilder.utils.dedup import RecordDeduplicator
+from databuilder.utils.file_handle_pool import FileHandlePool, PooledDictWriter
+from databuilder.utils.schema_unifying_writer import SchemaUnifyingWriter
 
 LOGGER = logging.getLogger(__name__)
 
+_Writer = Union[PooledDictWriter, parquet.ParquetRowWriter, SchemaUnifyingWriter]
+
 
 class FsNeo4jCSVLoader(Loader):
     """
     Write node and relationship CSV file(s) that can be consumed by
     Neo4jCsvPublisher.
     It assumes that the record it consumes is instance of Neo4jCsvSerializable
+
+    Files can be compressed with gzip or zstd (e.g: Table_0.csv.gz), which Neo4jCsvPublisher reads transparently.
+
+    With file_format parquet, files are written in Parquet (e.g: Table_0.parquet) with the same grouping and columns,
+    where values keep their native types. Neo4jCsvPublisher reads them in record batches. CSV is the default.
+
+    With dedup_nodes, a node row that is an exact duplicate of a row written before (same label, key and properties)
+    is not written again. Duplicates are tracked exactly up to dedup_max_exact_keys rows, and then with a Bloom filter
+    which could drop a new row with the probability of dedup_bloom_filter_error_rate.
+
+    With shard_counts (or default_shard_count), each file is split into shards by hash of KEY for nodes, and by hash
+    of START_KEY for relations, using the shard count of the node label, or of the start label for relations.
+    The shard index is in the file name (e.g: Column_0_shard_3.csv), so that Neo4jCsvPublisher can publish the shards
+    of a label concurrently as they never share a node.
+
+    At most max_open_files CSV files are kept open. When there are more files than that, e.g: with many shards, the
+    least recently used file is closed and reopened in append mode later. Files are written through a buffer of
+    write_buffer_size bytes, and are not flushed per row. The limit does not apply to Parquet files, which can't be
+    reopened to be appended: each of them is open from its first row group until the loader is closed, and a warning
+    is logged when there are more of them than max_open_files.
+
+    By default, a file is created per distinct set of columns of the label, which can fan out into many small files
+    when records have optional attributes. With unify_schema, there is a single file per label (e.g: Table.csv) with the
+    union of the columns. Columns absent from some records have NULLABLE_SUFFIX (e.g: description:NULLABLE), and are
+    NULL_MARKER (null in Parquet) where absent, which Neo4jCsvPublisher does not set. Rows are spooled to a temporary
+    directory and the files are written on close.
     """
     # Config keys
     NODE_DIR_PATH = 'node_dir_path'
     RELATION_DIR_PATH = 'relationship_dir_path'
     FORCE_CREATE_DIR = 'force_create_directory'
     SHOULD_DELETE_CREATED_DIR = 'delete_created_directories'
+    # Compression codec of the files, either gzip or zstd. Files are not compressed if not provided.
+    COMPRESSION_CODEC = 'compression_codec'
+    # Compression level. Default level of the codec is used if not provided.
+    COMPRESSION_LEVEL = 'compression_level'
+    # File format, either csv or parquet.
+    FILE_FORMAT = 'file_format'
+
+    # A boolean flag to skip node rows that are exact duplicates of the ones already written
+    DEDUP_NODES = 'dedup_nodes'
+    # Number of rows tracked exactly before falling back to Bloom filter
+    DEDUP_MAX_EXACT_KEYS = 'dedup_max_exact_keys'
+    # Expected number of rows tracked by Bloom filter, and its false positive rate
+    DEDUP_BLOOM_FILTER_CAPACITY = 'dedup_bloom_filter_capacity'
+    DEDUP_BLOOM_FILTER_ERROR_RATE = 'dedup_bloom_filter_error_rate'
+    # A dict of label to number of shards. Labels not in the dict use default_shard_count.
+    SHARD_COUNTS = 'shard_counts'
+    DEFAULT_SHARD_COUNT = 'default_shard_count'
+    # Maximum number of CSV files open at the same time
+    MAX_OPEN_FILES = 'max_open_files'
+    # Write buffer size in bytes of each uncompressed CSV file
+    WRITE_BUFFER_SIZE = 'write_buffer_size'
+    # A boolean flag to write a single file per label with the union of the columns
+    UNIFY_SCHEMA = 'unify_schema'
+
+    CSV_FORMAT = 'csv'
 
     _DEFAULT_CONFIG = ConfigFactory.from_dict({
         SHOULD_DELETE_CREATED_DIR: True,
-        FORCE_CREATE_DIR: False
+        FORCE_CREATE_DIR: False,
+        FILE_FORMAT: CSV_FORMAT,
+        DEDUP_NODES: False,
+        DEDUP_MAX_EXACT_KEYS: 1000000,
+        DEDUP_BLOOM_FILTER_CAPACITY: 10000000,
+        DEDUP_BLOOM_FILTER_ERROR_RATE: 0.000001,
+        DEFAULT_SHARD_COUNT: 1,
+        MAX_OPEN_FILES: 256,
+        WRITE_BUFFER_SIZE: 262144,
+        UNIFY_SCHEMA: False
     })
 
     def __init__(self) -> None:
-        self._node_file_mapping: Dict[Any, DictWriter] = {}
-        self._relation_file_mapping: Dict[Any, DictWriter] = {}
+        self._node_file_mapping: Dict[Any, _Writer] = {}
+        self._relation_file_mapping: Dict[Any, _Writer] = {}
         self._keys: Dict[FrozenSet[str], int] = {}
+        self._header_keys: Dict[Tuple[str, ...], int] = {}
         self._closer = Closer()
+        self._node_deduplicator: Optional[RecordDeduplicator] = None
 
     def init(self, conf: ConfigTree) -> None:
         """
@@ -61,6 +133,40 @@ class FsNeo4jCSVLoader(Loader):
         self._delete_created_dir = \
             conf.get_bool(FsNeo4jCSVLoader.SHOULD_DELETE_CREATED_DIR)
         self._force_create_dir = conf.get_bool(FsNeo4jCSVLoader.FORCE_CREATE_DIR)
+        self._compression_codec = conf.get_string(FsNeo4jCSVLoader.COMPRESSION_CODEC, None)
+        self._compression_level = conf.get_int(FsNeo4jCSVLoader.COMPRESSION_LEVEL, None)
+        self._file_format = conf.get_string(FsNeo4jCSVLoader.FILE_FORMAT)
+        if self._file_format == parquet.PARQUET:
+            self._file_extension = parquet.PARQUET_EXTENSION
+        elif self._file_format == FsNeo4jCSVLoader.CSV_FORMAT:
+            self._file_extension = '.csv' + compression.get_extension(self._compression_codec)
+        else:
+            raise Exception(f'Unsupported file format: {self._file_format}')
+
+        if conf.get_bool(FsNeo4jCSVLoader.DEDUP_NODES):
+            self._node_deduplicator = RecordDeduplicator(
+                max_exact_keys=conf.get_int(FsNeo4jCSVLoader.DEDUP_MAX_EXACT_KEYS),
+                bloom_filter_capacity=conf.get_int(FsNeo4jCSVLoader.DEDUP_BLOOM_FILTER_CAPACITY),
+                bloom_filter_error_rate=conf.get_float(FsNeo4jCSVLoader.DEDUP_BLOOM_FILTER_ERROR_RATE))
+
+        self._shard_counts: Dict[str, int] = {label: int(count) for label, count
+                                              in conf.get(FsNeo4jCSVLoader.SHARD_COUNTS, {}).items()}
+        self._default_shard_count = conf.get_int(FsNeo4jCSVLoader.DEFAULT_SHARD_COUNT)
+        self._write_buffer_size = conf.get_int(FsNeo4jCSVLoader.WRITE_BUFFER_SIZE)
+        self._max_open_files = conf.get_int(FsNeo4jCSVLoader.MAX_OPEN_FILES)
+        self._file_pool = FileHandlePool(max_open_files=self._max_open_files, opener=self._open_file)
+        self._parquet_file_count = 0
+        self._closer.register(self._file_pool.close)
+        self._unify_schema = conf.get_bool(FsNeo4jCSVLoader.UNIFY_SCHEMA)
+        # Rows are written as values straight from the graph records, unless the dict of the row is needed
+        self._write_relation_values = self._file_format == FsNeo4jCSVLoader.CSV_FORMAT and not self._unify_schema
+        self._write_node_values = self._write_relation_values and not self._node_deduplicator
+        if self._unify_schema:
+            self._spool_dir = tempfile.mkdtemp(prefix='fs_neo4j_csv_loader_spool_')
+            self._closer.register(lambda: shutil.rmtree(self._spool_dir, ignore_errors=True))
+            self._spool_pool = FileHandlePool(max_open_files=conf.get_int(FsNeo4jCSVLoader.MAX_OPEN_FILES),
+                                              opener=self._open_spool_file)
+            self._closer.register(self._spool_pool.close)
         self._create_directory(self._node_dir)
         self._create_directory(self._relation_dir)
 
@@ -110,9 +216,29 @@ class FsNeo4jCSVLoader(Loader):
 
         node = csv_serializable.next_node()
         while node:
+            if self._write_node_values:
+                self._write_values(neo4_serializer.get_node_header(node),
+                                   neo4_serializer.get_node_values(node),
+                                   self._node_file_mapping,
+                                   node.label,
+                                   self._get_shard(node.label, node.key),
+                                   self._node_dir,
+                                   is_header_in_file_name=True)
+                node = csv_serializable.next_node()
+                continue
+
             node_dict = neo4_serializer.serialize_node(node)
-            key = (node.label, self._make_key(node_dict))
-            file_suffix = '{}_{}'.format(*key)
+            if self._node_deduplicator and self._node_deduplicator.is_duplicate(node_dict):
+                node = csv_serializable.next_node()
+                continue
+
+            shard = self._get_shard(node.label, node.key)
+            if self._unify_schema:
+                key: Tuple = (node.label, shard)
+                file_suffix = self._get_shard_file_suffix(node.label, shard)
+            else:
+                key = (node.label, self._make_key(node_dict), shard)
+                file_suffix = self._get_shard_file_suffix('{}_{}'.format(*key), shard)
             node_writer = self._get_writer(node_dict,
                                            self._node_file_mapping,
                                            key,
@@ -123,13 +249,26 @@ class FsNeo4jCSVLoader(Loader):
 
         relation = csv_serializable.next_relation()
         while relation:
+            if self._write_relation_values:
+                self._write_values(neo4_serializer.get_relationship_header(relation),
+                                   neo4_serializer.get_relationship_values(relation),
+                                   self._relation_file_mapping,
+                                   f'{relation.start_label}_{relation.end_label}_{relation.type}',
+                                   self._get_shard(relation.start_label, relation.start_key),
+                                   self._relation_dir,
+                                   is_header_in_file_name=False)
+                relation = csv_serializable.next_relation()
+                continue
+
             relation_dict = neo4_serializer.serialize_relationship(relation)
+            shard = self._get_shard(relation.start_label, relation.start_key)
             key2 = (relation.start_label,
                     relation.end_label,
                     relation.type,
-                    self._make_key(relation_dict))
+                    None if self._unify_schema else self._make_key(relation_dict),
+                    shard)
 
-            file_suffix = f'{key2[0]}_{key2[1]}_{key2[2]}'
+            file_suffix = self._get_shard_file_suffix(f'{key2[0]}_{key2[1]}_{key2[2]}', shard)
             relation_writer = self._get_writer(relation_dict,
                                                self._relation_file_mapping,
                                                key2,
@@ -138,13 +277,52 @@ class FsNeo4jCSVLoader(Loader):
             relation_writer.writerow(relation_dict)
             relation = csv_serializable.next_relation()
 
+    def _write_values(self,
+                      header: Tuple[str, ...],
+                      values: List[Any],
+                      file_mapping: Dict[Any, _Writer],
+                      name: str,
+                      shard: Optional[int],
+                      dir_path: str,
+                      is_header_in_file_name: bool) -> None:
+        """
+        Writes a row of values into the CSV file of the header, without building a dict of the row.
+        The files are the same as the ones written from the dicts of neo4_serializer.
+        :param header: Header tuple of neo4_serializer, shared by the records of the same shape
+        :param values: Values in the order of the header
+        :param file_mapping:
+        :param name: Label of node, or start label, end label and type of relation
+        :param shard:
+        :param dir_path:
+        :param is_header_in_file_name: If True, the numeric key of the header is in the file name like node files
+        :return:
+        """
+        header_key = self._header_keys.get(header)
+        if header_key is None:
+            header_key = self._header_keys[header] = self._make_key(header)
+
+        key = (name, header_key, shard)
+        writer = cast(PooledDictWriter, file_mapping.get(key))
+        if writer is None:
+            file_name = f'{name}_{header_key}' if is_header_in_file_name else name
+            writer = cast(PooledDictWriter, self._get_writer(header,
+                                                             file_mapping,
+                                                             key,
+                                                             dir_path,
+                                                             self._get_shard_file_suffix(file_name, shard)))
+
+        if writer.fieldnames == header:
+            writer.writevalues(values)
+        else:
+            writer.writerow(dict(zip(header, values)))
+
     def _get_writer(self,
-                    csv_record_dict: Dict[str, Any],
-                    file_mapping: Dict[Any, DictWriter],
+                    csv_record_dict: Union[Dict[str, Any], Tuple[str, ...]],
+                    file_mapping: Dict[Any, _Writer],
                     key: Any,
                     dir_path: str,
                     file_suffix: str
-                    ) -> DictWriter:
+                    ) -> _Writer:
         """
         Finds a writer based on csv record, key.
         If writer does not exist, it's creates a csv writer and update the
@@ -162,30 +340,81 @@ class FsNeo4jCSVLoader(Loader):
 
         LOGGER.info('Creating file for %s', key)
 
-        file_out = open(f'{dir_path}/{file_suffix}.csv', 'w', encoding='utf8')
-        writer = csv.DictWriter(file_out, fieldnames=csv_record_dict.keys(),
-                                quoting=csv.QUOTE_NONNUMERIC)
-
-        def file_out_close() -> None:
-            LOGGER.info('Closing file IO %s', file_out)
-            file_out.close()
-        self._closer.register(file_out_close)
-
-        writer.writeheader()
+        path = f'{dir_path}/{file_suffix}{self._file_extension}'
+        if self._unify_schema:
+            spool_index = len(self._node_file_mapping) + len(self._relation_file_mapping)
+            writer = SchemaUnifyingWriter(spool_path=os.path.join(self._spool_dir, f'{spool_index}.spool'),
+                                          spool_pool=self._spool_pool,
+                                          open_output=lambda columns: self._open_writer(path, columns),
+                                          null_value=None if self._file_format == parquet.PARQUET else NULL_MARKER,
+                                          nullable_suffix=NULLABLE_SUFFIX)
+        else:
+            writer = self._open_writer(path, list(dict.fromkeys(csv_record_dict)))
+
+        self._closer.register(writer.close)
         file_mapping[key] = writer
+        return writer
 
+    def _open_writer(self, path: str, columns: List[str]) -> Union[PooledDictWriter, parquet.ParquetRowWriter]:
+        """
+        Creates the file with the columns
+        :param path:
+        :param columns:
+        :return: A writer of the file
+        """
+        if self._file_format == parquet.PARQUET:
+            self._parquet_file_count += 1
+            if self._parquet_file_count == self._max_open_files + 1:
+                LOGGER.warning('Writing more than %i Parquet files, which are not limited by %s as they cannot be '
+                               'reopened. Each of them can be open at the same time.',
+                               self._max_open_files, FsNeo4jCSVLoader.MAX_OPEN_FILES)
+            return parquet.ParquetRowWriter(path,
+                                            compression=self._compression_codec,
+                                            compression_level=self._compression_level)
+
+        writer = PooledDictWriter(self._file_pool, path, fieldnames=columns, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writeheader()
         return writer
 
+    def _open_spool_file(self, path: str, append: bool) -> IO:
+        return open(path, 'ab' if append else 'wb', buffering=self._write_buffer_size)
+
+    def _open_file(self, path: str, append: bool) -> IO:
+        return compression.open_text_writer(path,
+                                            codec=self._compression_codec,
+                                            level=self._compression_level,
+                                            append=append,
+                                            buffer_size=self._write_buffer_size)
+
     def close(self) -> None:
         """
         Any closeable callable registered in _closer, it will close.
         :return:
         """
+        if self._node_deduplicator:
+            LOGGER.info('Suppressed %i duplicate node rows', self._node_deduplicator.suppressed_count)
         self._closer.close()
 
     def get_scope(self) -> str:
         return "loader.filesystem_csv_neo4j"
 
-    def _make_key(self, record_dict: Dict[str, Any]) -> int:
+    def _get_shard(self, label: str, key: str) -> Optional[int]:
+        """
+        Finds the shard of the node by the hash of its key, which is stable across processes.
+        :param label:
+        :param key:
+        :return: Shard index, or None if the label is not sharded
+        """
+        shard_count = self._shard_counts.get(label, self._default_shard_count)
+        if shard_count <= 1:
+            return None
+
+        return zlib.crc32(str(key).encode('utf-8')) % shard_count
+
+    @staticmethod
+    def _get_shard_file_suffix(file_suffix: str, shard: Optional[int]) -> str:
+        return file_suffix if shard is None else SHARD_FILE_NAME_FORMAT.format(file_suffix, shard)
+
+    def _make_key(self, record_dict: Union[Dict[str, Any], Tuple[str, ...]]) -> int:
         """ Each unique set of record keys is assigned an increasing numeric key """
-        return self._keys.setdefault(frozenset(record_dict.keys()), len(self._keys))
+        return self._keys.setdefault(frozenset(record_dict), len(self._keys))
@@ -0,0 +1,83 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import sys
+from typing import List
+
+from pyhocon import ConfigFactory, ConfigTree
+
+from databuilder.loader.base_loader import Loader
+from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.publisher.neo4j_streaming_publisher import Neo4jStreamingPublisher
+from databuilder.serializers import neo4_serializer
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Neo4jStreamingLoader(Loader):
+    """
+    Hands off nodes and relationships of GraphSerializable records to Neo4jStreamingPublisher in batches, instead of
+    writing them into CSV files. The same publisher instance should be given to the job.
+
+    Records are never split across batches, so that a relationship is published along with the nodes of its record.
+    A batch is handed off once it has batch_size nodes and relationships, which blocks while the queue of the publisher
+    is full.
+    """
+    # Config keys
+    BATCH_SIZE = 'batch_size'
+
+    _DEFAULT_CONFIG = ConfigFactory.from_dict({
+        BATCH_SIZE: 1000
+    })
+
+    def __init__(self, publisher: Neo4jStreamingPublisher) -> None:
+        self._publisher = publisher
+        self._nodes: List[dict] = []
+        self._relations: List[dict] = []
+
+    def init(self, conf: ConfigTree) -> None:
+        conf = conf.with_fallback(Neo4jStreamingLoader._DEFAULT_CONFIG)
+        self._batch_size = conf.get_int(Neo4jStreamingLoader.BATCH_SIZE)
+
+    def load(self, csv_serializable: GraphSerializable) -> None:
+        node = csv_serializable.next_node()
+        while node:
+            self._nodes.append(neo4_serializer.serialize_node(node))
+            node = csv_serializable.next_node()
+
+        relation = csv_serializable.next_relation()
+        while relation:
+            self._relations.append(neo4_serializer.serialize_relationship(relation))
+            relation = csv_serializable.next_relation()
+
+        if len(self._nodes) + len(self._relations) >= self._batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._nodes and not self._relations:
+            return
+
+        self._publisher.put(self._nodes, self._relations)
+        self._nodes = []
+        self._relations = []
+
+    def close(self) -> None:
+        """
+        Hands off the remaining records, unless the publisher has been aborted or the task is failing, e.g: the
+        extractor has raised. The task closes the loader while the error propagates, and the records would be rolled
+        back anyway.
+        :return:
+        """
+        if self._publisher.is_aborted() or sys.exc_info()[0] is not None:
+            if self._nodes or self._relations:
+                LOGGER.warning('Dropping %i nodes and %i relations, as the job has failed',
+                               len(self._nodes), len(self._relations))
+            self._nodes = []
+            self._relations = []
+            return
+
+        self._flush()
+
+    def get_scope(self) -> str:
+        return 'loader.neo4j_streaming'
@@ -8,6 +8,13 @@ from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
 
+# Patterns of the start keys by the start label, compiled once rather than per BadgeMetadata
+_KEY_PATTERNS = {
+    'Table': re.compile('[a-z]+://[a-zA-Z0-9_.-]+.[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+'),
+    'Dashboard': re.compile('[a-z]+_dashboard://[a-zA-Z0-9_.-]+.[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+'),
+    'Column': re.compile('[a-z]+://[a-zA-Z0-9_.-]+.[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+'),
+}
+
 
 class Badge:
     def __init__(self, name: str, category: str):
@@ -43,17 +50,9 @@ class BadgeMetadata(GraphSerializable):
                  ):
         self.badges = badges
 
-        table_key_pattern = re.compile('[a-z]+://[a-zA-Z0-9_.-]+.[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+')
-        dashboard_key_pattern = re.compile('[a-z]+_dashboard://[a-zA-Z0-9_.-]+.[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+')
-        column_key_pattern = re.compile('[a-z]+://[a-zA-Z0-9_.-]+.[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+')
-        map_label_to_key_pattern = {
-            'Table': table_key_pattern,
-            'Dashboard': dashboard_key_pattern,
-            'Column': column_key_pattern,
-        }
-        if start_label in map_label_to_key_pattern.keys():
+        if start_label in _KEY_PATTERNS:
             self.start_label = start_label
-            if map_label_to_key_pattern[start_label].match(start_key):
+            if _KEY_PATTERNS[start_label].match(start_key):
                 self.start_key = start_key
             else:
                 raise Exception(start_key + ' does not match the key pattern for a ' + start_label)
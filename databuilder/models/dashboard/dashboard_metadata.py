@@ -53,9 +53,6 @@ class DashboardMetadata(GraphSerializable):
     DASHBOARD_TAG_RELATION_TYPE = 'TAG'
     TAG_DASHBOARD_RELATION_TYPE = 'TAG_OF'
 
-    serialized_nodes: Set[Any] = set()
-    serialized_rels: Set[Any] = set()
-
     def __init__(self,
                  dashboard_group: str,
                  dashboard_name: str,
@@ -3,6 +3,9 @@
 
 import json
 from abc import ABCMeta
+from typing import (
+    Any, Dict, List, Tuple,
+)
 
 
 class ElasticsearchDocument:
@@ -12,11 +15,25 @@ class ElasticsearchDocument:
     """
     __metaclass__ = ABCMeta
 
+    # Sorted field names by the class and its field names in the order of assignment. Documents of a class have the
+    # same fields in the same order, thus the fields are sorted once per class rather than per document.
+    _sorted_fields: Dict[Tuple[type, Tuple[str, ...]], List[str]] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: Fields of the document in the order of field name
+        """
+        fields = self.__dict__
+        cache_key = (type(self), tuple(fields))
+        sorted_fields = ElasticsearchDocument._sorted_fields.get(cache_key)
+        if sorted_fields is None:
+            sorted_fields = ElasticsearchDocument._sorted_fields[cache_key] = sorted(fields)
+        return {k: fields[k] for k in sorted_fields}
+
     def to_json(self) -> str:
         """
         Convert object to json
         :return:
         """
-        obj_dict = {k: v for k, v in sorted(self.__dict__.items())}
-        data = json.dumps(obj_dict) + "\n"
+        data = json.dumps(self.to_dict()) + "\n"
         return data
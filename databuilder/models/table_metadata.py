@@ -3,7 +3,7 @@
 
 import copy
 from typing import (
-    Any, Dict, Iterable, Iterator, List, Optional, Set, Union,
+    Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union,
 )
 
 from databuilder.models.badge import Badge, BadgeMetadata
@@ -12,6 +12,7 @@ from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
 from databuilder.models.schema import schema_constant
+from databuilder.utils.dedup import get_dedup_registry
 
 DESCRIPTION_NODE_LABEL_VAL = 'Description'
 DESCRIPTION_NODE_LABEL = DESCRIPTION_NODE_LABEL_VAL
@@ -229,10 +230,6 @@ class TableMetadata(GraphSerializable):
     TABLE_TAG_RELATION_TYPE = 'TAGGED_BY'
     TAG_TABLE_RELATION_TYPE = 'TAG'
 
-    # Only for deduping database, cluster, and schema (table and column will be always processed)
-    serialized_nodes_keys: Set[Any] = set()
-    serialized_rels_keys: Set[Any] = set()
-
     def __init__(self,
                  database: str,
                  cluster: str,
@@ -271,6 +268,9 @@ class TableMetadata(GraphSerializable):
         if kwargs:
             self.attrs = copy.deepcopy(kwargs)
 
+        self._key_cache_identity: Optional[Tuple[str, str, str, str]] = None
+        self._key_cache: Dict[Any, str] = {}
+
         self._node_iterator = self._create_next_node()
         self._relation_iterator = self._create_next_relation()
 
@@ -278,11 +278,30 @@ class TableMetadata(GraphSerializable):
         return f'TableMetadata({self.database!r}, {self.cluster!r}, {self.schema!r}, {self.name!r} ' \
                f'{self.description!r}, {self.columns!r}, {self.is_view!r}, {self.tags!r})'
 
+    def _get_cached_key(self, name: Any, compute: Callable[[], str]) -> str:
+        """
+        Keys are built many times per table while its nodes and relations are serialized, e.g: the table key is a part
+        of every column relation. They are computed once per instance, and recomputed only if the database, cluster,
+        schema or name has been changed, e.g: by a transformer.
+        :param name: Name of the key in the cache
+        :param compute: Computes the key on cache miss
+        :return:
+        """
+        identity = (self.database, self.cluster, self.schema, self.name)
+        if identity != self._key_cache_identity:
+            self._key_cache_identity = identity
+            self._key_cache = {}
+
+        key = self._key_cache.get(name)
+        if key is None:
+            key = self._key_cache[name] = compute()
+        return key
+
     def _get_table_key(self) -> str:
-        return TableMetadata.TABLE_KEY_FORMAT.format(db=self.database,
-                                                     cluster=self.cluster,
-                                                     schema=self.schema,
-                                                     tbl=self.name)
+        return self._get_cached_key('table', lambda: TableMetadata.TABLE_KEY_FORMAT.format(db=self.database,
+                                                                                           cluster=self.cluster,
+                                                                                           schema=self.schema,
+                                                                                           tbl=self.name))
 
     def _get_table_description_key(self, description: DescriptionMetadata) -> str:
         return TableMetadata.TABLE_DESCRIPTION_FORMAT.format(db=self.database,
@@ -292,24 +311,25 @@ class TableMetadata(GraphSerializable):
                                                              description_id=description.get_description_id())
 
     def _get_database_key(self) -> str:
-        return TableMetadata.DATABASE_KEY_FORMAT.format(db=self.database)
+        return self._get_cached_key('database', lambda: TableMetadata.DATABASE_KEY_FORMAT.format(db=self.database))
 
     def _get_cluster_key(self) -> str:
-        return TableMetadata.CLUSTER_KEY_FORMAT.format(db=self.database,
-                                                       cluster=self.cluster)
+        return self._get_cached_key('cluster', lambda: TableMetadata.CLUSTER_KEY_FORMAT.format(db=self.database,
+                                                                                               cluster=self.cluster))
 
     def _get_schema_key(self) -> str:
-        return TableMetadata.SCHEMA_KEY_FORMAT.format(db=self.database,
-                                                      cluster=self.cluster,
-                                                      schema=self.schema)
+        return self._get_cached_key('schema', lambda: TableMetadata.SCHEMA_KEY_FORMAT.format(db=self.database,
+                                                                                             cluster=self.cluster,
+                                                                                             schema=self.schema))
 
     def _get_col_key(self, col: ColumnMetadata) -> str:
-        return ColumnMetadata.COLUMN_KEY_FORMAT.format(db=self.database,
-                                                       cluster=self.cluster,
-                                                       schema=self.schema,
-                                                       tbl=self.name,
-                                                       col=col.name,
-                                                       badges=col.badges)
+        return self._get_cached_key(('column', col.name),
+                                    lambda: ColumnMetadata.COLUMN_KEY_FORMAT.format(db=self.database,
+                                                                                    cluster=self.cluster,
+                                                                                    schema=self.schema,
+                                                                                    tbl=self.name,
+                                                                                    col=col.name,
+                                                                                    badges=col.badges))
 
     def _get_col_description_key(self,
                                  col: ColumnMetadata,
@@ -392,9 +412,10 @@ class TableMetadata(GraphSerializable):
             )
         ]
 
+        # Only database, cluster, and schema are deduped (table and column will be always processed)
+        dedup_registry = get_dedup_registry()
         for node_tuple in others:
-            if node_tuple.key not in TableMetadata.serialized_nodes_keys:
-                TableMetadata.serialized_nodes_keys.add(node_tuple.key)
+            if dedup_registry.is_new((node_tuple.label, node_tuple.key)):
                 yield node_tuple
 
     def _create_table_node(self) -> GraphNode:
@@ -497,7 +518,7 @@ class TableMetadata(GraphSerializable):
             )
         ]
 
+        dedup_registry = get_dedup_registry()
         for rel_tuple in others:
-            if (rel_tuple.start_key, rel_tuple.end_key, rel_tuple.type) not in TableMetadata.serialized_rels_keys:
-                TableMetadata.serialized_rels_keys.add((rel_tuple.start_key, rel_tuple.end_key, rel_tuple.type))
+            if dedup_registry.is_new((rel_tuple.start_key, rel_tuple.end_key, rel_tuple.type)):
                 yield rel_tuple
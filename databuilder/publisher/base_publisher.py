@@ -62,6 +62,22 @@ class Publisher(Scoped):
         return 'publisher'
 
 
+class StreamingPublisher(Publisher):
+    """
+    A Publisher that publishes records while the task is running, instead of reading what the task has written after
+    it's finished. DefaultJob initializes it and calls start() before running the task, and publish() once the task is
+    finished, which waits until everything is published.
+    """
+
+    @abc.abstractmethod
+    def start(self) -> None:
+        """
+        Starts consuming the records in the background
+        :return: None
+        """
+        pass
+
+
 class NoopPublisher(Publisher):
     def __init__(self) -> None:
         super(NoopPublisher, self).__init__()
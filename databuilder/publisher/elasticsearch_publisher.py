@@ -1,15 +1,24 @@
 # Copyright Contributors to the Amundsen project.
 # SPDX-License-Identifier: Apache-2.0
 
+import itertools
 import json
 import logging
-from typing import List
+import os
+from typing import (
+    Any, Dict, List, Optional, Set,
+)
 
 from elasticsearch.exceptions import NotFoundError
 from pyhocon import ConfigTree
 
 from databuilder.publisher.base_publisher import Publisher
 from databuilder.publisher.elasticsearch_constants import TABLE_ELASTICSEARCH_INDEX_MAPPING
+from databuilder.utils import compression
+from databuilder.utils.document_manifest import (
+    document_digest, read_manifest, write_manifest,
+)
+from databuilder.utils.elasticsearch_bulk import BulkIndexer, is_succeeded
 
 LOGGER = logging.getLogger(__name__)
 
@@ -22,6 +31,23 @@ class ElasticsearchPublisher(Publisher):
     and traffic is routed to new index.
 
     Old index is deleted after the alias swap is complete
+
+    With streaming mode, the JSON file is read lazily line by line instead of being loaded into memory, and the
+    documents are sent in bulk requests from thread_count threads by BulkIndexer. Each bulk request has up to
+    batch_size documents and max_chunk_bytes bytes. Documents failed with a retryable status are retried with backoff,
+    and the publish fails before the alias swap if the ratio of failed documents exceeds max_error_ratio.
+
+    With bulk optimized mode, the new index is loaded with refresh disabled and no replicas, which are restored once
+    the load is complete. The new index is optionally force merged, and the alias is swapped only after the new index
+    reaches wait_for_status, yellow by default. Green waits until all the restored replicas are allocated as well.
+
+    With manifest_path, documents are indexed with the value of their key_field as the id, and the digest of each
+    published document is kept in the manifest file. Then, incremental mode writes into the index behind the alias
+    instead of rebuilding it: only the documents changed since the previous run are indexed, and the ones missing
+    from the current extraction are deleted. It falls back to a full rebuild if there's no manifest or no index behind the alias yet.
+    A full rebuild (incremental mode off) is still needed for a change of mapping, and it also refreshes the manifest.
+    Documents failed to be indexed or deleted are recorded in the manifest as of the previous run, or not at all, so
+    that the next run sends them again.
     """
     FILE_PATH_CONFIG_KEY = 'file_path'
     FILE_MODE_CONFIG_KEY = 'mode'
@@ -35,16 +61,55 @@ class ElasticsearchPublisher(Publisher):
     # config to control how many max documents to publish at a time
     ELASTICSEARCH_PUBLISHER_BATCH_SIZE = 'batch_size'
 
+    # config for streaming mode
+    ELASTICSEARCH_STREAMING_CONFIG_KEY = 'streaming'
+    ELASTICSEARCH_THREAD_COUNT_CONFIG_KEY = 'thread_count'
+    ELASTICSEARCH_MAX_CHUNK_BYTES_CONFIG_KEY = 'max_chunk_bytes'
+    ELASTICSEARCH_MAX_RETRIES_CONFIG_KEY = 'max_retries'
+    ELASTICSEARCH_INITIAL_BACKOFF_CONFIG_KEY = 'initial_backoff'
+    ELASTICSEARCH_MAX_ERROR_RATIO_CONFIG_KEY = 'max_error_ratio'
+
+    # config for bulk optimized mode
+    ELASTICSEARCH_BULK_OPTIMIZED_CONFIG_KEY = 'bulk_optimized'
+    # Number of segments to force merge the new index into after the load. 0 to skip force merge.
+    ELASTICSEARCH_FORCE_MERGE_MAX_SEGMENTS_CONFIG_KEY = 'force_merge_max_segments'
+    # Timeout in seconds of each of force merge and waiting for the health status of the new index
+    ELASTICSEARCH_COMPLETION_TIMEOUT_SEC_CONFIG_KEY = 'completion_timeout_sec'
+    # Health status of the new index to wait for before the alias swap. Yellow by default, as replicas are never
+    # assigned on a single node cluster, thus the index never becomes green.
+    ELASTICSEARCH_WAIT_FOR_STATUS_CONFIG_KEY = 'wait_for_status'
+
+    # config for incremental mode
+    ELASTICSEARCH_INCREMENTAL_CONFIG_KEY = 'incremental'
+    ELASTICSEARCH_MANIFEST_PATH_CONFIG_KEY = 'manifest_path'
+    # Field of the document which is unique, and used as the id of the document. It's required with manifest_path, as
+    # it varies by document type. e.g: key for TableESDocument, uri for DashboardESDocument, email for UserESDocument
+    ELASTICSEARCH_KEY_FIELD_CONFIG_KEY = 'key_field'
+
     DEFAULT_ELASTICSEARCH_INDEX_MAPPING = TABLE_ELASTICSEARCH_INDEX_MAPPING
 
     def __init__(self) -> None:
         super(ElasticsearchPublisher, self).__init__()
 
     def init(self, conf: ConfigTree) -> None:
-        self.conf = conf
+        self._init_elasticsearch(conf)
 
         self.file_path = self.conf.get_string(ElasticsearchPublisher.FILE_PATH_CONFIG_KEY)
         self.file_mode = self.conf.get_string(ElasticsearchPublisher.FILE_MODE_CONFIG_KEY, 'w')
+        if self.file_mode.startswith('r') and os.path.isfile(self.file_path) and \
+                compression.detect_codec(self.file_path):
+            # Compressed output of FSElasticsearchJSONLoader
+            self.file_handler = compression.open_text_reader(self.file_path)
+        else:
+            self.file_handler = open(self.file_path, self.file_mode)
+
+    def _init_elasticsearch(self, conf: ConfigTree) -> None:
+        """
+        Initializes the configs other than the file to publish
+        :param conf:
+        :return:
+        """
+        self.conf = conf
 
         self.elasticsearch_type = self.conf.get_string(ElasticsearchPublisher.ELASTICSEARCH_DOC_TYPE_CONFIG_KEY)
         self.elasticsearch_client = self.conf.get(ElasticsearchPublisher.ELASTICSEARCH_CLIENT_CONFIG_KEY)
@@ -55,7 +120,20 @@ class ElasticsearchPublisher(Publisher):
                                                    ElasticsearchPublisher.DEFAULT_ELASTICSEARCH_INDEX_MAPPING)
         self.elasticsearch_batch_size = self.conf.get(ElasticsearchPublisher.ELASTICSEARCH_PUBLISHER_BATCH_SIZE,
                                                       10000)
-        self.file_handler = open(self.file_path, self.file_mode)
+        self.streaming = self.conf.get_bool(ElasticsearchPublisher.ELASTICSEARCH_STREAMING_CONFIG_KEY, False)
+        self.bulk_optimized = self.conf.get_bool(ElasticsearchPublisher.ELASTICSEARCH_BULK_OPTIMIZED_CONFIG_KEY, False)
+
+        self.manifest_path = self.conf.get_string(ElasticsearchPublisher.ELASTICSEARCH_MANIFEST_PATH_CONFIG_KEY, None)
+        self.incremental = self.conf.get_bool(ElasticsearchPublisher.ELASTICSEARCH_INCREMENTAL_CONFIG_KEY, False)
+        if self.incremental and not self.manifest_path:
+            raise Exception('manifest_path is required for incremental mode')
+        self.key_field = self.conf.get_string(ElasticsearchPublisher.ELASTICSEARCH_KEY_FIELD_CONFIG_KEY, None)
+        if self.manifest_path and not self.key_field:
+            raise Exception('key_field is required with manifest_path. e.g: key for tables, uri for dashboards, '
+                            'email for users')
+        # Digests of the documents sent by key, and keys of the ones failed, which are kept only with manifest_path
+        self._digests: Dict[str, str] = {}
+        self._failed_keys: Set[str] = set()
 
     def _fetch_old_index(self) -> List[str]:
         """
@@ -77,6 +155,18 @@ class ElasticsearchPublisher(Publisher):
         After upload, swap alias from {old_index} to {new_index} in a atomic operation
         to route traffic to {new_index}
         """
+        if self.incremental:
+            old_indices = self._fetch_old_index()
+            if len(old_indices) == 1 and os.path.exists(self.manifest_path):
+                self._publish_incremental()
+                return
+            LOGGER.info('Falling back to full rebuild, as there is no single index behind %s or no manifest at %s',
+                        self.elasticsearch_alias, self.manifest_path)
+
+        if self.streaming:
+            self._publish_streaming()
+            return
+
         actions = [json.loads(l) for l in self.file_handler.readlines()]
         # ensure new data exists
         if not actions:
@@ -90,23 +180,212 @@ class ElasticsearchPublisher(Publisher):
         cnt = 0
 
         # create new index with mapping
-        self.elasticsearch_client.indices.create(index=self.elasticsearch_new_index, body=self.elasticsearch_mapping)
+        self._create_new_index()
         for action in actions:
             index_row = dict(index=dict(_index=self.elasticsearch_new_index,
                                         _type=self.elasticsearch_type))
+            if self.manifest_path:
+                index_row['index']['_id'] = self._track_document(action)
             bulk_actions.append(index_row)
             bulk_actions.append(action)
             cnt += 1
             if cnt == self.elasticsearch_batch_size:
-                self.elasticsearch_client.bulk(bulk_actions)
+                self._bulk(bulk_actions)
                 LOGGER.info('Publish %i of records to ES', cnt)
                 cnt = 0
                 bulk_actions = []
 
         # Do the final bulk actions
         if bulk_actions:
-            self.elasticsearch_client.bulk(bulk_actions)
+            self._bulk(bulk_actions)
+
+        self._complete_new_index()
+        self._swap_alias()
+        self._write_manifest()
 
+    def _publish_streaming(self) -> None:
+        """
+        Reads documents lazily from the file, and bulk loads them into {new_index} from a thread pool. The alias is
+        swapped only after all the documents are sent within the max error ratio.
+        """
+        lines = (line for line in self.file_handler if line.strip())
+        first_line = next(lines, None)
+        if first_line is None:
+            LOGGER.warning("received no data to upload to Elasticsearch!")
+            return
+
+        self._create_new_index()
+
+        bulk_indexer = self._create_bulk_indexer()
+        try:
+            action = {'index': {'_index': self.elasticsearch_new_index, '_type': self.elasticsearch_type}}
+            for line in itertools.chain([first_line], lines):
+                if not self.manifest_path:
+                    # The line is sent as is, without being parsed
+                    bulk_indexer.add(action, line)
+                    continue
+
+                document = json.loads(line)
+                bulk_indexer.add({'index': {**action['index'], '_id': self._track_document(document)}}, document)
+            bulk_indexer.flush()
+            self._failed_keys.update(bulk_indexer.failed_ids)
+        finally:
+            bulk_indexer.close()
+
+        self._complete_new_index()
+        self._swap_alias()
+        self._write_manifest()
+
+    def _publish_incremental(self) -> None:
+        """
+        Indexes the documents changed since the previous run into {elasticsearch_alias}, and deletes the documents
+        missing from the current extraction, by comparing with the manifest of the previous run.
+        """
+        lines = (line for line in self.file_handler if line.strip())
+        first_line = next(lines, None)
+        if first_line is None:
+            # Deleting all the documents is more likely a failure of the extraction than the truth
+            LOGGER.warning("received no data to upload to Elasticsearch!")
+            return
+
+        previous_digests = read_manifest(self.manifest_path)
+        changed_count = 0
+        bulk_indexer = self._create_bulk_indexer()
+        try:
+            meta = {'_index': self.elasticsearch_alias, '_type': self.elasticsearch_type}
+            for line in itertools.chain([first_line], lines):
+                document = json.loads(line)
+                key = self._track_document(document)
+                if previous_digests.get(key) != self._digests[key]:
+                    bulk_indexer.add({'index': {**meta, '_id': key}}, document)
+                    changed_count += 1
+
+            deleted_keys = previous_digests.keys() - self._digests.keys()
+            for key in deleted_keys:
+                bulk_indexer.add({'delete': {**meta, '_id': key}})
+            bulk_indexer.flush()
+            self._failed_keys.update(bulk_indexer.failed_ids)
+        finally:
+            bulk_indexer.close()
+
+        LOGGER.info('Incrementally published %s. Indexed: %i, deleted: %i, unchanged: %i', self.elasticsearch_alias,
+                    changed_count, len(deleted_keys), len(self._digests) - changed_count)
+        self._write_manifest(previous_digests)
+
+    def _track_document(self, document: Dict[str, Any]) -> str:
+        """
+        Keeps the digest of the document to be sent, which is recorded in the manifest unless the document fails
+        :param document:
+        :return: Key of the document, which is used as its id
+        """
+        key = document.get(self.key_field)
+        if key is None:
+            raise Exception(f'Document has no {self.key_field} field, which is configured as key_field to be its id. '
+                            f'Fields of the document: {sorted(document)}')
+        self._digests[key] = document_digest(document)
+        return key
+
+    def _bulk(self, bulk_actions: List[Dict[str, Any]]) -> None:
+        """
+        Sends the bulk actions. Failed documents are not retried nor fail the publish, but are kept out of the manifest.
+        :param bulk_actions:
+        :return:
+        """
+        response = self.elasticsearch_client.bulk(bulk_actions)
+        if not self.manifest_path or not response.get('errors'):
+            return
+
+        for result in response['items']:
+            op_type, op_result = next(iter(result.items()))
+            if not is_succeeded(op_type, op_result.get('status')):
+                LOGGER.warning('Failed to %s document %s: %s', op_type, op_result.get('_id'), op_result.get('error'))
+                self._failed_keys.add(op_result.get('_id'))
+
+    def _write_manifest(self, previous_digests: Optional[Dict[str, str]] = None) -> None:
+        """
+        Writes the digests of the documents succeeded. A failed document is recorded with its digest of the previous
+        run if any, as the index still has that version of the document.
+        :param previous_digests: Digests of the previous run, for the documents written into the existing index
+        :return:
+        """
+        if not self.manifest_path:
+            return
+
+        digests = {key: digest for key, digest in self._digests.items() if key not in self._failed_keys}
+        for key in self._failed_keys:
+            if previous_digests and key in previous_digests:
+                digests[key] = previous_digests[key]
+        if self._failed_keys:
+            LOGGER.warning('Leaving %i failed documents out of the manifest', len(self._failed_keys))
+        write_manifest(self.manifest_path, digests)
+
+    def _create_new_index(self) -> None:
+        """
+        Creates {new_index} with mapping. In bulk optimized mode, refresh and replicas are disabled until the load is
+        complete, and the settings of the new index are kept to be restored.
+        """
+        self.elasticsearch_client.indices.create(index=self.elasticsearch_new_index, body=self.elasticsearch_mapping)
+        if not self.bulk_optimized:
+            return
+
+        settings = self.elasticsearch_client.indices.get_settings(index=self.elasticsearch_new_index)
+        index_settings = settings[self.elasticsearch_new_index]['settings']['index']
+        # refresh_interval is absent unless it's set by the mapping, and None restores the default of Elasticsearch
+        self._restored_settings = {'refresh_interval': index_settings.get('refresh_interval'),
+                                   'number_of_replicas': index_settings.get('number_of_replicas')}
+        LOGGER.info('Disabling refresh and replicas of %s during the load', self.elasticsearch_new_index)
+        self.elasticsearch_client.indices.put_settings(index=self.elasticsearch_new_index,
+                                                       body={'index': {'refresh_interval': '-1',
+                                                                       'number_of_replicas': 0}})
+
+    def _complete_new_index(self) -> None:
+        """
+        In bulk optimized mode, restores the settings of {new_index}, optionally force merges it, and waits until it
+        reaches wait_for_status. Fails if it doesn't, so that the alias keeps pointing to the old index.
+        """
+        if not self.bulk_optimized:
+            return
+
+        LOGGER.info('Restoring settings of %s: %s', self.elasticsearch_new_index, self._restored_settings)
+        self.elasticsearch_client.indices.put_settings(index=self.elasticsearch_new_index,
+                                                       body={'index': self._restored_settings})
+        self.elasticsearch_client.indices.refresh(index=self.elasticsearch_new_index)
+
+        # These take long on a large index, beyond the default request timeout of the client
+        timeout_sec = self.conf.get_int(ElasticsearchPublisher.ELASTICSEARCH_COMPLETION_TIMEOUT_SEC_CONFIG_KEY, 1800)
+        max_num_segments = self.conf.get_int(ElasticsearchPublisher.ELASTICSEARCH_FORCE_MERGE_MAX_SEGMENTS_CONFIG_KEY,
+                                             0)
+        if max_num_segments:
+            LOGGER.info('Force merging %s into %i segments', self.elasticsearch_new_index, max_num_segments)
+            self.elasticsearch_client.indices.forcemerge(index=self.elasticsearch_new_index,
+                                                         max_num_segments=max_num_segments,
+                                                         request_timeout=timeout_sec)
+
+        wait_for_status = self.conf.get_string(ElasticsearchPublisher.ELASTICSEARCH_WAIT_FOR_STATUS_CONFIG_KEY,
+                                               'yellow')
+        health = self.elasticsearch_client.cluster.health(index=self.elasticsearch_new_index,
+                                                          wait_for_status=wait_for_status,
+                                                          timeout=f'{timeout_sec}s',
+                                                          request_timeout=timeout_sec + 60)
+        if health.get('timed_out'):
+            raise Exception(f'Index {self.elasticsearch_new_index} did not become {wait_for_status} in {timeout_sec} '
+                            f'seconds. Status: {health.get("status")}')
+
+    def _create_bulk_indexer(self) -> BulkIndexer:
+        return BulkIndexer(
+            client=self.elasticsearch_client,
+            thread_count=self.conf.get_int(ElasticsearchPublisher.ELASTICSEARCH_THREAD_COUNT_CONFIG_KEY, 4),
+            chunk_size=self.elasticsearch_batch_size,
+            max_chunk_bytes=self.conf.get_int(ElasticsearchPublisher.ELASTICSEARCH_MAX_CHUNK_BYTES_CONFIG_KEY,
+                                              10 * 1024 * 1024),
+            max_retries=self.conf.get_int(ElasticsearchPublisher.ELASTICSEARCH_MAX_RETRIES_CONFIG_KEY, 3),
+            initial_backoff=self.conf.get_float(ElasticsearchPublisher.ELASTICSEARCH_INITIAL_BACKOFF_CONFIG_KEY, 2),
+            max_error_ratio=self.conf.get_float(ElasticsearchPublisher.ELASTICSEARCH_MAX_ERROR_RATIO_CONFIG_KEY, 0.0))
+
+    def _swap_alias(self) -> None:
+        """
+        Points {elasticsearch_alias} to {new_index}, and deletes old indices in a atomic operation
+        """
         # fetch indices that have {elasticsearch_alias} as alias
         elasticsearch_old_indices = self._fetch_old_index()
 
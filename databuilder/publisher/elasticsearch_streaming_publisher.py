@@ -0,0 +1,95 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+from typing import Optional
+
+from pyhocon import ConfigTree
+
+from databuilder.models.elasticsearch_document import ElasticsearchDocument
+from databuilder.publisher.base_publisher import StreamingPublisher
+from databuilder.publisher.elasticsearch_publisher import ElasticsearchPublisher
+from databuilder.utils.elasticsearch_bulk import BulkIndexer
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ElasticsearchStreamingPublisher(ElasticsearchPublisher, StreamingPublisher):
+    """
+    An Elasticsearch publisher that indexes documents handed off by ElasticsearchStreamingLoader into a new index while
+    the task is running, without writing and re-reading a JSON file. e.g: TableESDocument from Neo4jSearchDataExtractor.
+
+    Documents are sent in concurrent bulk requests by BulkIndexer, with the same configs as the streaming mode of
+    ElasticsearchPublisher (thread_count, batch_size, max_chunk_bytes, max_retries, max_error_ratio), which blocks the
+    loader while too many bulk requests are in flight. The new index is created on the first document, and the alias
+    is swapped by publish() only after all the documents are indexed and the task has succeeded. If the job fails,
+    the new index is deleted, and the alias keeps pointing to the old index.
+
+    bulk_optimized and manifest_path are supported as ElasticsearchPublisher, but incremental mode is not.
+    """
+
+    def __init__(self) -> None:
+        super(ElasticsearchStreamingPublisher, self).__init__()
+        self._bulk_indexer: Optional[BulkIndexer] = None
+        self._is_index_created = False
+        self._is_published = False
+
+    def init(self, conf: ConfigTree) -> None:
+        self._init_elasticsearch(conf)
+        if self.incremental:
+            raise Exception('Incremental mode is not supported by ElasticsearchStreamingPublisher')
+        self._action = {'index': {'_index': self.elasticsearch_new_index, '_type': self.elasticsearch_type}}
+
+    def start(self) -> None:
+        self._bulk_indexer = self._create_bulk_indexer()
+
+    def put(self, document: ElasticsearchDocument) -> None:
+        """
+        Hands off a document to be indexed. It blocks while too many bulk requests are in flight.
+        :param document:
+        :return:
+        """
+        if self._bulk_indexer is None:
+            raise RuntimeError('ElasticsearchStreamingPublisher should be started before documents are put')
+
+        if not self._is_index_created:
+            self._create_new_index()
+            self._is_index_created = True
+
+        source = document.to_dict()
+        if self.manifest_path:
+            self._bulk_indexer.add({'index': {**self._action['index'], '_id': self._track_document(source)}}, source)
+        else:
+            self._bulk_indexer.add(self._action, source)
+
+    def publish_impl(self) -> None:
+        """
+        Waits until all the documents are indexed, and swaps the alias to the new index
+        """
+        if not self._is_index_created:
+            LOGGER.warning("received no data to upload to Elasticsearch!")
+            return
+
+        if self._bulk_indexer is not None:
+            self._bulk_indexer.flush()
+            self._failed_keys.update(self._bulk_indexer.failed_ids)
+        self._complete_new_index()
+        self._swap_alias()
+        self._is_published = True
+        self._write_manifest()
+
+    def close(self) -> None:
+        """
+        Stops the bulk requests, and deletes the new index if it's not published, e.g: the task has failed.
+        :return:
+        """
+        if self._bulk_indexer is not None:
+            self._bulk_indexer.close()
+            self._bulk_indexer = None
+
+        if self._is_index_created and not self._is_published:
+            LOGGER.warning('Deleting unpublished index %s', self.elasticsearch_new_index)
+            self.elasticsearch_client.indices.delete(index=self.elasticsearch_new_index, ignore=[404])
+
+    def get_scope(self) -> str:
+        return 'publisher.elasticsearch_streaming'
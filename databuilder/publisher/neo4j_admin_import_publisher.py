@@ -0,0 +1,309 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import csv
+import logging
+import os
+import shlex
+import time
+from os import listdir
+from os.path import isfile, join
+from typing import (
+    IO, Any, Dict, Iterator, List, Optional, Tuple,
+)
+
+from pyhocon import ConfigFactory, ConfigTree
+
+from databuilder.publisher.base_publisher import Publisher
+from databuilder.publisher.neo4j_csv_publisher import (
+    JOB_PUBLISH_TAG, LAST_UPDATED_EPOCH_MS, NODE_FILES_DIR, NODE_KEY_KEY, NODE_LABEL_KEY, NODE_REQUIRED_KEYS,
+    NULL_MARKER, NULLABLE_SUFFIX, PUBLISHED_TAG_PROPERTY_NAME, RELATION_END_KEY, RELATION_END_LABEL, RELATION_FILES_DIR,
+    RELATION_REQUIRED_KEYS, RELATION_REVERSE_TYPE, RELATION_START_KEY, RELATION_START_LABEL, RELATION_TYPE,
+    UNQUOTED_SUFFIX, get_property_name,
+)
+from databuilder.utils import compression, parquet
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of rows read at a time from Parquet files
+PARQUET_READ_BATCH_SIZE = 10000
+
+
+class Neo4jAdminImportPublisher(Publisher):
+    """
+    A Publisher that converts node and relationship CSV files written by FsNeo4jCSVLoader into the format that
+    neo4j-admin import expects, and writes the import command next to them. It's meant for the first time or full
+    loads where offline import is orders of magnitude faster than MERGE statements of Neo4jCsvPublisher.
+
+    - Each label has its own ID space, where the node key is the ID. (key:ID(Table))
+    - Each relationship row is emitted in both directions, TYPE from start to end and REVERSE_TYPE from end to start.
+    - Columns with :UNQUOTED suffix are typed as long, double or boolean based on their values.
+    - NULL_MARKER values of columns with :NULLABLE suffix (or null in Parquet) are written as unquoted empty fields,
+      which neo4j-admin import does not set. Other values are quoted, so that an empty string stays as is.
+    - published_tag and publisher_last_updated_epoch_ms are added so that staleness removal keeps working.
+
+    As a node can be written more than once by the loader, the command skips duplicate nodes. Note that, unlike
+    MERGE, duplicate relationship rows result in duplicate relationships.
+    """
+    # Config keys
+    # A directory where converted files and the import command are written. It should not exist.
+    OUTPUT_DIR = 'output_directory'
+    # A database name to import into
+    DATABASE_NAME = 'database_name'
+    # A path to neo4j-admin
+    NEO4J_ADMIN_PATH = 'neo4j_admin_path'
+
+    IMPORT_COMMAND_FILE_NAME = 'import.sh'
+
+    _DEFAULT_CONFIG = ConfigFactory.from_dict({
+        DATABASE_NAME: 'neo4j',
+        NEO4J_ADMIN_PATH: 'neo4j-admin',
+    })
+
+    def __init__(self) -> None:
+        super(Neo4jAdminImportPublisher, self).__init__()
+
+    def init(self, conf: ConfigTree) -> None:
+        conf = conf.with_fallback(Neo4jAdminImportPublisher._DEFAULT_CONFIG)
+
+        self._node_files = self._list_files(conf, NODE_FILES_DIR)
+        self._relation_files = self._list_files(conf, RELATION_FILES_DIR)
+        self._output_dir = conf.get_string(Neo4jAdminImportPublisher.OUTPUT_DIR)
+        self._database_name = conf.get_string(Neo4jAdminImportPublisher.DATABASE_NAME)
+        self._neo4j_admin_path = conf.get_string(Neo4jAdminImportPublisher.NEO4J_ADMIN_PATH)
+        self.publish_tag: str = conf.get_string(JOB_PUBLISH_TAG)
+        if not self.publish_tag:
+            raise Exception(f'{JOB_PUBLISH_TAG} should not be empty')
+
+        if os.path.exists(self._output_dir):
+            raise RuntimeError(f'Directory should not exist: {self._output_dir}')
+
+    def _list_files(self, conf: ConfigTree, path_key: str) -> List[str]:
+        if path_key not in conf:
+            return []
+
+        path = conf.get_string(path_key)
+        return sorted(join(path, f) for f in listdir(path) if isfile(join(path, f)))
+
+    def publish_impl(self) -> None:
+        start = time.time()
+        self._last_updated_epoch_ms = int(time.time() * 1000)
+
+        node_dir = join(self._output_dir, 'nodes')
+        relation_dir = join(self._output_dir, 'relationships')
+        os.makedirs(node_dir)
+        os.makedirs(relation_dir)
+
+        import_node_files: List[str] = []
+        for i, node_file in enumerate(self._node_files):
+            import_node_files.extend(self._convert_node_file(node_file, join(node_dir, str(i))))
+
+        import_relation_files: List[str] = []
+        for i, relation_file in enumerate(self._relation_files):
+            import_relation_files.extend(self._convert_relation_file(relation_file, join(relation_dir, str(i))))
+
+        command_file = join(self._output_dir, Neo4jAdminImportPublisher.IMPORT_COMMAND_FILE_NAME)
+        with open(command_file, 'w', encoding='utf8') as command_out:
+            command_out.write('#!/bin/sh\n')
+            command_out.write(self.create_import_command(import_node_files, import_relation_files) + '\n')
+        os.chmod(command_file, 0o755)
+
+        LOGGER.info('Converted %i node files and %i relation files into %s for neo4j-admin import. Elapsed: %i seconds',
+                    len(import_node_files), len(import_relation_files), self._output_dir, time.time() - start)
+
+    def create_import_command(self,
+                              node_files: List[str],
+                              relation_files: List[str]) -> str:
+        """
+        Creates neo4j-admin import command for the converted files
+        :param node_files:
+        :param relation_files:
+        :return:
+        """
+        args = [f'--database={self._database_name}',
+                '--id-type=STRING',
+                '--multiline-fields=true',
+                '--skip-duplicate-nodes=true']
+        args.extend(f'--nodes={node_file}' for node_file in node_files)
+        args.extend(f'--relationships={relation_file}' for relation_file in relation_files)
+        command = f'{shlex.quote(self._neo4j_admin_path)} import'
+        return ' \\\n    '.join([command] + [shlex.quote(arg) for arg in args])
+
+    def _convert_node_file(self, node_file: str, output_prefix: str) -> List[str]:
+        """
+        Converts a node file into a file per label, as each label has its own ID space.
+        :param node_file:
+        :param output_prefix:
+        :return: Converted file paths
+        """
+        types = self._infer_types(node_file, excludes=NODE_REQUIRED_KEYS)
+        property_header = self._property_header(types)
+        writers: Dict[Any, Tuple[IO, Any, str]] = {}
+        try:
+            for record in self._read_records(node_file):
+                label = record[NODE_LABEL_KEY]
+                writer = self._get_writer(writers, label, f'{output_prefix}_{label}.csv',
+                                          header=[f'key:ID({label})', ':LABEL'] + property_header)
+                writer.writerow([record[NODE_KEY_KEY], label] + self._property_values(record, types))
+        finally:
+            for output, _, _ in writers.values():
+                output.close()
+
+        return [path for _, _, path in writers.values()]
+
+    def _convert_relation_file(self, relation_file: str, output_prefix: str) -> List[str]:
+        """
+        Converts a relation file into files per (start label, end label, direction), as the ID space of the start and
+        end node is part of the header.
+        :param relation_file:
+        :param output_prefix:
+        :return: Converted file paths
+        """
+        types = self._infer_types(relation_file, excludes=RELATION_REQUIRED_KEYS)
+        property_header = self._property_header(types)
+        writers: Dict[Any, Tuple[IO, Any, str]] = {}
+        try:
+            for record in self._read_records(relation_file):
+                values = self._property_values(record, types)
+                directions = [(record[RELATION_START_LABEL], record[RELATION_START_KEY],
+                               record[RELATION_END_LABEL], record[RELATION_END_KEY], record[RELATION_TYPE]),
+                              (record[RELATION_END_LABEL], record[RELATION_END_KEY],
+                               record[RELATION_START_LABEL], record[RELATION_START_KEY], record[RELATION_REVERSE_TYPE])]
+                for start_label, start_key, end_label, end_key, rel_type in directions:
+                    header = [f':START_ID({start_label})', f':END_ID({end_label})', ':TYPE'] + property_header
+                    writer = self._get_writer(writers, (start_label, end_label),
+                                              f'{output_prefix}_{start_label}_{end_label}.csv', header=header)
+                    writer.writerow([start_key, end_key, rel_type] + values)
+        finally:
+            for output, _, _ in writers.values():
+                output.close()
+
+        return [path for _, _, path in writers.values()]
+
+    def _get_writer(self,
+                    writers: Dict[Any, Tuple[IO, Any, str]],
+                    key: Any,
+                    path: str,
+                    header: List[str]) -> Any:
+        """
+        Finds a csv writer by key. If writer does not exist, it creates the file with the header and updates writers.
+        :param writers: A dict of key to the tuple of file, csv writer and path
+        :param key:
+        :param path:
+        :param header:
+        :return: csv writer
+        """
+        if key not in writers:
+            output = open(path, 'w', encoding='utf8', newline='')
+            writer = _ImportCsvWriter(output)
+            writer.writerow(header)
+            writers[key] = (output, writer, path)
+
+        return writers[key][1]
+
+    def _read_header(self, record_file: str) -> List[str]:
+        if parquet.is_parquet(record_file):
+            return parquet.read_column_names(record_file)
+
+        with compression.open_text_reader(record_file) as csv_input:
+            return next(csv.reader(csv_input), [])
+
+    def _read_records(self, record_file: str) -> Iterator[Dict[str, Optional[str]]]:
+        """
+        Streams the records of the CSV or Parquet file as dicts of header to value. Values of Parquet file are converted
+        into their CSV form, so that both are converted in the same way, where null is None.
+        :param record_file:
+        :return: Iterator of records
+        """
+        if parquet.is_parquet(record_file):
+            for batch in parquet.iter_record_batches(record_file, batch_size=PARQUET_READ_BATCH_SIZE):
+                for record in batch.to_pylist():
+                    yield {k: None if v is None else str(v) for k, v in record.items()}
+            return
+
+        with compression.open_text_reader(record_file) as csv_input:
+            yield from csv.DictReader(csv_input)
+
+    def _infer_types(self, csv_file: str, excludes: set) -> Dict[str, Optional[str]]:
+        """
+        Goes over the file and infers neo4j-admin import type of each property column. Columns without :UNQUOTED
+        suffix are strings. Columns with :UNQUOTED suffix are boolean, long or double if all of their values are.
+        :param csv_file:
+        :param excludes: Columns that are not properties
+        :return: An ordered dict of column name to the type, where None is a string
+        """
+        header = self._read_header(csv_file)
+        types: Dict[str, Optional[str]] = {column: None for column in header if column not in excludes}
+        candidates = {column: ['boolean', 'long', 'double'] for column in types if _is_unquoted(column)}
+        if candidates:
+            for record in self._read_records(csv_file):
+                for column, column_candidates in candidates.items():
+                    value = record[column]
+                    if value is None or _is_null(column, value):
+                        continue
+                    column_candidates[:] = [t for t in column_candidates if _is_type(value, t)]
+
+        for column, column_candidates in candidates.items():
+            types[column] = column_candidates[0] if column_candidates else 'string'
+        return types
+
+    def _property_header(self, types: Dict[str, Optional[str]]) -> List[str]:
+        header = []
+        for column, property_type in types.items():
+            name = get_property_name(column)
+            header.append(f'{name}:{property_type}' if property_type else name)
+
+        header.append(PUBLISHED_TAG_PROPERTY_NAME)
+        header.append(f'{LAST_UPDATED_EPOCH_MS}:long')
+        return header
+
+    def _property_values(self, record: Dict[str, Optional[str]], types: Dict[str, Optional[str]]) -> List[Any]:
+        values: List[Any] = []
+        for column, property_type in types.items():
+            value = record[column]
+            if value is None or _is_null(column, value):
+                values.append(None)
+            else:
+                values.append(value.lower() if property_type == 'boolean' else value)
+
+        values.append(self.publish_tag)
+        values.append(self._last_updated_epoch_ms)
+        return values
+
+    def get_scope(self) -> str:
+        return 'publisher.neo4j_admin_import'
+
+
+class _ImportCsvWriter(object):
+    """
+    Writes CSV rows where every value is quoted but None, which is an unquoted empty field. neo4j-admin import does
+    not set the property of an unquoted empty field, while "" is an empty string. csv.writer can't tell them apart.
+    """
+
+    def __init__(self, output: IO) -> None:
+        self._output = output
+
+    def writerow(self, values: List[Any]) -> None:
+        self._output.write(','.join('' if value is None else '"' + str(value).replace('"', '""') + '"'
+                                    for value in values) + '\n')
+
+
+def _is_unquoted(column: str) -> bool:
+    if column.endswith(NULLABLE_SUFFIX):
+        column = column[:-len(NULLABLE_SUFFIX)]
+    return column.endswith(UNQUOTED_SUFFIX)
+
+
+def _is_null(column: str, value: str) -> bool:
+    return value == NULL_MARKER and column.endswith(NULLABLE_SUFFIX)
+
+
+def _is_type(value: str, property_type: str) -> bool:
+    if property_type == 'boolean':
+        return value in ('True', 'False', 'true', 'false')
+
+    try:
+        int(value) if property_type == 'long' else float(value)
+        return True
+    except ValueError:
+        return False
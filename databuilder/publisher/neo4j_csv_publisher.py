@@ -1,14 +1,23 @@
 # Copyright Contributors to the Amundsen project.
 # SPDX-License-Identifier: Apache-2.0
 
+import copy
 import csv
 import ctypes
+import json
 import logging
+import re
+import threading
 import time
-from io import open
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from os import listdir
-from os.path import isfile, join
-from typing import List, Set
+from os.path import (
+    basename, isfile, join,
+)
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple,
+)
 
 import neo4j
 import pandas
@@ -18,7 +27,13 @@ from neo4j.exceptions import CypherError, TransientError
 from pyhocon import ConfigFactory, ConfigTree
 
 from databuilder.publisher.base_publisher import Publisher
-from databuilder.publisher.neo4j_preprocessor import NoopRelationPreprocessor
+from databuilder.publisher.neo4j_preprocessor import NoopRelationPreprocessor, RelationPreprocessor
+from databuilder.publisher.neo4j_publish_checkpoint import (
+    MERGE_PHASE, PREPROCESS_PHASE, Neo4jPublishCheckpoint,
+)
+from databuilder.publisher.neo4j_publish_snapshot import Neo4jPublishSnapshot
+from databuilder.publisher.neo4j_transaction_sizer import AdaptiveTransactionSizer
+from databuilder.utils import compression, parquet
 
 # Setting field_size_limit to solve the error below
 # _csv.Error: field larger than field limit (131072)
@@ -47,6 +62,9 @@ NEO4J_CREATE_ONLY_NODES = 'neo4j_create_only_nodes'
 # list of node labels that could attempt to be accessed simultaneously
 NEO4J_DEADLOCK_NODE_LABELS = 'neo4j_deadlock_node_labels'
 
+# Number of CSV rows sent in a single UNWIND statement. When it's 0, it executes one statement per row.
+NEO4J_UNWIND_BATCH_SIZE = 'neo4j_unwind_batch_size'
+
 NEO4J_USER = 'neo4j_user'
 NEO4J_PASSWORD = 'neo4j_password'
 NEO4J_ENCRYPTED = 'neo4j_encrypted'
@@ -65,9 +83,60 @@ LAST_UPDATED_EPOCH_MS = 'publisher_last_updated_epoch_ms'
 
 RELATION_PREPROCESSOR = 'relation_preprocessor'
 
+# Number of CSV rows read into memory at a time. Node and relation files are streamed in chunks of this size.
+NEO4J_CSV_READ_CHUNK_SIZE = 'neo4j_csv_read_chunk_size'
+
+# Number of workers that publish node files concurrently, each with its own session.
+# Node files sharing a label are published by the same worker. 1 means serial publish in a single session.
+NEO4J_NODE_PUBLISH_WORKERS = 'neo4j_node_publish_workers'
+# Number of workers that publish relation files concurrently, each with its own session. Relation files are
+# partitioned so that files touching a common label are published by the same worker.
+# For files sharded by node key, the unit is the shard of a label rather than the label. As shards of a relation file
+# are only partitioned by their start nodes, the unit of their end nodes is the whole end label, thus shards sharing an
+# end label (e.g: Tag) are published by the same worker.
+NEO4J_RELATION_PUBLISH_WORKERS = 'neo4j_relation_publish_workers'
+# A transaction size for each worker when publishing in parallel. Defaults to neo4j_transaction_size.
+NEO4J_WORKER_TRANSACTION_SIZE = 'neo4j_worker_transaction_size'
+
+# A path of checkpoint file that records committed files and rows on every commit. Not used when not provided.
+NEO4J_CHECKPOINT_FILE = 'neo4j_checkpoint_file'
+# A boolean flag to skip the work recorded in the checkpoint file, if it's for the same job_publish_tag
+NEO4J_RESUME_FROM_CHECKPOINT = 'neo4j_resume_from_checkpoint'
+
+# A boolean flag to adjust transaction size on every commit based on commit latency, payload size and transient
+# errors. neo4j_transaction_size (or neo4j_worker_transaction_size) is used as the initial size.
+NEO4J_ADAPTIVE_TRANSACTION_SIZE = 'neo4j_adaptive_transaction_size'
+NEO4J_MIN_TRANSACTION_SIZE = 'neo4j_min_transaction_size'
+NEO4J_MAX_TRANSACTION_SIZE = 'neo4j_max_transaction_size'
+# A commit latency that adaptive transaction size aims for
+NEO4J_TARGET_COMMIT_LATENCY_SEC = 'neo4j_target_commit_latency_sec'
+# An upper bound of approximate parameter bytes in a transaction, to avoid memory pressure on Neo4j
+NEO4J_MAX_TRANSACTION_PAYLOAD_BYTES = 'neo4j_max_transaction_payload_bytes'
+
+# A path of on-disk snapshot of content hash per node and relationship, as of the previous publishes. When provided,
+# nodes and relationships unchanged since then only get published_tag and publisher_last_updated_epoch_ms updated,
+# instead of all of their properties.
+NEO4J_DIFF_SNAPSHOT_FILE = 'neo4j_diff_snapshot_file'
+
+# Name of the parameter that holds the list of rows for UNWIND statement
+UNWIND_ROWS_PARAM = 'rows'
+
+# Files sharded by the hash of node key have the shard index in the file name. e.g: Column_0_shard_3.csv
+# Node files are sharded by KEY and relation files by START_KEY, thus shards of the same label never share a node.
+SHARD_FILE_NAME_FORMAT = '{}_shard_{}'
+SHARD_FILE_NAME_PATTERN = re.compile(r'_shard_(\d+)\.')
+
+# A value of the column that is absent from the record, in files with the union of the columns of the records.
+# Such properties are not set. In Parquet files, null is used instead.
+NULL_MARKER = '\\N'
+
 # CSV HEADER
 # A header with this suffix will be pass to Neo4j statement without quote
 UNQUOTED_SUFFIX = ':UNQUOTED'
+# A header with this suffix is a column absent from some records, in files with the union of the columns of the
+# records. Its NULL_MARKER (or null in Parquet) values are not set, while NULL_MARKER in other columns is a value as is.
+# It follows UNQUOTED_SUFFIX if any. e.g: sort_order:UNQUOTED:NULLABLE
+NULLABLE_SUFFIX = ':NULLABLE'
 # A header for Node label
 NODE_LABEL_KEY = 'LABEL'
 # A header for Node key
@@ -99,8 +168,52 @@ DEFAULT_CONFIG = ConfigFactory.from_dict({NEO4J_TRANSACTION_SIZE: 500,
                                           NEO4J_MAX_CONN_LIFE_TIME_SEC: 50,
                                           NEO4J_ENCRYPTED: True,
                                           NEO4J_VALIDATE_SSL: False,
+                                          NEO4J_UNWIND_BATCH_SIZE: 0,
+                                          NEO4J_CSV_READ_CHUNK_SIZE: 10000,
+                                          NEO4J_NODE_PUBLISH_WORKERS: 1,
+                                          NEO4J_RELATION_PUBLISH_WORKERS: 1,
+                                          NEO4J_RESUME_FROM_CHECKPOINT: False,
+                                          NEO4J_ADAPTIVE_TRANSACTION_SIZE: False,
+                                          NEO4J_MIN_TRANSACTION_SIZE: 100,
+                                          NEO4J_MAX_TRANSACTION_SIZE: 20000,
+                                          NEO4J_TARGET_COMMIT_LATENCY_SEC: 2.0,
+                                          NEO4J_MAX_TRANSACTION_PAYLOAD_BYTES: 64 * 1024 * 1024,
                                           RELATION_PREPROCESSOR: NoopRelationPreprocessor()})
 
+NODE_MERGE_TEMPLATE = Template("""
+    MERGE (node:{{ LABEL }} {key: $KEY})
+    ON CREATE SET {{ PROP_BODY }}
+    {% if update %} ON MATCH SET {{ MATCH_PROP_BODY }} {% endif %}
+""")
+
+NODE_MERGE_BATCH_TEMPLATE = Template("""
+    UNWIND ${{ ROWS }} AS row
+    MERGE (node:{{ LABEL }} {key: row.KEY})
+    ON CREATE SET {{ PROP_BODY }}
+    {% if update %} ON MATCH SET {{ MATCH_PROP_BODY }} {% endif %}
+""")
+
+RELATION_MERGE_TEMPLATE = Template("""
+    MATCH (n1:{{ START_LABEL }} {key: $START_KEY}), (n2:{{ END_LABEL }} {key: $END_KEY})
+    MERGE (n1)-[r1:{{ TYPE }}]->(n2)-[r2:{{ REVERSE_TYPE }}]->(n1)
+    {% if update_prop_body %}
+    ON CREATE SET {{ prop_body }}
+    ON MATCH SET {{ match_prop_body }}
+    {% endif %}
+    RETURN n1.key, n2.key
+""")
+
+RELATION_MERGE_BATCH_TEMPLATE = Template("""
+    UNWIND ${{ ROWS }} AS row
+    MATCH (n1:{{ START_LABEL }} {key: row.START_KEY}), (n2:{{ END_LABEL }} {key: row.END_KEY})
+    MERGE (n1)-[r1:{{ TYPE }}]->(n2)-[r2:{{ REVERSE_TYPE }}]->(n1)
+    {% if update_prop_body %}
+    ON CREATE SET {{ prop_body }}
+    ON MATCH SET {{ match_prop_body }}
+    {% endif %}
+    RETURN count(*) AS count
+""")
+
 # transient error retries and sleep time
 RETRIES_NUMBER = 5
 SLEEP_TIME = 2
@@ -108,6 +221,39 @@ SLEEP_TIME = 2
 LOGGER = logging.getLogger(__name__)
 
 
+def get_property_name(column: str) -> str:
+    """
+    :param column: A header of CSV, which could have NULLABLE_SUFFIX and UNQUOTED_SUFFIX
+    :return: Name of the property
+    """
+    if column.endswith(NULLABLE_SUFFIX):
+        column = column[:-len(NULLABLE_SUFFIX)]
+    if column.endswith(UNQUOTED_SUFFIX):
+        column = column[:-len(UNQUOTED_SUFFIX)]
+    return column
+
+
+def _parse_unquoted_value(value: Any) -> Any:
+    """
+    Parses an unquoted value of CSV as pandas infers the type of a column: bool, int, float, or str otherwise.
+    :param value:
+    :return:
+    """
+    if not isinstance(value, str):
+        return value
+
+    lowered = value.lower()
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+
+    for parse in (int, float):
+        try:
+            return parse(value)  # type: ignore
+        except ValueError:
+            pass
+    return value
+
+
 class Neo4jCsvPublisher(Publisher):
     """
     A Publisher takes two folders for input and publishes to Neo4j.
@@ -116,7 +262,12 @@ class Neo4jCsvPublisher(Publisher):
     Neo4j follows Label Node properties Graph and more information about this is in:
     https://neo4j.com/docs/developer-manual/current/introduction/graphdb-concepts/
 
-    #TODO User UNWIND batch operation for better performance
+    When neo4j_unwind_batch_size is set, rows that share same label (or same relation type) and same header are sent
+    together as a parameter list of single UNWIND statement, instead of one statement per row.
+
+    When neo4j_diff_snapshot_file is set, rows whose content is same as when they were last published are still
+    MERGEd, but only published_tag and publisher_last_updated_epoch_ms are SET on match, so that staleness removal
+    keeps working without rewriting every property.
     """
 
     def __init__(self) -> None:
@@ -142,6 +293,24 @@ class Neo4jCsvPublisher(Publisher):
                                  encrypted=conf.get_bool(NEO4J_ENCRYPTED),
                                  trust=trust)
         self._transaction_size = conf.get_int(NEO4J_TRANSACTION_SIZE)
+        self._unwind_batch_size = conf.get_int(NEO4J_UNWIND_BATCH_SIZE)
+        self._csv_read_chunk_size = conf.get_int(NEO4J_CSV_READ_CHUNK_SIZE)
+        self._node_publish_workers = conf.get_int(NEO4J_NODE_PUBLISH_WORKERS)
+        self._relation_publish_workers = conf.get_int(NEO4J_RELATION_PUBLISH_WORKERS)
+        self._worker_transaction_size = conf.get_int(NEO4J_WORKER_TRANSACTION_SIZE, self._transaction_size)
+        self._adaptive_transaction_size = conf.get_bool(NEO4J_ADAPTIVE_TRANSACTION_SIZE)
+        self._min_transaction_size = conf.get_int(NEO4J_MIN_TRANSACTION_SIZE)
+        self._max_transaction_size = conf.get_int(NEO4J_MAX_TRANSACTION_SIZE)
+        self._target_commit_latency_sec = conf.get_float(NEO4J_TARGET_COMMIT_LATENCY_SEC)
+        self._max_transaction_payload_bytes = conf.get_int(NEO4J_MAX_TRANSACTION_PAYLOAD_BYTES)
+        self._transaction_sizer = self._create_transaction_sizer(self._transaction_size)
+        # Statements and approximate parameter bytes since last commit
+        self._uncommitted_count = 0
+        self._uncommitted_bytes = 0
+        self._count_lock = threading.Lock()
+        self._statement_cache: Dict[Tuple, str] = {}
+        self._statement_cache_hits = 0
+        self._statement_cache_misses = 0
         self._session = self._driver.session()
         self._confirm_rel_created = conf.get_bool(NEO4J_RELATIONSHIP_CREATION_CONFIRM)
 
@@ -150,12 +319,32 @@ class Neo4jCsvPublisher(Publisher):
         self.create_only_nodes = set(conf.get_list(NEO4J_CREATE_ONLY_NODES, default=[]))
         self.deadlock_node_labels = set(conf.get_list(NEO4J_DEADLOCK_NODE_LABELS, default=[]))
         self.labels: Set[str] = set()
+        self._node_file_labels: Dict[str, Set[str]] = {}
         self.publish_tag: str = conf.get_string(JOB_PUBLISH_TAG)
         if not self.publish_tag:
             raise Exception(f'{JOB_PUBLISH_TAG} should not be empty')
 
         self._relation_preprocessor = conf.get(RELATION_PREPROCESSOR)
 
+        self._checkpoint: Optional[Neo4jPublishCheckpoint] = None
+        if conf.get_string(NEO4J_CHECKPOINT_FILE, None):
+            self._checkpoint = Neo4jPublishCheckpoint(path=conf.get_string(NEO4J_CHECKPOINT_FILE),
+                                                      publish_tag=self.publish_tag,
+                                                      resume=conf.get_bool(NEO4J_RESUME_FROM_CHECKPOINT))
+        # Progress since last commit, recorded in the checkpoint on commit
+        self._finished_files: List[str] = []
+        self._current_file: Optional[str] = None
+        self._current_phase = MERGE_PHASE
+        self._current_offset = 0
+
+        self._snapshot: Optional[Neo4jPublishSnapshot] = None
+        if conf.get_string(NEO4J_DIFF_SNAPSHOT_FILE, None):
+            self._snapshot = Neo4jPublishSnapshot(path=conf.get_string(NEO4J_DIFF_SNAPSHOT_FILE))
+        # Content hashes since last commit, recorded in the snapshot on commit
+        self._uncommitted_hashes: Dict[str, str] = {}
+        self._unchanged_count = 0
+        self._changed_count = 0
+
         LOGGER.info('Publishing Node csv files %s, and Relation CSV files %s', self._node_files, self._relation_files)
 
     def _list_files(self, conf: ConfigTree, path_key: str) -> List[str]:
@@ -183,6 +372,15 @@ class Neo4jCsvPublisher(Publisher):
         for node_file in self._node_files:
             self._create_indices(node_file=node_file)
 
+        if self._node_publish_workers > 1 or self._relation_publish_workers > 1:
+            try:
+                self._publish_in_parallel()
+            finally:
+                self._close_snapshot()
+            self._remove_checkpoint()
+            LOGGER.info('Successfully published. Elapsed: %i seconds', time.time() - start)
+            return
+
         LOGGER.info('Publishing Node files: %s', self._node_files)
         try:
             tx = self._session.begin_transaction()
@@ -202,7 +400,12 @@ class Neo4jCsvPublisher(Publisher):
                     break
 
             tx.commit()
+            self._record_snapshot()
+            self._record_checkpoint()
             LOGGER.info('Committed total %i statements', self._count)
+            LOGGER.info('Statement cache hits: %i, misses: %i',
+                        self._statement_cache_hits, self._statement_cache_misses)
+            self._remove_checkpoint()
 
             # TODO: Add statsd support
             LOGGER.info('Successfully published. Elapsed: %i seconds', time.time() - start)
@@ -211,6 +414,143 @@ class Neo4jCsvPublisher(Publisher):
             if not tx.closed():
                 tx.rollback()
             raise e
+        finally:
+            self._close_snapshot()
+
+    def _publish_in_parallel(self) -> None:
+        """
+        Publishes Node files with neo4j_node_publish_workers and then, once all of them are committed, publishes
+        Relation files with neo4j_relation_publish_workers.
+        Each worker uses its own session and commits its own transactions, thus a failure of one worker does not roll
+        back what the other workers have committed.
+        :return:
+        """
+        LOGGER.info('Publishing Node files with %i workers: %s', self._node_publish_workers, self._node_files)
+        node_file_units = {node_file: {(label, self._get_file_shard(node_file)) for label in labels}
+                           for node_file, labels in self._node_file_labels.items()}
+        self._publish_file_groups(self._partition_files(node_file_units),
+                                  publish_func=lambda worker, file, tx: worker._publish_node(file, tx=tx),
+                                  workers=self._node_publish_workers)
+
+        relation_file_units = {relation_file: self._get_relation_units(relation_file)
+                               for relation_file in self._relation_files}
+        LOGGER.info('Publishing Relationship files with %i workers: %s',
+                    self._relation_publish_workers, self._relation_files)
+        self._publish_file_groups(self._partition_files(relation_file_units),
+                                  publish_func=lambda worker, file, tx: worker._publish_relation(file, tx=tx),
+                                  workers=self._relation_publish_workers)
+
+        LOGGER.info('Committed total %i statements', self._count)
+        LOGGER.info('Statement cache hits: %i, misses: %i', self._statement_cache_hits, self._statement_cache_misses)
+
+    def _publish_file_groups(self,
+                             file_groups: List[List[str]],
+                             publish_func: Callable[['Neo4jCsvPublisher', str, Transaction], Transaction],
+                             workers: int) -> None:
+        """
+        Publishes each group of files on a worker. Waits for all the groups and raises the first failure, if any.
+        :param file_groups:
+        :param publish_func: Either _publish_node or _publish_relation
+        :param workers:
+        :return:
+        """
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = [executor.submit(self._publish_file_group, file_group, publish_func)
+                       for file_group in file_groups]
+            for future in futures:
+                future.result()
+
+    def _publish_file_group(self,
+                            files: List[str],
+                            publish_func: Callable[['Neo4jCsvPublisher', str, Transaction], Transaction]) -> None:
+        """
+        Publishes files sequentially with a worker, a shallow copy of this publisher bound to its own session.
+        :param files:
+        :param publish_func:
+        :return:
+        """
+        worker = copy.copy(self)
+        worker._count = 0
+        worker._statement_cache_hits = 0
+        worker._statement_cache_misses = 0
+        worker._transaction_size = self._worker_transaction_size
+        worker._transaction_sizer = self._create_transaction_sizer(self._worker_transaction_size)
+        worker._uncommitted_count = 0
+        worker._uncommitted_bytes = 0
+        worker._finished_files = []
+        worker._uncommitted_hashes = {}
+        worker._unchanged_count = 0
+        worker._changed_count = 0
+        worker._session = self._driver.session()
+        tx = worker._session.begin_transaction()
+        try:
+            for file in files:
+                tx = publish_func(worker, file, tx)
+            tx.commit()
+            worker._record_snapshot()
+            worker._record_checkpoint()
+            LOGGER.info('Committed %i statements from %s', worker._count, files)
+        except Exception as e:
+            LOGGER.exception('Failed to publish %s. Rolling back.', files)
+            if not tx.closed():
+                tx.rollback()
+            raise e
+        finally:
+            worker._session.close()
+            with self._count_lock:
+                self._count += worker._count
+                self._statement_cache_hits += worker._statement_cache_hits
+                self._statement_cache_misses += worker._statement_cache_misses
+                self._unchanged_count += worker._unchanged_count
+                self._changed_count += worker._changed_count
+
+    @staticmethod
+    def _partition_files(file_units: Dict[str, Set[Tuple[str, Optional[int]]]]) -> List[List[str]]:
+        """
+        Partitions files into groups where files from different groups do not share any node, so that each group
+        can be published concurrently without contending on the same nodes.
+        :param file_units: A dict of file path to the units of nodes that the file touches, where a unit is a tuple of
+        label and shard. Shard None means all the nodes of the label.
+        :return: List of file groups
+        """
+        groups: List[Tuple[Set[Tuple[str, Optional[int]]], List[str]]] = []
+        for file, units in file_units.items():
+            merged_units, merged_files = set(units), [file]
+            disjoint_groups = []
+            for group_units, group_files in groups:
+                if Neo4jCsvPublisher._overlaps(group_units, merged_units):
+                    merged_units |= group_units
+                    merged_files = group_files + merged_files
+                else:
+                    disjoint_groups.append((group_units, group_files))
+            groups = disjoint_groups + [(merged_units, merged_files)]
+
+        return [files for _, files in groups]
+
+    @staticmethod
+    def _overlaps(units: Set[Tuple[str, Optional[int]]], other_units: Set[Tuple[str, Optional[int]]]) -> bool:
+        """
+        :return: True if any unit overlaps, which is when the labels are same and either shards are same or any of
+        them is the whole label.
+        """
+        shards_by_label: Dict[str, Set[Optional[int]]] = {}
+        for label, shard in units:
+            shards_by_label.setdefault(label, set()).add(shard)
+
+        for label, shard in other_units:
+            shards = shards_by_label.get(label)
+            if shards and (shard is None or None in shards or shard in shards):
+                return True
+        return False
+
+    @staticmethod
+    def _get_file_shard(file: str) -> Optional[int]:
+        """
+        :param file:
+        :return: Shard index from the file name, or None if the file is not sharded
+        """
+        match = SHARD_FILE_NAME_PATTERN.search(basename(file))
+        return int(match.group(1)) if match else None
 
     def get_scope(self) -> str:
         return 'publisher.neo4j'
@@ -223,15 +563,89 @@ class Neo4jCsvPublisher(Publisher):
         """
         LOGGER.info('Creating indices. (Existing indices will be ignored)')
 
-        with open(node_file, 'r', encoding='utf8') as node_csv:
-            for node_record in pandas.read_csv(node_csv, na_filter=False).to_dict(orient='records'):
-                label = node_record[NODE_LABEL_KEY]
+        file_labels = self._node_file_labels.setdefault(node_file, set())
+        for chunk in self._read_csv_chunks(node_file, usecols=[NODE_LABEL_KEY]):
+            for label in chunk[NODE_LABEL_KEY].unique():
+                file_labels.add(label)
                 if label not in self.labels:
                     self._try_create_index(label)
                     self.labels.add(label)
 
         LOGGER.info('Indices have been created.')
 
+    def _get_relation_units(self, relation_file: str) -> Set[Tuple[str, Optional[int]]]:
+        """
+        Go over the relation file and collect the units of nodes it touches, which are the labels of start and end
+        nodes. If the file is sharded, the shard of start nodes rather than their label, as the file is partitioned
+        only by start nodes.
+        :param relation_file:
+        :return: Set of label and shard
+        """
+        shard = self._get_file_shard(relation_file)
+        units: Set[Tuple[str, Optional[int]]] = set()
+        for chunk in self._read_csv_chunks(relation_file, usecols=[RELATION_START_LABEL, RELATION_END_LABEL]):
+            units.update((label, shard) for label in chunk[RELATION_START_LABEL].unique())
+            units.update((label, None) for label in chunk[RELATION_END_LABEL].unique())
+        return units
+
+    def _read_csv_chunks(self, csv_file: str, usecols: Optional[List[str]] = None) -> Iterator[pandas.DataFrame]:
+        """
+        Reads the CSV file in chunks of neo4j_csv_read_chunk_size rows so that memory usage is bounded regardless of
+        the file size. Compressed files (gzip, zstd) are decompressed while being read, and Parquet files are read in
+        record batches.
+        :param csv_file:
+        :param usecols: If provided, only these columns are read
+        :return: Iterator of DataFrame
+        """
+        if parquet.is_parquet(csv_file):
+            for batch in parquet.iter_record_batches(csv_file, batch_size=self._csv_read_chunk_size, columns=usecols):
+                yield batch.to_pandas()
+            return
+
+        # Files are written in utf8 by FsNeo4jCSVLoader, regardless of the locale, both compressed and uncompressed
+        with compression.open_text_reader(csv_file, encoding='utf8') as csv_input:
+            yield from pandas.read_csv(csv_input, na_filter=False, usecols=usecols,
+                                       chunksize=self._csv_read_chunk_size)
+
+    def _read_csv_records(self, csv_file: str) -> Iterator[dict]:
+        """
+        Streams the CSV file as records where each record is a dict of header to value. Records of Parquet file are
+        converted from record batches as is, keeping the native types of the values.
+        NULL_MARKER (or null in Parquet) of a column with NULLABLE_SUFFIX is None, which is not set. Records of a file
+        keep the same columns, so that they are batched together regardless of their absent values. Null of other
+        columns in Parquet is absent from the record.
+        :param csv_file:
+        :return: Iterator of records
+        """
+        if parquet.is_parquet(csv_file):
+            for batch in parquet.iter_record_batches(csv_file, batch_size=self._csv_read_chunk_size):
+                if any(column.null_count for name, column in zip(batch.schema.names, batch.columns)
+                       if not name.endswith(NULLABLE_SUFFIX)):
+                    yield from ({k: v for k, v in record.items() if v is not None or k.endswith(NULLABLE_SUFFIX)}
+                                for record in batch.to_pylist())
+                else:
+                    yield from batch.to_pylist()
+            return
+
+        for chunk in self._read_csv_chunks(csv_file):
+            records = chunk.to_dict(orient='records')
+            nullable_columns = [name for name in chunk.columns if name.endswith(NULLABLE_SUFFIX)]
+            if not nullable_columns:
+                yield from records
+                continue
+
+            # NULL_MARKER makes pandas read the whole column as strings, thus unquoted values are parsed back
+            unquoted_columns = {name for name in nullable_columns
+                                if name[:-len(NULLABLE_SUFFIX)].endswith(UNQUOTED_SUFFIX)}
+            for record in records:
+                for name in nullable_columns:
+                    value = record[name]
+                    if value == NULL_MARKER:
+                        record[name] = None
+                    elif name in unquoted_columns:
+                        record[name] = _parse_unquoted_value(value)
+                yield record
+
     def _publish_node(self, node_file: str, tx: Transaction) -> Transaction:
         """
         Iterate over the csv records of a file, each csv record transform to Merge statement and will be executed.
@@ -250,13 +664,92 @@ class Neo4jCsvPublisher(Publisher):
         :return:
         """
 
-        with open(node_file, 'r', encoding='utf8') as node_csv:
-            for node_record in pandas.read_csv(node_csv, na_filter=False).to_dict(orient="records"):
-                stmt = self.create_node_merge_statement(node_record=node_record)
-                params = self._create_props_param(node_record)
-                tx = self._execute_statement(stmt, tx, params)
+        if self._checkpoint and self._checkpoint.is_committed(node_file):
+            LOGGER.info('Skipping %s as it is already committed', node_file)
+            return tx
+
+        progress = self._checkpoint.get_progress(node_file) if self._checkpoint else None
+        self._start_file(node_file, phase=MERGE_PHASE, offset=progress[1] if progress else 0)
+        node_records = islice(self._read_csv_records(node_file), self._current_offset, None)
+        if self._unwind_batch_size:
+            tx = self._publish_node_batches(node_records, tx=tx)
+        else:
+            tx = self._publish_node_records(node_records, tx=tx)
+
+        self._finish_file(node_file)
         return tx
 
+    def _publish_node_records(self, node_records: Iterable[dict], tx: Transaction) -> Transaction:
+        """
+        Executes a MERGE statement per node record
+        :param node_records:
+        :param tx:
+        :return:
+        """
+        for node_record in node_records:
+            stmt = self.create_node_merge_statement(node_record=node_record,
+                                                    is_unchanged=self._is_unchanged_node(node_record))
+            params = self._create_props_param(node_record)
+            self._stage_snapshot([node_record], key_func=self._get_node_snapshot_key)
+            tx = self._execute_statement(stmt, tx, params)
+            self._current_offset += 1
+        return tx
+
+    def _publish_node_batches(self, node_records: Iterable[dict], tx: Transaction) -> Transaction:
+        """
+        Groups node records by label and header, and executes one UNWIND MERGE statement per batch.
+        Example of Cypher query executed by this method:
+        UNWIND $rows AS row
+        MERGE (node:Column {key: row.KEY})
+        ON CREATE SET node.name = row.name, node.order_pos = row.order_pos, node.type = row.type
+        ON MATCH SET node.name = row.name, node.order_pos = row.order_pos, node.type = row.type
+
+        :param node_records:
+        :param tx:
+        :return:
+        """
+        start_offset = self._current_offset
+        for key, batch, handled in self._batch_records(node_records,
+                                                       key_func=lambda record: (record[NODE_LABEL_KEY],
+                                                                                frozenset(record),
+                                                                                self._is_unchanged_node(record))):
+            _, _, is_unchanged = key
+            stmt = self.create_node_merge_batch_statement(node_record=batch[0], is_unchanged=is_unchanged)
+            params = {UNWIND_ROWS_PARAM: [self._create_props_param(record) for record in batch]}
+            self._stage_snapshot(batch, key_func=self._get_node_snapshot_key)
+            tx = self._execute_statement(stmt, tx, params, count=len(batch))
+            self._current_offset = start_offset + handled
+        return tx
+
+    def _batch_records(self,
+                       records: Iterable[dict],
+                       key_func: Callable[[dict], Any]) -> Iterator[Tuple[Any, List[dict], int]]:
+        """
+        Groups records that share the same key into batches of at most neo4j_unwind_batch_size records.
+        A batch is yielded as soon as it's full, and the partially filled ones are yielded at the end.
+        Along with the key and the batch, it yields the number of leading records that are handled once the batch is
+        executed, which excludes the records still waiting in other batches.
+        :param records:
+        :param key_func: A function that returns grouping key of the record
+        :return: Iterator of key, batch and the number of leading records handled
+        """
+        # key -> (index of first record in the bucket, records)
+        buckets: Dict[Any, Tuple[int, List[dict]]] = {}
+        read = 0
+        for record in records:
+            key = key_func(record)
+            bucket = buckets.setdefault(key, (read, []))[1]
+            bucket.append(record)
+            read += 1
+            if len(bucket) >= self._unwind_batch_size:
+                buckets.pop(key)
+                yield key, bucket, min((first for first, _ in buckets.values()), default=read)
+
+        while buckets:
+            key = next(iter(buckets))
+            _, bucket = buckets.pop(key)
+            yield key, bucket, min((first for first, _ in buckets.values()), default=read)
+
     def is_create_only_node(self, node_record: dict) -> bool:
         """
         Check if node can be updated
@@ -268,23 +761,45 @@ class Neo4jCsvPublisher(Publisher):
         else:
             return False
 
-    def create_node_merge_statement(self, node_record: dict) -> str:
+    def create_node_merge_statement(self, node_record: dict, is_unchanged: bool = False) -> str:
         """
-        Creates node merge statement
+        Creates node merge statement. The statement is rendered once per label, header, create-only flag and
+        unchanged flag.
         :param node_record:
+        :param is_unchanged: If True, only published tag and timestamp are set when the node exists.
         :return:
         """
-        template = Template("""
-            MERGE (node:{{ LABEL }} {key: $KEY})
-            ON CREATE SET {{ PROP_BODY }}
-            {% if update %} ON MATCH SET {{ PROP_BODY }} {% endif %}
-        """)
-
-        prop_body = self._create_props_body(node_record, NODE_REQUIRED_KEYS, 'node')
+        is_create_only = self.is_create_only_node(node_record)
+        return self._get_statement(
+            ('node', node_record[NODE_LABEL_KEY], frozenset(node_record), is_create_only, is_unchanged),
+            lambda: self._render_node_merge_statement(NODE_MERGE_TEMPLATE, node_record, param_prefix='$',
+                                                      update=(not is_create_only), is_unchanged=is_unchanged))
 
-        return template.render(LABEL=node_record["LABEL"],
+    def create_node_merge_batch_statement(self, node_record: dict, is_unchanged: bool = False) -> str:
+        """
+        Creates node merge statement that UNWINDs list of rows sharing the label and header of the node_record
+        :param node_record: A representative record of the batch
+        :param is_unchanged: If True, only published tag and timestamp are set when the node exists.
+        :return:
+        """
+        is_create_only = self.is_create_only_node(node_record)
+        return self._get_statement(
+            ('node_batch', node_record[NODE_LABEL_KEY], frozenset(node_record), is_create_only, is_unchanged),
+            lambda: self._render_node_merge_statement(NODE_MERGE_BATCH_TEMPLATE, node_record, param_prefix='row.',
+                                                      update=(not is_create_only), is_unchanged=is_unchanged))
+
+    def _render_node_merge_statement(self,
+                                     template: Template,
+                                     node_record: dict,
+                                     param_prefix: str,
+                                     update: bool,
+                                     is_unchanged: bool) -> str:
+        prop_body = self._create_props_body(node_record, NODE_REQUIRED_KEYS, 'node', param_prefix=param_prefix)
+        return template.render(ROWS=UNWIND_ROWS_PARAM,
+                               LABEL=node_record[NODE_LABEL_KEY],
                                PROP_BODY=prop_body,
-                               update=(not self.is_create_only_node(node_record)))
+                               MATCH_PROP_BODY=self._create_touch_props_body('node') if is_unchanged else prop_body,
+                               update=update)
 
     def _publish_relation(self, relation_file: str, tx: Transaction) -> Transaction:
         """
@@ -301,97 +816,290 @@ class Neo4jCsvPublisher(Publisher):
         :return:
         """
 
-        if self._relation_preprocessor.is_perform_preprocess():
-            LOGGER.info('Pre-processing relation with %s', self._relation_preprocessor)
-
-            count = 0
-            with open(relation_file, 'r', encoding='utf8') as relation_csv:
-                for rel_record in pandas.read_csv(relation_csv, na_filter=False).to_dict(orient="records"):
-                    # TODO not sure if deadlock on badge node arises in preporcessing or not
-                    stmt, params = self._relation_preprocessor.preprocess_cypher(
-                        start_label=rel_record[RELATION_START_LABEL],
-                        end_label=rel_record[RELATION_END_LABEL],
-                        start_key=rel_record[RELATION_START_KEY],
-                        end_key=rel_record[RELATION_END_KEY],
-                        relation=rel_record[RELATION_TYPE],
-                        reverse_relation=rel_record[RELATION_REVERSE_TYPE])
-
-                    if stmt:
-                        tx = self._execute_statement(stmt, tx=tx, params=params)
-                        count += 1
-
-            LOGGER.info('Executed pre-processing Cypher statement %i times', count)
-
-        with open(relation_file, 'r', encoding='utf8') as relation_csv:
-            for rel_record in pandas.read_csv(relation_csv, na_filter=False).to_dict(orient="records"):
-                exception_exists = True
-                retries_for_exception = RETRIES_NUMBER
-                while exception_exists and retries_for_exception > 0:
-                    try:
-                        stmt = self.create_relationship_merge_statement(rel_record=rel_record)
-                        params = self._create_props_param(rel_record)
-                        tx = self._execute_statement(stmt, tx, params,
-                                                     expect_result=self._confirm_rel_created)
-                        exception_exists = False
-                    except TransientError as e:
-                        if rel_record[RELATION_START_LABEL] in self.deadlock_node_labels \
-                                or rel_record[RELATION_END_LABEL] in self.deadlock_node_labels:
-                            time.sleep(SLEEP_TIME)
-                            retries_for_exception -= 1
-                        else:
-                            raise e
+        if self._checkpoint and self._checkpoint.is_committed(relation_file):
+            LOGGER.info('Skipping %s as it is already committed', relation_file)
+            return tx
+
+        progress = self._checkpoint.get_progress(relation_file) if self._checkpoint else None
+        if self._relation_preprocessor.is_perform_preprocess() and not (progress and progress[0] == MERGE_PHASE):
+            self._start_file(relation_file, phase=PREPROCESS_PHASE)
+            tx = self._preprocess_relation(relation_file, tx=tx)
+
+        self._start_file(relation_file, phase=MERGE_PHASE,
+                         offset=progress[1] if progress and progress[0] == MERGE_PHASE else 0)
+        rel_records = islice(self._read_csv_records(relation_file), self._current_offset, None)
+        if self._unwind_batch_size:
+            tx = self._publish_relation_batches(rel_records, tx=tx)
+        else:
+            tx = self._publish_relation_records(rel_records, tx=tx)
+
+        self._finish_file(relation_file)
+        return tx
+
+    def _preprocess_relation(self, relation_file: str, tx: Transaction) -> Transaction:
+        """
+        Executes the statements provided by relation preprocessor for each relation record. If the preprocessor is
+        a RelationPreprocessor, it's called with a chunk of neo4j_csv_read_chunk_size relations at a time so that it
+        can provide batched statements. Otherwise, e.g: a preprocessor that only implements preprocess_cypher and
+        is_perform_preprocess, it's called per relation.
+        :param relation_file:
+        :param tx:
+        :return:
+        """
+        LOGGER.info('Pre-processing relation with %s', self._relation_preprocessor)
+
+        count = 0
+        if isinstance(self._relation_preprocessor, RelationPreprocessor):
+            for chunk in self._read_csv_chunks(relation_file):
+                tx, chunk_count = self._preprocess_relation_records(chunk.to_dict(orient='records'), tx=tx)
+                count += chunk_count
+        else:
+            # A preprocessor that doesn't extend RelationPreprocessor only provides preprocess_cypher per relation
+            tx, count = self._preprocess_relation_records(self._read_csv_records(relation_file), tx=tx)
+
+        LOGGER.info('Executed pre-processing Cypher statement %i times', count)
+        return tx
+
+    def _preprocess_relation_records(self, rel_records: Iterable[dict], tx: Transaction) -> Tuple[Transaction, int]:
+        """
+        Executes the statements provided by relation preprocessor for the relation records, in batch if the
+        preprocessor is a RelationPreprocessor.
+        :param rel_records:
+        :param tx:
+        :return: The transaction and the number of statements executed
+        """
+        count = 0
+        if isinstance(self._relation_preprocessor, RelationPreprocessor):
+            relations = [self._get_preprocess_relation(rel_record) for rel_record in rel_records]
+            for stmt, params in self._relation_preprocessor.preprocess_cypher_batch(relations):
+                tx = self._execute_statement(stmt, tx=tx, params=params)
+                count += 1
+            return tx, count
+
+        for rel_record in rel_records:
+            # TODO not sure if deadlock on badge node arises in preporcessing or not
+            stmt, params = self._relation_preprocessor.preprocess_cypher(**self._get_preprocess_relation(rel_record))
+
+            if stmt:
+                tx = self._execute_statement(stmt, tx=tx, params=params)
+                count += 1
+        return tx, count
+
+    @staticmethod
+    def _get_preprocess_relation(rel_record: dict) -> Dict[str, str]:
+        return {'start_label': rel_record[RELATION_START_LABEL],
+                'end_label': rel_record[RELATION_END_LABEL],
+                'start_key': rel_record[RELATION_START_KEY],
+                'end_key': rel_record[RELATION_END_KEY],
+                'relation': rel_record[RELATION_TYPE],
+                'reverse_relation': rel_record[RELATION_REVERSE_TYPE]}
+
+    def _publish_relation_records(self, rel_records: Iterable[dict], tx: Transaction) -> Transaction:
+        """
+        Executes a MERGE statement per relation record. Records touching any of deadlock_node_labels are retried on
+        TransientError.
+        :param rel_records:
+        :param tx:
+        :return:
+        """
+        for rel_record in rel_records:
+            is_unchanged = self._is_unchanged_relation(rel_record)
+            exception_exists = True
+            retries_for_exception = RETRIES_NUMBER
+            while exception_exists and retries_for_exception > 0:
+                try:
+                    stmt = self.create_relationship_merge_statement(rel_record=rel_record, is_unchanged=is_unchanged)
+                    params = self._create_props_param(rel_record)
+                    self._stage_snapshot([rel_record], key_func=self._get_relation_snapshot_key)
+                    tx = self._execute_statement(stmt, tx, params,
+                                                 expect_result=self._confirm_rel_created)
+                    exception_exists = False
+                except TransientError as e:
+                    if rel_record[RELATION_START_LABEL] in self.deadlock_node_labels \
+                            or rel_record[RELATION_END_LABEL] in self.deadlock_node_labels:
+                        time.sleep(SLEEP_TIME)
+                        retries_for_exception -= 1
+                    else:
+                        raise e
+            self._current_offset += 1
+
+        return tx
 
+    def _publish_relation_batches(self, rel_records: Iterable[dict], tx: Transaction) -> Transaction:
+        """
+        Groups relation records by (START_LABEL, END_LABEL, TYPE, REVERSE_TYPE) and header, and executes one UNWIND
+        MERGE statement per batch.
+        A batch that touches any of deadlock_node_labels is executed in its own transaction so that it can be retried
+        on TransientError without losing the other uncommitted statements.
+
+        :param rel_records:
+        :param tx:
+        :return:
+        """
+        start_offset = self._current_offset
+        for key, batch, handled in self._batch_records(rel_records,
+                                                       key_func=lambda record: (self._get_relation_shape(record),
+                                                                                frozenset(record),
+                                                                                self._is_unchanged_relation(record))):
+            _, _, is_unchanged = key
+            if batch[0][RELATION_START_LABEL] in self.deadlock_node_labels \
+                    or batch[0][RELATION_END_LABEL] in self.deadlock_node_labels:
+                tx = self._commit_transaction(tx)
+                tx = self._publish_relation_batch_with_retry(batch, tx=tx, retries=RETRIES_NUMBER,
+                                                             is_unchanged=is_unchanged)
+            else:
+                tx = self._publish_relation_batch(batch, tx=tx, is_unchanged=is_unchanged)
+            self._current_offset = start_offset + handled
         return tx
 
-    def create_relationship_merge_statement(self, rel_record: dict) -> str:
+    def _publish_relation_batch(self,
+                                batch: List[dict],
+                                tx: Transaction,
+                                is_unchanged: bool = False) -> Transaction:
+        """
+        Executes UNWIND MERGE statement for the batch of relation records. If neo4j_relationship_creation_confirm is
+        set, it confirms that both nodes are matched for every row in the batch.
+        :param batch:
+        :param tx:
+        :param is_unchanged: If True, the relationships in the batch are unchanged since the previous publish
+        :return:
+        """
+        stmt = self.create_relationship_merge_batch_statement(rel_record=batch[0], is_unchanged=is_unchanged)
+        params = {UNWIND_ROWS_PARAM: [self._create_props_param(record) for record in batch]}
+        self._stage_snapshot(batch, key_func=self._get_relation_snapshot_key)
+        return self._execute_statement(stmt, tx, params,
+                                       expected_count=len(batch) if self._confirm_rel_created else None,
+                                       count=len(batch))
+
+    def _publish_relation_batch_with_retry(self,
+                                           batch: List[dict],
+                                           tx: Transaction,
+                                           retries: int,
+                                           is_unchanged: bool = False) -> Transaction:
+        """
+        Executes the batch in its own transaction. When it fails with TransientError (e.g: deadlock), the batch is
+        bisected and each half is retried in its own transaction, so that contended rows end up in smaller batches.
+        A batch of single row is retried after SLEEP_TIME as it cannot be split anymore. Bisecting does not consume
+        the retries, thus each row is retried up to retries times on its own, regardless of the size of the batch.
+        :param batch:
+        :param tx: A transaction that does not have any uncommitted statement
+        :param retries: Number of remaining retries of a single row batch
+        :param is_unchanged: If True, the relationships in the batch are unchanged since the previous publish
+        :return:
+        """
+        try:
+            tx = self._publish_relation_batch(batch, tx=tx, is_unchanged=is_unchanged)
+            return self._commit_transaction(tx)
+        except TransientError as e:
+            if len(batch) == 1 and retries <= 0:
+                raise e
+
+            LOGGER.info('Retrying batch of %i relations due to transient error: %s', len(batch), e)
+            tx = self._session.begin_transaction()
+            if len(batch) == 1:
+                time.sleep(SLEEP_TIME)
+                return self._publish_relation_batch_with_retry(batch, tx=tx, retries=retries - 1,
+                                                               is_unchanged=is_unchanged)
+
+            middle = len(batch) // 2
+            tx = self._publish_relation_batch_with_retry(batch[:middle], tx=tx, retries=retries,
+                                                         is_unchanged=is_unchanged)
+            return self._publish_relation_batch_with_retry(batch[middle:], tx=tx, retries=retries,
+                                                           is_unchanged=is_unchanged)
+
+    def create_relationship_merge_statement(self, rel_record: dict, is_unchanged: bool = False) -> str:
         """
-        Creates relationship merge statement
+        Creates relationship merge statement. The statement is rendered once per labels, types, header and unchanged
+        flag.
         :param rel_record:
+        :param is_unchanged: If True, only published tag and timestamp are set when the relationship exists.
         :return:
         """
-        template = Template("""
-            MATCH (n1:{{ START_LABEL }} {key: $START_KEY}), (n2:{{ END_LABEL }} {key: $END_KEY})
-            MERGE (n1)-[r1:{{ TYPE }}]->(n2)-[r2:{{ REVERSE_TYPE }}]->(n1)
-            {% if update_prop_body %}
-            ON CREATE SET {{ prop_body }}
-            ON MATCH SET {{ prop_body }}
-            {% endif %}
-            RETURN n1.key, n2.key
-        """)
+        return self._get_statement(
+            ('relation', self._get_relation_shape(rel_record), frozenset(rel_record), is_unchanged),
+            lambda: self._render_relationship_merge_statement(RELATION_MERGE_TEMPLATE, rel_record, param_prefix='$',
+                                                              is_unchanged=is_unchanged))
 
-        prop_body_r1 = self._create_props_body(rel_record, RELATION_REQUIRED_KEYS, 'r1')
-        prop_body_r2 = self._create_props_body(rel_record, RELATION_REQUIRED_KEYS, 'r2')
+    def create_relationship_merge_batch_statement(self, rel_record: dict, is_unchanged: bool = False) -> str:
+        """
+        Creates relationship merge statement that UNWINDs list of rows sharing the labels, types and header of the
+        rel_record. It returns number of rows where both nodes are matched.
+        :param rel_record: A representative record of the batch
+        :param is_unchanged: If True, only published tag and timestamp are set when the relationship exists.
+        :return:
+        """
+        return self._get_statement(
+            ('relation_batch', self._get_relation_shape(rel_record), frozenset(rel_record), is_unchanged),
+            lambda: self._render_relationship_merge_statement(RELATION_MERGE_BATCH_TEMPLATE, rel_record,
+                                                              param_prefix='row.', is_unchanged=is_unchanged))
+
+    def _render_relationship_merge_statement(self,
+                                             template: Template,
+                                             rel_record: dict,
+                                             param_prefix: str,
+                                             is_unchanged: bool = False) -> str:
+        prop_body_r1 = self._create_props_body(rel_record, RELATION_REQUIRED_KEYS, 'r1', param_prefix=param_prefix)
+        prop_body_r2 = self._create_props_body(rel_record, RELATION_REQUIRED_KEYS, 'r2', param_prefix=param_prefix)
         prop_body = ' , '.join([prop_body_r1, prop_body_r2])
+        if is_unchanged:
+            match_prop_body = ' , '.join([self._create_touch_props_body('r1'), self._create_touch_props_body('r2')])
+        else:
+            match_prop_body = prop_body
 
-        return template.render(START_LABEL=rel_record["START_LABEL"],
-                               END_LABEL=rel_record["END_LABEL"],
-                               TYPE=rel_record["TYPE"],
-                               REVERSE_TYPE=rel_record["REVERSE_TYPE"],
+        return template.render(ROWS=UNWIND_ROWS_PARAM,
+                               START_LABEL=rel_record[RELATION_START_LABEL],
+                               END_LABEL=rel_record[RELATION_END_LABEL],
+                               TYPE=rel_record[RELATION_TYPE],
+                               REVERSE_TYPE=rel_record[RELATION_REVERSE_TYPE],
                                update_prop_body=prop_body_r1,
-                               prop_body=prop_body)
+                               prop_body=prop_body,
+                               match_prop_body=match_prop_body)
 
-    def _create_props_param(self, record_dict: dict) -> dict:
-        params = {}
-        for k, v in record_dict.items():
-            if k.endswith(UNQUOTED_SUFFIX):
-                k = k[:-len(UNQUOTED_SUFFIX)]
+    @staticmethod
+    def _get_relation_shape(rel_record: dict) -> Tuple[str, str, str, str]:
+        return (rel_record[RELATION_START_LABEL],
+                rel_record[RELATION_END_LABEL],
+                rel_record[RELATION_TYPE],
+                rel_record[RELATION_REVERSE_TYPE])
 
-            params[k] = v
-        return params
+    def _get_statement(self, cache_key: Tuple, render: Callable[[], str]) -> str:
+        """
+        Returns the statement cached under cache_key, or renders and caches it if it's the first time.
+        :param cache_key: A shape of the statement (e.g: label, header set, create only flag)
+        :param render: A function that renders the statement
+        :return:
+        """
+        stmt = self._statement_cache.get(cache_key)
+        if stmt is not None:
+            self._statement_cache_hits += 1
+            return stmt
+
+        self._statement_cache_misses += 1
+        stmt = render()
+        self._statement_cache[cache_key] = stmt
+        return stmt
+
+    def _create_props_param(self, record_dict: dict) -> dict:
+        return {get_property_name(k): v for k, v in record_dict.items()}
 
     def _create_props_body(self,
                            record_dict: dict,
                            excludes: Set,
-                           identifier: str) -> str:
+                           identifier: str,
+                           param_prefix: str = '$') -> str:
         """
         Creates properties body with params required for resolving template.
 
         e.g: Note that node.key3 is not quoted if header has UNQUOTED_SUFFIX.
         identifier.key1 = 'val1' , identifier.key2 = 'val2', identifier.key3 = val3
+        A property of header with NULLABLE_SUFFIX keeps its current value when the parameter is null.
+        identifier.key4 = coalesce($key4, identifier.key4)
 
         :param record_dict: A dict represents CSV row
         :param excludes: set of excluded columns that does not need to be in properties (e.g: KEY, LABEL ...)
         :param identifier: identifier that will be used in CYPHER query as shown on above example
+        :param param_prefix: prefix that refers the value of the property. '$' for the statement parameter,
+        'row.' for the row of UNWIND statement.
         :return: Properties body for Cypher statement
         """
         props = []
@@ -399,28 +1107,89 @@ class Neo4jCsvPublisher(Publisher):
             if k in excludes:
                 continue
 
-            if k.endswith(UNQUOTED_SUFFIX):
-                k = k[:-len(UNQUOTED_SUFFIX)]
-
-            props.append(f'{identifier}.{k} = ${k}')
+            name = get_property_name(k)
+            if k.endswith(NULLABLE_SUFFIX):
+                props.append(f'{identifier}.{name} = coalesce({param_prefix}{name}, {identifier}.{name})')
+            else:
+                props.append(f'{identifier}.{name} = {param_prefix}{name}')
 
-        props.append(f"{identifier}.{PUBLISHED_TAG_PROPERTY_NAME} = '{self.publish_tag}'")
-        props.append(f"{identifier}.{LAST_UPDATED_EPOCH_MS} = timestamp()")
+        props.append(self._create_touch_props_body(identifier))
 
         return ', '.join(props)
 
+    def _create_touch_props_body(self, identifier: str) -> str:
+        """
+        Creates properties body that only updates published tag and timestamp, which is what unchanged nodes and
+        relationships need to be kept from staleness removal.
+        :param identifier:
+        :return:
+        """
+        return f"{identifier}.{PUBLISHED_TAG_PROPERTY_NAME} = '{self.publish_tag}', " \
+               f"{identifier}.{LAST_UPDATED_EPOCH_MS} = timestamp()"
+
+    @staticmethod
+    def _get_node_snapshot_key(node_record: dict) -> str:
+        return json.dumps([node_record[NODE_LABEL_KEY], str(node_record[NODE_KEY_KEY])], ensure_ascii=False)
+
+    @staticmethod
+    def _get_relation_snapshot_key(rel_record: dict) -> str:
+        return json.dumps([rel_record[RELATION_START_LABEL], str(rel_record[RELATION_START_KEY]),
+                           rel_record[RELATION_END_LABEL], str(rel_record[RELATION_END_KEY]),
+                           rel_record[RELATION_TYPE]], ensure_ascii=False)
+
+    def _is_unchanged_node(self, node_record: dict) -> bool:
+        return self._is_unchanged(self._get_node_snapshot_key(node_record), node_record)
+
+    def _is_unchanged_relation(self, rel_record: dict) -> bool:
+        return self._is_unchanged(self._get_relation_snapshot_key(rel_record), rel_record)
+
+    def _is_unchanged(self, key: str, record: dict) -> bool:
+        """
+        Checks if the record has the same content hash as when it was last published, if snapshot is configured.
+        :param key: Snapshot key of the record
+        :param record:
+        :return:
+        """
+        if not self._snapshot:
+            return False
+
+        is_unchanged = self._snapshot.get(key) == Neo4jPublishSnapshot.content_hash(record)
+        if is_unchanged:
+            self._unchanged_count += 1
+        else:
+            self._changed_count += 1
+        return is_unchanged
+
+    def _stage_snapshot(self, records: Iterable[dict], key_func: Callable[[dict], str]) -> None:
+        """
+        Stages the content hash of the records that are about to be executed. They are recorded in the snapshot once
+        the transaction is committed, and discarded if it's rolled back.
+        :param records:
+        :param key_func: A function that returns snapshot key of the record
+        :return:
+        """
+        if not self._snapshot:
+            return
+
+        for record in records:
+            self._uncommitted_hashes[key_func(record)] = Neo4jPublishSnapshot.content_hash(record)
+
     def _execute_statement(self,
                            stmt: str,
                            tx: Transaction,
                            params: dict = None,
-                           expect_result: bool = False) -> Transaction:
+                           expect_result: bool = False,
+                           count: int = 1,
+                           expected_count: Optional[int] = None) -> Transaction:
         """
         Executes statement against Neo4j. If execution fails, it rollsback and raise exception.
         If 'expect_result' flag is True, it confirms if result object is not null.
         :param stmt:
         :param tx:
-        :param count:
+        :param params:
         :param expect_result: By having this True, it will validate if result object is not None.
+        :param count: Number of records the statement represents. (e.g: size of UNWIND batch)
+        :param expected_count: If set, it validates if the statement returned the same number in its count column.
         :return:
         """
         try:
@@ -430,21 +1199,172 @@ class Neo4jCsvPublisher(Publisher):
             if expect_result and not result.single():
                 raise RuntimeError(f'Failed to executed statement: {stmt}')
 
-            self._count += 1
-            if self._count > 1 and self._count % self._transaction_size == 0:
-                tx.commit()
-                LOGGER.info(f'Committed {self._count} statements so far')
-                return self._session.begin_transaction()
+            if expected_count is not None:
+                self._confirm_count(result, expected_count=expected_count, stmt=stmt)
 
-            if self._count > 1 and self._count % self._progress_report_frequency == 0:
-                LOGGER.info(f'Processed {self._count} statements so far')
+            previous_count = self._count
+            self._count += count
+            self._uncommitted_count += count
+            if self._transaction_sizer:
+                self._uncommitted_bytes += self._estimate_payload_bytes(params)
+        except Exception as e:
+            LOGGER.exception('Failed to execute Cypher query')
+            self._abort_transaction(tx, e)
+            raise e
 
+        if self._count > 1 and self._uncommitted_count >= self._transaction_size:
+            tx = self._commit_transaction(tx)
+            LOGGER.info(f'Committed {self._count} statements so far')
             return tx
+
+        if self._count > 1 and \
+                self._count // self._progress_report_frequency > previous_count // self._progress_report_frequency:
+            LOGGER.info(f'Processed {self._count} statements so far')
+
+        return tx
+
+    def _abort_transaction(self, tx: Transaction, e: Exception) -> None:
+        """
+        Rolls back the failed transaction, and discards what's tracked for its commit, including the count of its
+        statements, so that the statements retried are not counted twice. A transient error shrinks the transaction
+        size.
+        :param tx:
+        :param e: The failure of the transaction
+        :return:
+        """
+        if not tx.closed():
+            tx.rollback()
+        self._count -= self._uncommitted_count
+        self._uncommitted_count = 0
+        self._uncommitted_bytes = 0
+        self._uncommitted_hashes = {}
+        if isinstance(e, TransientError) and self._transaction_sizer:
+            self._transaction_size = self._transaction_sizer.on_transient_error()
+
+    @staticmethod
+    def _confirm_count(result: Any, expected_count: int, stmt: str) -> None:
+        """
+        Confirms the count column of the statement result is same as expected_count
+        :param result:
+        :param expected_count:
+        :param stmt:
+        :return:
+        """
+        record = result.single()
+        actual_count = record['count'] if record else 0
+        if actual_count != expected_count:
+            raise RuntimeError(f'Expected {expected_count} rows but only {actual_count} rows matched '
+                               f'while executing statement: {stmt}')
+
+    def _commit_transaction(self, tx: Transaction) -> Transaction:
+        """
+        Commits the transaction and begins a new one
+        :param tx:
+        :return: A new transaction
+        """
+        commit_start = time.time()
+        try:
+            tx.commit()
         except Exception as e:
-            LOGGER.exception('Failed to execute Cypher query')
-            if not tx.closed():
-                tx.rollback()
+            # Statements can be sent lazily on commit, thus their failures (e.g: deadlock) could surface here
+            LOGGER.exception('Failed to commit transaction')
+            self._abort_transaction(tx, e)
             raise e
+        if self._transaction_sizer:
+            self._transaction_size = self._transaction_sizer.on_commit(statements=self._uncommitted_count,
+                                                                       latency_sec=time.time() - commit_start,
+                                                                       payload_bytes=self._uncommitted_bytes)
+        self._uncommitted_count = 0
+        self._uncommitted_bytes = 0
+        self._record_snapshot()
+        self._record_checkpoint()
+        return self._session.begin_transaction()
+
+    def _create_transaction_sizer(self, initial_size: int) -> Optional[AdaptiveTransactionSizer]:
+        if not self._adaptive_transaction_size:
+            return None
+
+        return AdaptiveTransactionSizer(initial_size=initial_size,
+                                        min_size=self._min_transaction_size,
+                                        max_size=self._max_transaction_size,
+                                        target_commit_latency_sec=self._target_commit_latency_sec,
+                                        max_payload_bytes=self._max_transaction_payload_bytes)
+
+    @staticmethod
+    def _estimate_payload_bytes(params: Optional[dict]) -> int:
+        """
+        Approximates the size of statement parameters by the length of their string representation
+        :param params:
+        :return:
+        """
+        if not params:
+            return 0
+
+        rows = params.get(UNWIND_ROWS_PARAM)
+        if isinstance(rows, list):
+            return sum(len(str(v)) for row in rows for v in row.values())
+        return sum(len(str(v)) for v in params.values())
+
+    def _start_file(self, file: str, phase: str, offset: int = 0) -> None:
+        """
+        Marks the file as in progress, starting from offset.
+        :param file:
+        :param phase: Either PREPROCESS_PHASE or MERGE_PHASE
+        :param offset: Number of leading records that are already committed
+        :return:
+        """
+        if offset:
+            LOGGER.info('Resuming %s from record %i', file, offset)
+        self._current_file = file
+        self._current_phase = phase
+        self._current_offset = offset
+
+    def _finish_file(self, file: str) -> None:
+        """
+        Marks the file as finished. It will be recorded as committed on the next commit.
+        :param file:
+        :return:
+        """
+        self._finished_files.append(file)
+        self._current_file = None
+
+    def _record_checkpoint(self) -> None:
+        """
+        Records the progress made until the last commit into the checkpoint, if checkpoint is configured.
+        Note that the current offset could be behind the actual progress (e.g: the statement that triggered the commit
+        is not counted yet), which is safe as MERGE statements are idempotent.
+        :return:
+        """
+        if not self._checkpoint:
+            return
+
+        self._checkpoint.commit(committed_files=self._finished_files,
+                                in_progress_file=self._current_file,
+                                phase=self._current_phase,
+                                offset=self._current_offset)
+        self._finished_files = []
+
+    def _remove_checkpoint(self) -> None:
+        if self._checkpoint:
+            self._checkpoint.remove()
+
+    def _record_snapshot(self) -> None:
+        """
+        Records the content hashes of the records committed since the last commit, if snapshot is configured.
+        :return:
+        """
+        if not self._snapshot:
+            return
+
+        self._snapshot.update(self._uncommitted_hashes)
+        self._uncommitted_hashes = {}
+
+    def _close_snapshot(self) -> None:
+        if not self._snapshot:
+            return
+
+        LOGGER.info('Unchanged rows: %i, changed rows: %i', self._unchanged_count, self._changed_count)
+        self._snapshot.close()
 
     def _try_create_index(self, label: str) -> None:
         """
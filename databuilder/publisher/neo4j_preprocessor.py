@@ -5,7 +5,7 @@ import abc
 import logging
 import textwrap
 from typing import (
-    Dict, List, Optional, Tuple,
+    Any, Dict, List, Optional, Tuple,
 )
 
 LOGGER = logging.getLogger(__name__)
@@ -21,7 +21,8 @@ class RelationPreprocessor(object, metaclass=abc.ABCMeta):
     pre-process_cypher method. With preprocess_cypher defined, and with long transaction size, Neo4j publisher will
     atomically apply desired state.
 
-
+    If a Preprocessor can cover many relations with a single statement, it can override preprocess_cypher_batch,
+    which Neo4j Publisher calls with a chunk of relations at a time instead of calling preprocess_cypher per relation.
     """
 
     def preprocess_cypher(self,
@@ -55,6 +56,21 @@ class RelationPreprocessor(object, metaclass=abc.ABCMeta):
                                                reverse_relation=reverse_relation)
         return None
 
+    def preprocess_cypher_batch(self, relations: List[Dict[str, str]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Provides Cypher statements that will be executed before publishing a chunk of relations.
+        By default, it provides a statement per relation via preprocess_cypher.
+        :param relations: List of relations where each relation is a dict of start_label, end_label, start_key,
+        end_key, relation and reverse_relation.
+        :return: List of Cypher statement and its parameters
+        """
+        statements = []
+        for relation in relations:
+            statement = self.preprocess_cypher(**relation)
+            if statement:
+                statements.append(statement)
+        return statements
+
     @abc.abstractmethod
     def preprocess_cypher_impl(self,
                                start_label: str,
@@ -142,6 +158,15 @@ class DeleteRelationPreprocessor(RelationPreprocessor):
     RETURN count(*) as count;
     """)
 
+    RELATION_MERGE_BATCH_TEMPLATE = textwrap.dedent("""
+    UNWIND $rows AS row
+    MATCH (n1:{start_label} {{key: row.start_key }})-[r]-(n2:{end_label} {{key: row.end_key }})
+    {where_clause}
+    WITH row, collect(r)[..2] AS rels
+    FOREACH (r IN rels | DELETE r)
+    RETURN count(*) as count;
+    """)
+
     def __init__(self,
                  label_tuples: List[Tuple[str, str]] = None,
                  where_clause: str = '') -> None:
@@ -178,6 +203,33 @@ class DeleteRelationPreprocessor(RelationPreprocessor):
                                                                          end_label=end_label,
                                                                          where_clause=self._where_clause), params
 
+    def preprocess_cypher_batch(self, relations: List[Dict[str, str]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Provides DELETE Relation Cypher query per pair of start and end label, that UNWINDs the keys of the relations.
+        :param relations: List of relations where each relation is a dict of start_label, end_label, start_key,
+        end_key, relation and reverse_relation.
+        :return:
+        """
+        rows_by_labels: Dict[Tuple[str, str], List[Dict[str, str]]] = {}
+        for relation in relations:
+            if not self.filter(**relation):
+                continue
+
+            if not (relation['start_label'] or relation['end_label']
+                    or relation['start_key'] or relation['end_key']):
+                raise Exception(f'all labels and keys are required: {relation}')
+
+            rows_by_labels.setdefault((relation['start_label'], relation['end_label']), []).append(
+                {'start_key': relation['start_key'], 'end_key': relation['end_key']})
+
+        statements = []
+        for (start_label, end_label), rows in rows_by_labels.items():
+            stmt = DeleteRelationPreprocessor.RELATION_MERGE_BATCH_TEMPLATE.format(start_label=start_label,
+                                                                                   end_label=end_label,
+                                                                                   where_clause=self._where_clause)
+            statements.append((stmt, {'rows': rows}))
+        return statements
+
     def is_perform_preprocess(self) -> bool:
         return True
 
@@ -0,0 +1,118 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+import os
+import threading
+from typing import (
+    Dict, Iterable, Optional, Set, Tuple,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# Phases of publishing a file. Relation files are pre-processed before they are merged.
+PREPROCESS_PHASE = 'preprocess'
+MERGE_PHASE = 'merge'
+
+
+class Neo4jPublishCheckpoint(object):
+    """
+    Keeps track of the work committed by Neo4jCsvPublisher in a JSON file, so that a failed publish can be resumed
+    with the same job_publish_tag without redoing committed files.
+
+    The checkpoint holds the files that are fully committed, and for the files in progress, the phase and the number
+    of leading records that are committed. It's safe to under-report the progress as MERGE statements are idempotent,
+    thus the publisher records the progress conservatively.
+
+    Updates are thread safe, and the file is replaced atomically on every update.
+    """
+
+    def __init__(self,
+                 path: str,
+                 publish_tag: str,
+                 resume: bool = False) -> None:
+        self._path = path
+        self._publish_tag = publish_tag
+        self._lock = threading.Lock()
+        self._committed_files: Set[str] = set()
+        self._in_progress: Dict[str, Dict] = {}
+
+        if resume:
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self._path):
+            LOGGER.info('Checkpoint %s does not exist. Publishing from the beginning.', self._path)
+            return
+
+        with open(self._path, 'r', encoding='utf8') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+
+        if checkpoint.get('publish_tag') != self._publish_tag:
+            LOGGER.warning('Checkpoint %s is for publish tag %s, not %s. Publishing from the beginning.',
+                           self._path, checkpoint.get('publish_tag'), self._publish_tag)
+            return
+
+        self._committed_files = set(checkpoint.get('committed_files', []))
+        self._in_progress = checkpoint.get('in_progress', {})
+        LOGGER.info('Resuming from checkpoint %s. Committed files: %s, files in progress: %s',
+                    self._path, self._committed_files, self._in_progress)
+
+    def is_committed(self, file: str) -> bool:
+        """
+        :param file:
+        :return: True if the file is fully committed
+        """
+        return file in self._committed_files
+
+    def get_progress(self, file: str) -> Optional[Tuple[str, int]]:
+        """
+        :param file:
+        :return: A tuple of the phase and the number of leading records committed, if the file is in progress
+        """
+        progress = self._in_progress.get(file)
+        if not progress:
+            return None
+        return progress['phase'], progress['offset']
+
+    def commit(self,
+               committed_files: Iterable[str],
+               in_progress_file: Optional[str] = None,
+               phase: str = MERGE_PHASE,
+               offset: int = 0) -> None:
+        """
+        Records the work that has been committed and writes the checkpoint file.
+        :param committed_files: Files that have been fully committed
+        :param in_progress_file: A file that has been partially committed, if any
+        :param phase: Phase of the in progress file
+        :param offset: Number of leading records of the in progress file that have been committed
+        :return:
+        """
+        with self._lock:
+            for file in committed_files:
+                self._committed_files.add(file)
+                self._in_progress.pop(file, None)
+
+            if in_progress_file:
+                self._in_progress[in_progress_file] = {'phase': phase, 'offset': offset}
+
+            self._write()
+
+    def _write(self) -> None:
+        tmp_path = f'{self._path}.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as checkpoint_file:
+            json.dump({'publish_tag': self._publish_tag,
+                       'committed_files': sorted(self._committed_files),
+                       'in_progress': self._in_progress}, checkpoint_file)
+        os.replace(tmp_path, self._path)
+
+    def remove(self) -> None:
+        """
+        Removes the checkpoint file once the publish is complete
+        :return:
+        """
+        with self._lock:
+            if os.path.exists(self._path):
+                LOGGER.info('Removing checkpoint %s', self._path)
+                os.remove(self._path)
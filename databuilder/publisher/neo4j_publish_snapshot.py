@@ -0,0 +1,66 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import dbm
+import hashlib
+import json
+import logging
+import threading
+from typing import Dict, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Neo4jPublishSnapshot(object):
+    """
+    An on-disk index of record key to the content hash of the record, as of the last commit that published it.
+    Neo4jCsvPublisher uses it to tell the records that are unchanged since the previous publish, so that it only
+    needs to update published_tag and publisher_last_updated_epoch_ms of them.
+
+    The index is a dbm database, thus it does not need to fit in memory. Hashes are only added after the transaction
+    that published the records is committed, so the snapshot never claims more than what Neo4j has.
+    Keys of the records that are not published anymore stay in the snapshot. It's harmless as unchanged records are
+    still MERGEd, which re-creates them with all the properties if they have been removed from Neo4j meanwhile.
+
+    Updates are thread safe.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._db = dbm.open(path, 'c')
+        LOGGER.info('Opened snapshot %s', path)
+
+    @staticmethod
+    def content_hash(record: dict) -> str:
+        """
+        Computes a stable hash of the record that does not depend on the order of the columns
+        :param record: A dict of header to value
+        :return: Hex digest of the hash
+        """
+        content = json.dumps(sorted((k, str(v)) for k, v in record.items()), ensure_ascii=False)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        :param key:
+        :return: The content hash of the record as of the last publish, if any
+        """
+        with self._lock:
+            value = self._db.get(key)
+        return value.decode('utf-8') if value is not None else None
+
+    def update(self, hashes: Dict[str, str]) -> None:
+        """
+        Records the hashes of the records that have been committed
+        :param hashes: A dict of record key to content hash
+        :return:
+        """
+        with self._lock:
+            for key, content_hash in hashes.items():
+                self._db[key] = content_hash
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+        LOGGER.info('Closed snapshot %s', self._path)
@@ -0,0 +1,190 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import queue
+import threading
+import time
+from typing import (
+    List, Optional, Tuple,
+)
+
+from neo4j import Transaction
+from pyhocon import ConfigFactory, ConfigTree
+
+from databuilder.publisher.base_publisher import StreamingPublisher
+from databuilder.publisher.neo4j_csv_publisher import NODE_LABEL_KEY, Neo4jCsvPublisher
+
+LOGGER = logging.getLogger(__name__)
+
+# Maximum number of batches waiting to be published. The loader blocks when the queue is full.
+NEO4J_STREAM_QUEUE_SIZE = 'neo4j_stream_queue_size'
+
+DEFAULT_CONFIG = ConfigFactory.from_dict({NEO4J_STREAM_QUEUE_SIZE: 10})
+
+# Marks the end of the stream in the queue
+_END_OF_STREAM = None
+
+# Interval to check if the consumer has failed, while waiting for a room in the queue
+_PUT_TIMEOUT_SEC = 1
+
+
+class Neo4jStreamingPublisher(Neo4jCsvPublisher, StreamingPublisher):
+    """
+    A Neo4j publisher that publishes node and relationship records handed off by Neo4jStreamingLoader through a
+    bounded in-memory queue, without staging CSV files. It's meant for small and medium incremental jobs where writing
+    and re-reading files is pure overhead.
+
+    Records are published on a background thread while the task is running, with the same statements and options as
+    Neo4jCsvPublisher (UNWIND batches, create only nodes, relation preprocessor, diff snapshot).
+    Within each batch, nodes are MERGEd before relationships. Statements are committed every neo4j_transaction_size
+    statements, and the last transaction is only committed by publish(), once the task has succeeded. If the job fails,
+    the uncommitted transaction is rolled back. As with Neo4jCsvPublisher, the transactions committed before the
+    failure stay, and they carry published_tag of the job.
+    """
+
+    def __init__(self) -> None:
+        super(Neo4jStreamingPublisher, self).__init__()
+        self._thread: Optional[threading.Thread] = None
+
+    def init(self, conf: ConfigTree) -> None:
+        conf = conf.with_fallback(DEFAULT_CONFIG)
+        super(Neo4jStreamingPublisher, self).init(conf)
+
+        self._queue: queue.Queue = queue.Queue(maxsize=conf.get_int(NEO4J_STREAM_QUEUE_SIZE))
+        self._aborted = threading.Event()
+        self._error: Optional[Exception] = None
+        self._tx: Optional[Transaction] = None
+        self._batch_count = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._consume, name='neo4j-streaming-publisher', daemon=True)
+        self._thread.start()
+
+    def put(self, nodes: List[dict], relations: List[dict]) -> None:
+        """
+        Hands off a batch of node and relationship records to be published. It blocks while the queue is full.
+        :param nodes: Node records serialized by neo4_serializer
+        :param relations: Relationship records serialized by neo4_serializer
+        :return:
+        """
+        if self._thread is None:
+            raise RuntimeError('Neo4jStreamingPublisher should be started before records are put')
+
+        self._put((nodes, relations))
+
+    def _put(self, item: Optional[Tuple[List[dict], List[dict]]]) -> None:
+        while True:
+            if self._error:
+                raise RuntimeError('Failed to publish streamed records') from self._error
+
+            if not self._thread or not self._thread.is_alive():
+                raise RuntimeError('Neo4jStreamingPublisher is no longer consuming records, as it has been aborted '
+                                   'or has reached the end of the stream')
+
+            try:
+                self._queue.put(item, timeout=_PUT_TIMEOUT_SEC)
+                return
+            except queue.Full:
+                continue
+
+    def is_aborted(self) -> bool:
+        """
+        :return: True if publishing has failed or has been aborted, so that records put are never committed
+        """
+        return self._aborted.is_set() or self._error is not None
+
+    def _consume(self) -> None:
+        """
+        Publishes the batches from the queue until the end of the stream. The last transaction is left uncommitted.
+        :return:
+        """
+        tx = self._session.begin_transaction()
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is _END_OF_STREAM or self._aborted.is_set():
+                    break
+
+                nodes, relations = batch
+                tx = self._publish_batch(nodes, relations, tx=tx)
+                self._batch_count += 1
+        except Exception as e:
+            LOGGER.exception('Failed to publish streamed records')
+            self._error = e
+        finally:
+            self._tx = tx
+
+    def _publish_batch(self, nodes: List[dict], relations: List[dict], tx: Transaction) -> Transaction:
+        """
+        Publishes nodes and then relations of the batch, creating index for the labels seen for the first time.
+        :param nodes:
+        :param relations:
+        :param tx:
+        :return:
+        """
+        for label in {node[NODE_LABEL_KEY] for node in nodes} - self.labels:
+            self._try_create_index(label)
+            self.labels.add(label)
+
+        if self._unwind_batch_size:
+            tx = self._publish_node_batches(nodes, tx=tx)
+        else:
+            tx = self._publish_node_records(nodes, tx=tx)
+
+        if not relations:
+            return tx
+
+        if self._relation_preprocessor.is_perform_preprocess():
+            tx, _ = self._preprocess_relation_records(relations, tx=tx)
+
+        if self._unwind_batch_size:
+            return self._publish_relation_batches(relations, tx=tx)
+        return self._publish_relation_records(relations, tx=tx)
+
+    def publish_impl(self) -> None:
+        """
+        Waits until all the batches are published, and commits the last transaction
+        :return:
+        """
+        start = time.time()
+        self._put(_END_OF_STREAM)
+        if self._thread:
+            self._thread.join()
+
+        if self._error:
+            raise self._error
+
+        if self._tx is not None:
+            self._tx.commit()
+            self._record_snapshot()
+        LOGGER.info('Committed total %i statements from %i batches', self._count, self._batch_count)
+        LOGGER.info('Statement cache hits: %i, misses: %i', self._statement_cache_hits, self._statement_cache_misses)
+        LOGGER.info('Successfully published. Elapsed: %i seconds', time.time() - start)
+
+    def close(self) -> None:
+        """
+        Stops the consumer if it's still running, e.g: the task has failed, and rolls back the uncommitted transaction.
+        Snapshot is closed here, as it's needed until the last transaction is committed.
+        :return:
+        """
+        if self._thread and self._thread.is_alive():
+            LOGGER.warning('Aborting streaming publish')
+            self._aborted.set()
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queue.put(_END_OF_STREAM)
+            self._thread.join()
+
+        if self._tx is not None and not self._tx.closed():
+            LOGGER.info('Rolling back uncommitted transaction')
+            self._tx.rollback()
+        self._tx = None
+        self._close_snapshot()
+        self._snapshot = None
+
+    def get_scope(self) -> str:
+        return 'publisher.neo4j_streaming'
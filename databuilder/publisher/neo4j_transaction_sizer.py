@@ -0,0 +1,76 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AdaptiveTransactionSizer(object):
+    """
+    Chooses the number of statements per transaction based on what has been observed on previous commits.
+
+    After each commit, the size is scaled towards the one that would have taken target_commit_latency_sec, bounded by
+    halving and doubling at a time, and capped so that the payload of a transaction stays under max_payload_bytes.
+    On transient error (e.g: deadlock, memory pressure on server), the size is halved.
+    The size always stays within min_size and max_size.
+    """
+
+    def __init__(self,
+                 initial_size: int,
+                 min_size: int,
+                 max_size: int,
+                 target_commit_latency_sec: float,
+                 max_payload_bytes: int) -> None:
+        if min_size <= 0 or min_size > max_size:
+            raise Exception(f'Invalid transaction size bounds. min: {min_size}, max: {max_size}')
+
+        self._min_size = min_size
+        self._max_size = max_size
+        self._target_commit_latency_sec = target_commit_latency_sec
+        self._max_payload_bytes = max_payload_bytes
+        self.size = self._bound(initial_size)
+        LOGGER.info('Initial transaction size: %i', self.size)
+
+    def on_commit(self,
+                  statements: int,
+                  latency_sec: float,
+                  payload_bytes: int) -> int:
+        """
+        Adjusts the size based on a commit.
+        :param statements: Number of statements committed
+        :param latency_sec: Time taken to commit
+        :param payload_bytes: Approximate size of the statement parameters in the transaction
+        :return: New transaction size
+        """
+        if statements <= 0:
+            return self.size
+
+        if latency_sec > 0:
+            new_size = int(statements * self._target_commit_latency_sec / latency_sec)
+        else:
+            new_size = statements * 2
+        new_size = min(max(new_size, self.size // 2), self.size * 2)
+
+        if payload_bytes > 0:
+            new_size = min(new_size, int(statements * self._max_payload_bytes / payload_bytes))
+
+        self._update(self._bound(new_size),
+                     f'committed {statements} statements, {payload_bytes} bytes in {latency_sec:.3f} seconds')
+        return self.size
+
+    def on_transient_error(self) -> int:
+        """
+        Shrinks the size on transient error
+        :return: New transaction size
+        """
+        self._update(self._bound(self.size // 2), 'transient error')
+        return self.size
+
+    def _bound(self, size: int) -> int:
+        return min(max(size, self._min_size), self._max_size)
+
+    def _update(self, new_size: int, reason: str) -> None:
+        if new_size != self.size:
+            LOGGER.info('Changing transaction size from %i to %i: %s', self.size, new_size, reason)
+        self.size = new_size
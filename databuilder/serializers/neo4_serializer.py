@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from typing import (
-    Any, Dict, Optional,
+    Any, Dict, List, Optional, Tuple,
 )
 
 from databuilder.models.graph_node import GraphNode
@@ -49,6 +49,68 @@ def serialize_relationship(relationship: Optional[GraphRelationship]) -> Dict[st
     return relationship_dict
 
 
+# Headers shared by all the records of the same shape, keyed by attribute names and whether each value is unquoted
+_NODE_HEADERS: Dict[Tuple[Tuple[str, ...], Tuple[bool, ...]], Tuple[str, ...]] = {}
+_RELATIONSHIP_HEADERS: Dict[Tuple[Tuple[str, ...], Tuple[bool, ...]], Tuple[str, ...]] = {}
+_NODE_REQUIRED_HEADER = (NODE_LABEL, NODE_KEY)
+_RELATIONSHIP_REQUIRED_HEADER = (RELATION_START_KEY, RELATION_START_LABEL, RELATION_END_KEY, RELATION_END_LABEL,
+                                 RELATION_TYPE, RELATION_REVERSE_TYPE)
+
+
+def get_node_header(node: GraphNode) -> Tuple[str, ...]:
+    """
+    Returns the header of serialize_node(node), which is shared by all the nodes of the same shape, so that the node
+    can be written as a row of values without building a dict.
+    :param node:
+    :return: Header tuple
+    """
+    return _get_header(node.attributes, _NODE_REQUIRED_HEADER, _NODE_HEADERS)
+
+
+def get_node_values(node: GraphNode) -> List[Any]:
+    """
+    :param node:
+    :return: Values of serialize_node(node) in the order of get_node_header(node)
+    """
+    values = [node.label, node.key]
+    values.extend(node.attributes.values())
+    return values
+
+
+def get_relationship_header(relationship: GraphRelationship) -> Tuple[str, ...]:
+    """
+    Returns the header of serialize_relationship(relationship), which is shared by all the relationships of the same
+    shape.
+    :param relationship:
+    :return: Header tuple
+    """
+    return _get_header(relationship.attributes, _RELATIONSHIP_REQUIRED_HEADER, _RELATIONSHIP_HEADERS)
+
+
+def get_relationship_values(relationship: GraphRelationship) -> List[Any]:
+    """
+    :param relationship:
+    :return: Values of serialize_relationship(relationship) in the order of get_relationship_header(relationship)
+    """
+    values = [relationship.start_key, relationship.start_label, relationship.end_key, relationship.end_label,
+              relationship.type, relationship.reverse_type]
+    values.extend(relationship.attributes.values())
+    return values
+
+
+def _get_header(attributes: Dict[str, Any],
+                required_header: Tuple[str, ...],
+                headers: Dict[Tuple[Tuple[str, ...], Tuple[bool, ...]], Tuple[str, ...]]) -> Tuple[str, ...]:
+    # bool is a subclass of int, thus it's unquoted as well
+    shape = (tuple(attributes), tuple(isinstance(value, int) for value in attributes.values()))
+    header = headers.get(shape)
+    if header is None:
+        header = required_header + tuple(f'{key}{UNQUOTED_SUFFIX}' if is_unquoted else key
+                                         for key, is_unquoted in zip(*shape))
+        headers[shape] = header
+    return header
+
+
 def _get_neo4j_suffix_value(value: Any) -> str:
     if isinstance(value, int):
         return UNQUOTED_SUFFIX
@@ -0,0 +1,106 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import gzip
+import io
+from typing import IO, Optional
+
+# Supported compression codecs
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+# File extension appended for each codec. e.g: Table_0.csv.gz
+CODEC_EXTENSIONS = {
+    GZIP: '.gz',
+    ZSTD: '.zst',
+}
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def get_extension(codec: Optional[str]) -> str:
+    """
+    :param codec: Compression codec, or None for no compression
+    :return: File extension of the codec
+    """
+    if not codec:
+        return ''
+
+    if codec not in CODEC_EXTENSIONS:
+        raise Exception(f'Unsupported compression codec: {codec}. Supported codecs: {list(CODEC_EXTENSIONS)}')
+    return CODEC_EXTENSIONS[codec]
+
+
+def detect_codec(path: str) -> Optional[str]:
+    """
+    Detects compression codec of the file from its magic number, regardless of the file name.
+    :param path:
+    :return: Compression codec, or None if the file is not compressed
+    """
+    with open(path, 'rb') as f:
+        header = f.read(len(_ZSTD_MAGIC))
+
+    if header.startswith(_GZIP_MAGIC):
+        return GZIP
+    if header.startswith(_ZSTD_MAGIC):
+        return ZSTD
+    return None
+
+
+def open_text_writer(path: str,
+                     codec: Optional[str] = None,
+                     level: Optional[int] = None,
+                     append: bool = False,
+                     buffer_size: int = io.DEFAULT_BUFFER_SIZE) -> IO:
+    """
+    Opens a text file for writing, compressed with the codec. When appending to a compressed file, a new gzip member
+    or zstd frame is added, which readers decompress as a continuation of the file.
+    :param path:
+    :param codec: Compression codec, or None for no compression
+    :param level: Compression level. Default level of the codec is used if not provided
+    :param append: If True, appends to the file instead of truncating it
+    :param buffer_size: Write buffer size of uncompressed file. Compressed files are buffered by the codec.
+    :return: File object
+    """
+    if not codec:
+        return open(path, 'a' if append else 'w', encoding='utf8', newline='', buffering=buffer_size)
+
+    if codec == GZIP:
+        return gzip.open(path, 'at' if append else 'wt', compresslevel=level if level is not None else 9,
+                         encoding='utf8', newline='')
+
+    if codec == ZSTD:
+        zstandard = _import_zstandard()
+        cctx = zstandard.ZstdCompressor(level=level) if level is not None else zstandard.ZstdCompressor()
+        return zstandard.open(path, 'at' if append else 'wt', cctx=cctx, encoding='utf8', newline='')
+
+    raise Exception(f'Unsupported compression codec: {codec}. Supported codecs: {list(CODEC_EXTENSIONS)}')
+
+
+def open_text_reader(path: str, encoding: str = 'utf8') -> IO:
+    """
+    Opens a text file for reading, which is transparently decompressed if it's compressed with a supported codec.
+    :param path:
+    :param encoding: Encoding of the text, regardless of the codec
+    :return: File object
+    """
+    codec = detect_codec(path)
+    if codec == GZIP:
+        return gzip.open(path, 'rt', encoding=encoding, newline='')
+
+    if codec == ZSTD:
+        dctx = _import_zstandard().ZstdDecompressor()
+        return io.TextIOWrapper(dctx.stream_reader(open(path, 'rb'), read_across_frames=True),
+                                encoding=encoding, newline='')
+
+    return open(path, 'r', encoding=encoding, newline='')
+
+
+def _import_zstandard():  # type: ignore
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('zstandard is required for zstd compression. '
+                          'Install it with: pip install amundsen-databuilder[zstd]')
+    return zstandard
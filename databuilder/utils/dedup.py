@@ -0,0 +1,166 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+from typing import (
+    Any, Dict, Hashable, Optional, Set,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BloomFilter(object):
+    """
+    A Bloom filter sized for the expected number of items and false positive rate.
+    Items are bytes digests, where bit positions are derived from the digest by double hashing.
+    """
+
+    def __init__(self,
+                 capacity: int,
+                 error_rate: float) -> None:
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise Exception(f'Invalid Bloom filter parameters. capacity: {capacity}, error_rate: {error_rate}')
+
+        self._num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self._num_hashes = max(1, int(round(self._num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self._num_bits + 7) // 8)
+        LOGGER.info('Created Bloom filter with %i bits and %i hashes', self._num_bits, self._num_hashes)
+
+    def add(self, digest: bytes) -> bool:
+        """
+        Adds the item
+        :param digest: A digest of the item, at least 16 bytes
+        :return: True if the item was (probably) already added
+        """
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        exists = True
+        for i in range(self._num_hashes):
+            position = (h1 + i * h2) % self._num_bits
+            byte_index, mask = position >> 3, 1 << (position & 7)
+            if not self._bits[byte_index] & mask:
+                exists = False
+                self._bits[byte_index] |= mask
+        return exists
+
+
+class RecordDeduplicator(object):
+    """
+    Tells if a record is an exact duplicate of a record seen before, with bounded memory.
+
+    Digests of records are kept in an exact set up to max_exact_keys. Beyond that, new digests go to a Bloom filter,
+    which keeps memory bounded at the cost of error_rate chance of treating a new record as a duplicate.
+    """
+
+    def __init__(self,
+                 max_exact_keys: int,
+                 bloom_filter_capacity: int,
+                 bloom_filter_error_rate: float) -> None:
+        self._max_exact_keys = max_exact_keys
+        self._bloom_filter_capacity = bloom_filter_capacity
+        self._bloom_filter_error_rate = bloom_filter_error_rate
+        self._exact_keys: Set[bytes] = set()
+        self._bloom_filter: Optional[BloomFilter] = None
+        self.suppressed_count = 0
+
+    def is_duplicate(self, record: Dict[str, Any]) -> bool:
+        """
+        Checks if the record has been seen before, and remembers it.
+        :param record: A dict of header to value
+        :return: True if the record is a duplicate
+        """
+        digest = hashlib.sha1(json.dumps(sorted((k, str(v)) for k, v in record.items()),
+                                         ensure_ascii=False).encode('utf-8')).digest()
+        if digest in self._exact_keys:
+            self.suppressed_count += 1
+            return True
+
+        if len(self._exact_keys) < self._max_exact_keys:
+            self._exact_keys.add(digest)
+            return False
+
+        if self._bloom_filter is None:
+            LOGGER.info('Exceeded %i exact keys. Falling back to Bloom filter', self._max_exact_keys)
+            self._bloom_filter = BloomFilter(capacity=self._bloom_filter_capacity,
+                                             error_rate=self._bloom_filter_error_rate)
+
+        if self._bloom_filter.add(digest):
+            self.suppressed_count += 1
+            return True
+        return False
+
+
+class DedupRegistry(object):
+    """
+    Remembers keys of low-cardinality nodes and relations, e.g: Database, Cluster and Schema, so that the models
+    referencing them emit them only once.
+
+    A registry is scoped to a job: DefaultJob activates its registry while it's running and clears it on close, so that
+    a long-lived worker running many jobs neither grows it forever nor suppresses the nodes of a later job.
+    Up to max_keys keys are kept, and the least recently seen key is forgotten beyond that. Forgetting a key only makes
+    it emitted again, which is harmless as it's merged by the publisher.
+
+    To plug in a different strategy, subclass it and override is_new and clear.
+    """
+
+    def __init__(self,
+                 max_keys: int = 100000) -> None:
+        if max_keys <= 0:
+            raise Exception(f'Invalid max_keys for dedup registry: {max_keys}')
+        self._max_keys = max_keys
+        self._keys: 'OrderedDict[Hashable, None]' = OrderedDict()
+        self.evicted_count = 0
+
+    def is_new(self, key: Hashable) -> bool:
+        """
+        Checks if the key has not been seen before, and remembers it.
+        :param key: A hashable key, which should be namespaced by the caller, e.g: (label, node key)
+        :return: True if the key is seen for the first time
+        """
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return False
+
+        self._keys[key] = None
+        if len(self._keys) > self._max_keys:
+            self._keys.popitem(last=False)
+            self.evicted_count += 1
+        return True
+
+    def clear(self) -> None:
+        if self.evicted_count:
+            LOGGER.info('Dedup registry evicted %i keys beyond %i keys', self.evicted_count, self._max_keys)
+        self._keys.clear()
+        self.evicted_count = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+# Registry used by models outside of a job, e.g: when models are serialized directly
+_PROCESS_REGISTRY = DedupRegistry()
+
+# Registry of the running job per thread
+_active = threading.local()
+
+
+def get_dedup_registry() -> DedupRegistry:
+    """
+    :return: The registry of the running job, or the process-wide registry if there's no running job
+    """
+    registry = getattr(_active, 'registry', None)
+    return registry if registry is not None else _PROCESS_REGISTRY
+
+
+def set_dedup_registry(registry: Optional[DedupRegistry]) -> None:
+    """
+    Sets the registry used by models in the current thread.
+    :param registry: A registry, or None to use the process-wide registry
+    :return:
+    """
+    _active.registry = registry
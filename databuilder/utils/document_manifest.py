@@ -0,0 +1,51 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import json
+import os
+from typing import Any, Dict
+
+# A manifest of published documents maps the key of each document to the digest of its content. It's kept in a local
+# file between runs, to tell which documents have changed or disappeared since the previous run.
+
+
+def document_digest(document: Dict[str, Any]) -> str:
+    """
+    :param document:
+    :return: Digest of the content of the document, regardless of the order of its fields
+    """
+    content = json.dumps(document, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def read_manifest(path: str) -> Dict[str, str]:
+    """
+    :param path:
+    :return: Digests by key. Each line of the file is a JSON array of key and digest.
+    """
+    digests: Dict[str, str] = {}
+    with open(path, 'r', encoding='utf8') as f:
+        for line in f:
+            key, digest = json.loads(line)
+            digests[key] = digest
+    return digests
+
+
+def write_manifest(path: str, digests: Dict[str, str]) -> None:
+    """
+    Writes the manifest atomically, so that a failed write keeps the previous manifest.
+    :param path:
+    :param digests: Digests by key
+    :return:
+    """
+    dir_path = os.path.dirname(path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf8') as f:
+        for key, digest in digests.items():
+            f.write(json.dumps([key, digest], ensure_ascii=False))
+            f.write('\n')
+    os.replace(tmp_path, path)
@@ -0,0 +1,220 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    Any, Dict, List, Optional, Set, Tuple, Union,
+)
+
+from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import ConnectionError, TransportError
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _is_retryable_status(status: Any) -> bool:
+    """
+    Too many requests and server errors are worth retrying, while e.g: a mapping error fails again.
+    """
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+def is_succeeded(op_type: str, status: Any) -> bool:
+    """
+    :param op_type: Type of the action of an item in a bulk response, e.g: index, delete
+    :param status: Status of the item
+    :return: True if the item succeeded, where deleting a missing document is also a success
+    """
+    return isinstance(status, int) and (status < 300 or (op_type == 'delete' and status == 404))
+
+
+class BulkIndexer(object):
+    """
+    Sends bulk requests to Elasticsearch from a thread pool, as actions are added one by one.
+
+    Actions are grouped into chunks of up to chunk_size actions and max_chunk_bytes bytes of NDJSON. At most twice the
+    thread_count chunks are in flight, and add() blocks beyond that, which bounds the memory regardless of the number
+    of actions.
+
+    Items failed with a retryable status (429 or 5xx), or chunks failed to be sent, are retried up to max_retries
+    times with exponential backoff. Other failures are counted as errors, and flush() fails if the ratio of errors
+    exceeds max_error_ratio. The _ids of the failed items are kept in failed_ids, e.g: to leave them out of what's
+    recorded as indexed.
+    """
+
+    def __init__(self,
+                 client: Elasticsearch,
+                 thread_count: int = 4,
+                 chunk_size: int = 500,
+                 max_chunk_bytes: int = 10 * 1024 * 1024,
+                 max_retries: int = 3,
+                 initial_backoff: float = 2,
+                 max_backoff: float = 60,
+                 max_error_ratio: float = 0.0) -> None:
+        if thread_count <= 0 or chunk_size <= 0 or max_chunk_bytes <= 0:
+            raise Exception(f'Invalid bulk indexer parameters. thread_count: {thread_count}, '
+                            f'chunk_size: {chunk_size}, max_chunk_bytes: {max_chunk_bytes}')
+
+        self._client = client
+        self._chunk_size = chunk_size
+        self._max_chunk_bytes = max_chunk_bytes
+        self._max_retries = max_retries
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+        self._max_error_ratio = max_error_ratio
+
+        self._executor = ThreadPoolExecutor(max_workers=thread_count, thread_name_prefix='elasticsearch-bulk')
+        self._in_flight = threading.BoundedSemaphore(thread_count * 2)
+        self._futures: Set[Future] = set()
+
+        # _id and NDJSON of each item in the current chunk, where NDJSON is the action line followed by the source line
+        # if any
+        self._chunk: List[Tuple[Optional[str], str]] = []
+        self._chunk_bytes = 0
+
+        self.success_count = 0
+        self.error_count = 0
+        self.retry_count = 0
+        self.failed_ids: Set[str] = set()
+
+    def add(self,
+            action: Dict[str, Any],
+            source: Union[str, Dict[str, Any], None] = None) -> None:
+        """
+        Adds an action, which is sent once its chunk is full.
+        :param action: Action and its metadata, e.g: {'index': {'_index': 'table_search_index', '_type': 'table'}}
+        :param source: Document of the action. It's either a dict, or a str that's already serialized as a JSON line.
+        None for an action without a document, such as delete.
+        :return:
+        """
+        item = json.dumps(action) + '\n'
+        if source is not None:
+            item += (source if isinstance(source, str) else json.dumps(source)).rstrip('\n') + '\n'
+
+        item_id = next(iter(action.values())).get('_id')
+        item_bytes = len(item.encode('utf-8'))
+        if self._chunk and (len(self._chunk) >= self._chunk_size or
+                            self._chunk_bytes + item_bytes > self._max_chunk_bytes):
+            self._submit()
+
+        self._chunk.append((item_id, item))
+        self._chunk_bytes += item_bytes
+
+    def _submit(self) -> None:
+        chunk = self._chunk
+        self._chunk = []
+        self._chunk_bytes = 0
+
+        self._reap(block=False)
+        self._in_flight.acquire()
+        future = self._executor.submit(self._send, chunk)
+        future.add_done_callback(lambda _: self._in_flight.release())
+        self._futures.add(future)
+
+    def _reap(self, block: bool) -> None:
+        """
+        Collects the results of sent chunks, and re-raises the exception of a chunk failed to be sent.
+        :param block: If True, waits for all the chunks in flight
+        :return:
+        """
+        for future in list(self._futures):
+            if not block and not future.done():
+                continue
+
+            self._futures.discard(future)
+            success_count, failed_ids, retry_count = future.result()
+            self.success_count += success_count
+            self.error_count += len(failed_ids)
+            self.retry_count += retry_count
+            self.failed_ids.update(item_id for item_id in failed_ids if item_id is not None)
+
+    def _send(self, items: List[Tuple[Optional[str], str]]) -> Tuple[int, List[Optional[str]], int]:
+        """
+        Sends the items in a bulk request, retrying the ones failed with a retryable status.
+        :param items: _id and NDJSON of each item
+        :return: Number of succeeded items, _ids of failed items, and number of retries
+        """
+        success_count = retry_count = 0
+        failed_ids: List[Optional[str]] = []
+        backoff = self._initial_backoff
+        attempt = 0
+        while True:
+            can_retry = attempt < self._max_retries
+            try:
+                response = self._client.bulk(body=''.join(item for _, item in items))
+            except TransportError as e:
+                if not can_retry or not (isinstance(e, ConnectionError) or _is_retryable_status(e.status_code)):
+                    raise
+                LOGGER.warning('Failed to send bulk request of %i items: %s', len(items), e)
+                retry_items = items
+            else:
+                succeeded, failed, retry_items = self._check_response(items, response, can_retry)
+                success_count += succeeded
+                failed_ids.extend(failed)
+
+            if not retry_items:
+                return success_count, failed_ids, retry_count
+
+            attempt += 1
+            retry_count += len(retry_items)
+            LOGGER.info('Retrying %i items in %.1f seconds', len(retry_items), backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self._max_backoff)
+            items = retry_items
+
+    def _check_response(self,
+                        items: List[Tuple[Optional[str], str]],
+                        response: Dict[str, Any],
+                        can_retry: bool) -> Tuple[int, List[Optional[str]], List[Tuple[Optional[str], str]]]:
+        """
+        :param items: Items of the bulk request
+        :param response: Response of the bulk request, which has a result per item in the same order
+        :param can_retry: If False, the items failed with a retryable status are counted as failed
+        :return: Number of succeeded items, _ids of failed items, and the items to retry
+        """
+        if not response.get('errors'):
+            return len(items), [], []
+
+        success_count = 0
+        failed_ids: List[Optional[str]] = []
+        retry_items: List[Tuple[Optional[str], str]] = []
+        for item, result in zip(items, response['items']):
+            op_type, op_result = next(iter(result.items()))
+            status = op_result.get('status')
+            if is_succeeded(op_type, status):
+                success_count += 1
+            elif can_retry and _is_retryable_status(status):
+                retry_items.append(item)
+            else:
+                if not failed_ids:
+                    LOGGER.error('Failed to %s a document with status %s: %s', op_type, status, op_result.get('error'))
+                failed_ids.append(item[0])
+        return success_count, failed_ids, retry_items
+
+    def flush(self) -> None:
+        """
+        Sends the remaining actions, and waits for all the chunks in flight.
+        :return:
+        """
+        if self._chunk:
+            self._submit()
+        self._reap(block=True)
+
+        total_count = self.success_count + self.error_count
+        LOGGER.info('Bulk indexed %i items with %i errors and %i retries',
+                    self.success_count, self.error_count, self.retry_count)
+        if total_count and self.error_count / total_count > self._max_error_ratio:
+            raise Exception(f'Failed {self.error_count} out of {total_count} items of bulk requests, '
+                            f'which exceeds max error ratio {self._max_error_ratio}')
+
+    def close(self) -> None:
+        """
+        Waits for the chunks in flight without raising their failures, and stops the thread pool.
+        :return:
+        """
+        self._executor.shutdown(wait=True)
+        self._futures.clear()
@@ -0,0 +1,132 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import csv
+import logging
+from collections import OrderedDict
+from typing import (
+    IO, Any, Callable, Dict, Iterable, Optional, Sequence, Set,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FileHandlePool(object):
+    """
+    Keeps at most max_open_files files open for writing. When the limit is reached, the least recently used file is
+    closed, and it's reopened in append mode when it's written again.
+
+    Files are opened with opener(path, append), which should create the file when append is False.
+    """
+
+    def __init__(self,
+                 max_open_files: int,
+                 opener: Callable[[str, bool], IO]) -> None:
+        if max_open_files <= 0:
+            raise Exception(f'max_open_files should be positive: {max_open_files}')
+
+        self._max_open_files = max_open_files
+        self._opener = opener
+        # path -> file object, in the order of least recently used first
+        self._open_files: Dict[str, IO] = OrderedDict()
+        self._created_paths: Set[str] = set()
+        self.open_count = 0
+        self.reopen_count = 0
+        self.evict_count = 0
+
+    def get(self, path: str) -> IO:
+        """
+        Returns an open file of the path, opening it if needed.
+        :param path:
+        :return: File object. It's only valid until the next call, as it could be closed by eviction.
+        """
+        file = self._open_files.get(path)
+        if file is not None:
+            self._open_files.move_to_end(path)  # type: ignore
+            return file
+
+        if len(self._open_files) >= self._max_open_files:
+            evicted_path, evicted_file = self._open_files.popitem(last=False)  # type: ignore
+            LOGGER.debug('Closing least recently used file %s', evicted_path)
+            evicted_file.close()
+            self.evict_count += 1
+
+        append = path in self._created_paths
+        file = self._opener(path, append)
+        self._created_paths.add(path)
+        self._open_files[path] = file
+        self.open_count += 1
+        if append:
+            self.reopen_count += 1
+        return file
+
+    def release(self, path: str) -> None:
+        """
+        Closes the file of the path if it's open. It's reopened in append mode if it's requested again.
+        :param path:
+        :return:
+        """
+        file = self._open_files.pop(path, None)
+        if file is not None:
+            file.close()
+
+    def close(self) -> None:
+        """
+        Closes all the open files and reports the churn of file handles
+        :return:
+        """
+        while self._open_files:
+            _, file = self._open_files.popitem()  # type: ignore
+            file.close()
+
+        LOGGER.info('Wrote %i files. Opened files %i times, reopened %i times, evicted %i times',
+                    len(self._created_paths), self.open_count, self.reopen_count, self.evict_count)
+
+
+class PooledDictWriter(object):
+    """
+    A csv.DictWriter that writes to a file of FileHandlePool. The underlying csv writer is recreated when the file
+    has been reopened.
+    """
+
+    def __init__(self,
+                 pool: FileHandlePool,
+                 path: str,
+                 fieldnames: Iterable[str],
+                 **kwargs: Any) -> None:
+        self._pool = pool
+        self._path = path
+        self.fieldnames = tuple(fieldnames)
+        self._kwargs = kwargs
+        self._file: Optional[IO] = None
+        self._writer: Optional[csv.DictWriter] = None
+
+    def _get_writer(self) -> csv.DictWriter:
+        file = self._pool.get(self._path)
+        if file is not self._file or self._writer is None:
+            self._file = file
+            self._writer = csv.DictWriter(file, fieldnames=self.fieldnames, **self._kwargs)
+        return self._writer
+
+    def writeheader(self) -> None:
+        self._get_writer().writeheader()
+
+    def writerow(self, row: Dict[str, Any]) -> None:
+        self._get_writer().writerow(row)
+
+    def writevalues(self, values: Sequence[Any]) -> None:
+        """
+        Writes a row of values that are already in the order of fieldnames, skipping the dict lookups of writerow
+        :param values:
+        :return:
+        """
+        self._get_writer().writer.writerow(values)
+
+    def close(self) -> None:
+        """
+        Closes the file. Rows can still be written after it, which reopens the file in append mode.
+        :return:
+        """
+        self._pool.release(self._path)
+        self._file = None
+        self._writer = None
@@ -0,0 +1,171 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import os
+from typing import (
+    Any, Dict, Iterator, List, Optional,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# File format name and its extension
+PARQUET = 'parquet'
+PARQUET_EXTENSION = '.parquet'
+
+_PARQUET_MAGIC = b'PAR1'
+
+
+def is_parquet(path: str) -> bool:
+    """
+    Detects if the file is a Parquet file from its magic number, regardless of the file name.
+    :param path:
+    :return:
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(_PARQUET_MAGIC)) == _PARQUET_MAGIC
+
+
+class ParquetRowWriter(object):
+    """
+    Writes dict rows into a Parquet file, with the same interface as csv.DictWriter.writerow, so that it can be used
+    in place of it. Rows are buffered and written as a row group of row_group_size rows.
+
+    Column types are inferred from the values of each row group, and promoted across row groups: a column of only None
+    takes the type of its first non-null values, and an integer column becomes a double column with a float value.
+    As a Parquet file has a single schema, the row groups written so far are rewritten with the promoted schema when
+    it changes, which happens at most a few times per column. Types that can't be promoted, e.g: an integer column
+    with a string value, raise TypeError. All the rows are expected to have the same keys.
+    """
+
+    def __init__(self,
+                 path: str,
+                 row_group_size: int = 10000,
+                 compression: Optional[str] = None,
+                 compression_level: Optional[int] = None) -> None:
+        self._path = path
+        self._row_group_size = row_group_size
+        self._compression = compression
+        self._compression_level = compression_level
+        self._rows: List[Dict[str, Any]] = []
+        self._schema: Any = None
+        self._writer: Any = None
+
+    def writerow(self, row: Dict[str, Any]) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= self._row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+
+        pa, _ = _import_pyarrow()
+        schema = pa.Table.from_pylist(self._rows).schema
+        if self._schema is not None:
+            schema = _promote_schema(self._schema, schema)
+            if self._writer is not None and not schema.equals(self._schema):
+                self._rewrite(schema)
+        self._schema = schema
+
+        if self._writer is None:
+            self._writer = self._open_writer()
+        self._writer.write_table(pa.Table.from_pylist(self._rows, schema=self._schema))
+        self._rows = []
+
+    def _open_writer(self) -> Any:
+        _, pq = _import_pyarrow()
+        return pq.ParquetWriter(self._path, self._schema,
+                                compression=self._compression or 'snappy',
+                                compression_level=self._compression_level)
+
+    def _rewrite(self, schema: Any) -> None:
+        """
+        Rewrites the row groups written so far with the promoted schema. The file is moved aside and read back in
+        batches of row_group_size rows, so that memory usage is bounded regardless of the file size.
+        :param schema:
+        :return:
+        """
+        pa, _ = _import_pyarrow()
+        LOGGER.info('Rewriting %s with promoted schema %s', self._path, schema)
+        self._writer.close()
+        previous_path = f'{self._path}.rewrite'
+        os.replace(self._path, previous_path)
+
+        self._schema = schema
+        self._writer = self._open_writer()
+        try:
+            for batch in iter_record_batches(previous_path, batch_size=self._row_group_size):
+                self._writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+        finally:
+            os.remove(previous_path)
+
+    def close(self) -> None:
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _promote_schema(current: Any, new: Any) -> Any:
+    """
+    :param current: Schema of the rows written so far
+    :param new: Schema inferred from the new rows
+    :return: Schema that can hold the values of both
+    """
+    pa, _ = _import_pyarrow()
+    new_types = {field.name: field.type for field in new}
+    return pa.schema([field.with_type(_promote_type(field.name, field.type, new_types[field.name]))
+                      if field.name in new_types else field
+                      for field in current])
+
+
+def _promote_type(name: str, current: Any, new: Any) -> Any:
+    pa, _ = _import_pyarrow()
+    if current.equals(new) or pa.types.is_null(new):
+        return current
+    if pa.types.is_null(current):
+        return new
+    if (pa.types.is_integer(current) or pa.types.is_floating(current)) and \
+            (pa.types.is_integer(new) or pa.types.is_floating(new)):
+        return pa.float64()
+    if pa.types.is_list(current) and pa.types.is_list(new):
+        return pa.list_(_promote_type(name, current.value_type, new.value_type))
+    raise TypeError(f'Column {name} has values of incompatible types: {current} and {new}')
+
+
+def iter_record_batches(path: str,
+                        batch_size: int,
+                        columns: Optional[List[str]] = None) -> Iterator[Any]:
+    """
+    Reads the Parquet file in record batches of at most batch_size rows
+    :param path:
+    :param batch_size:
+    :param columns: If provided, only these columns are read
+    :return: Iterator of pyarrow.RecordBatch
+    """
+    _, pq = _import_pyarrow()
+    parquet_file = pq.ParquetFile(path)
+    try:
+        yield from parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+    finally:
+        parquet_file.close()
+
+
+def read_column_names(path: str) -> List[str]:
+    """
+    Reads the column names of the Parquet file from its schema, without reading the data
+    :param path:
+    :return:
+    """
+    _, pq = _import_pyarrow()
+    return list(pq.read_schema(path).names)
+
+
+def _import_pyarrow():  # type: ignore
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('pyarrow is required for Parquet format. '
+                          'Install it with: pip install amundsen-databuilder[parquet]')
+    return pyarrow, pyarrow.parquet
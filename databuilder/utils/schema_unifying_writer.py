@@ -0,0 +1,75 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import os
+import pickle
+from typing import (
+    Any, Callable, Dict, List,
+)
+
+from databuilder.utils.file_handle_pool import FileHandlePool
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SchemaUnifyingWriter(object):
+    """
+    Writes dict rows with different sets of keys into a single output, whose columns are the union of the keys.
+    Columns absent from a row are filled with null_value. With nullable_suffix, columns absent from any row are
+    renamed with the suffix, so that a reader can tell null_value from a value that happens to be the same.
+
+    As the union is only known once all the rows are written, rows are spooled into a file of pickled rows, and
+    written into the output on close. The output is opened by open_output(columns), which returns a writer with
+    writerow and close, e.g: PooledDictWriter or ParquetRowWriter.
+    """
+
+    def __init__(self,
+                 spool_path: str,
+                 spool_pool: FileHandlePool,
+                 open_output: Callable[[List[str]], Any],
+                 null_value: Any,
+                 nullable_suffix: str = '') -> None:
+        self._spool_path = spool_path
+        self._spool_pool = spool_pool
+        self._open_output = open_output
+        self._null_value = null_value
+        self._nullable_suffix = nullable_suffix
+        # Union of the columns in the order of appearance, to the number of rows that have the column
+        self._columns: Dict[str, int] = {}
+        self._row_count = 0
+
+    def writerow(self, row: Dict[str, Any]) -> None:
+        for column in row:
+            self._columns[column] = self._columns.get(column, 0) + 1
+        pickle.dump(row, self._spool_pool.get(self._spool_path), protocol=pickle.HIGHEST_PROTOCOL)
+        self._row_count += 1
+
+    def close(self) -> None:
+        """
+        Writes the spooled rows into the output with the union of the columns, and removes the spool.
+        :return:
+        """
+        if not self._row_count:
+            return
+
+        self._spool_pool.release(self._spool_path)
+        columns = list(self._columns)
+        output_columns = [f'{column}{self._nullable_suffix}' if count < self._row_count else column
+                          for column, count in self._columns.items()]
+        is_renamed = columns != output_columns
+        LOGGER.info('Writing %i rows with %i columns from %s', self._row_count, len(columns), self._spool_path)
+        output = self._open_output(output_columns)
+        try:
+            with open(self._spool_path, 'rb') as spool:
+                for _ in range(self._row_count):
+                    row = pickle.load(spool)
+                    if is_renamed:
+                        row = {output_column: row.get(column, self._null_value)
+                               for column, output_column in zip(columns, output_columns)}
+                    output.writerow(row)
+        finally:
+            output.close()
+
+        os.remove(self._spool_path)
+        self._row_count = 0
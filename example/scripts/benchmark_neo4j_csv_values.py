@@ -0,0 +1,59 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+A microbenchmark of the values fast path of FsNeo4jCSVLoader, which writes graph nodes into CSV without a dict per
+row. It compares:
+- dict: serialize_node builds a dict per node, which csv.DictWriter turns into a row.
+- values: get_node_header finds the header shared by the nodes of the same shape, and get_node_values is written
+  straight to csv.writer.
+
+GraphNode stays a namedtuple, which is already as compact as a record with __slots__, thus it's not compared.
+
+Usage: python example/scripts/benchmark_neo4j_csv_values.py [number of nodes]
+"""
+
+import csv
+import io
+import sys
+import timeit
+from typing import List
+
+from databuilder.models.graph_node import GraphNode
+from databuilder.serializers import neo4_serializer
+
+
+def create_nodes(count: int) -> List[GraphNode]:
+    return [GraphNode(key=f'hive://gold.schema/table_{i}/col_{i}',
+                      label='Column',
+                      attributes={'name': f'col_{i}', 'type': 'bigint', 'sort_order': i, 'is_partition': False})
+            for i in range(count)]
+
+
+def write_dicts(nodes: List[GraphNode]) -> None:
+    writer = None
+    for node in nodes:
+        node_dict = neo4_serializer.serialize_node(node)
+        if writer is None:
+            writer = csv.DictWriter(io.StringIO(), fieldnames=node_dict.keys(), quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(node_dict)
+
+
+def write_values(nodes: List[GraphNode]) -> None:
+    writer = csv.writer(io.StringIO(), quoting=csv.QUOTE_NONNUMERIC)
+    for node in nodes:
+        neo4_serializer.get_node_header(node)
+        writer.writerow(neo4_serializer.get_node_values(node))
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    nodes = create_nodes(count)
+
+    for name, func in [('dict', write_dicts), ('values', write_values)]:
+        seconds = min(timeit.repeat(lambda: func(nodes), number=1, repeat=5))
+        print(f'{name:>8}: {seconds:.3f} sec for {count} nodes ({count / seconds:,.0f} nodes/sec)')
+
+
+if __name__ == '__main__':
+    main()
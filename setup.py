@@ -69,8 +69,20 @@ atlas = [
     'pyatlasclient==1.1.2'
 ]
 
+zstd = [
+    'zstandard>=0.15.0'
+]
+
+parquet = [
+    'pyarrow>=8.0.0'
+]
+
+orjson = [
+    'orjson>=3.0.0'
+]
+
 all_deps = requirements + kafka + cassandra + glue + snowflake + athena + \
-    bigquery + jsonpath + db2 + dremio + druid + spark + feast
+    bigquery + jsonpath + db2 + dremio + druid + spark + feast + zstd + parquet + orjson
 
 setup(
     name='amundsen-databuilder',
@@ -82,7 +94,7 @@ setup(
     packages=find_packages(exclude=['tests*']),
     dependency_links=[],
     install_requires=requirements,
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     extras_require={
         'all': all_deps,
         'kafka': kafka,  # To use with Kafka source extractor
@@ -97,10 +109,12 @@ setup(
         'druid': druid,
         'delta': spark,
         'feast': feast,
-        'atlas': atlas
+        'atlas': atlas,
+        'zstd': zstd,  # To compress FsNeo4jCSVLoader output with zstd
+        'parquet': parquet,  # To use Parquet format between FsNeo4jCSVLoader and Neo4jCsvPublisher
+        'orjson': orjson  # To encode documents with orjson in FSElasticsearchJSONLoader
     },
     classifiers=[
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
     ],
 )
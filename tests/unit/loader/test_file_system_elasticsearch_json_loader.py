@@ -12,6 +12,7 @@ from pyhocon import ConfigFactory
 from databuilder import Scoped
 from databuilder.loader.file_system_elasticsearch_json_loader import FSElasticsearchJSONLoader
 from databuilder.models.table_elasticsearch_document import TableESDocument
+from databuilder.utils import compression
 
 
 class TestFSElasticsearchJSONLoader(unittest.TestCase):
@@ -159,3 +160,42 @@ class TestFSElasticsearchJSONLoader(unittest.TestCase):
         ] * 5
 
         self._check_results_helper(expected=expected)
+
+    def test_loading_compressed_with_orjson(self) -> None:
+        """
+        Test Loading functionality with gzip compression and orjson encoder, which produce the same documents
+        """
+        self.conf.put('loader.filesystem.elasticsearch.compression', 'gzip')
+        self.conf.put('loader.filesystem.elasticsearch.json_encoder', 'orjson')
+        loader = FSElasticsearchJSONLoader()
+        loader.init(conf=Scoped.get_scoped_conf(conf=self.conf,
+                                                scope=loader.get_scope()))
+
+        data = [TableESDocument(database='test_database',
+                                cluster='test_cluster',
+                                schema='test_schema',
+                                name=f'test_table{i}',
+                                key=f'test_table_key{i}',
+                                last_updated_timestamp=123456789,
+                                description='test_déscription',
+                                column_names=['test_col1', 'test_col2'],
+                                column_descriptions=['test_comment1', 'test_comment2'],
+                                total_usage=10,
+                                unique_usage=5,
+                                tags=['test_tag1', 'test_tag2'],
+                                badges=['badge1'],
+                                schema_description='schema_description',
+                                programmatic_descriptions=['test']) for i in range(3)]
+
+        for d in data:
+            loader.load(d)
+        loader.close()
+
+        self.assertEqual(compression.detect_codec(self.dest_file_name), compression.GZIP)
+        with compression.open_text_reader(self.dest_file_name) as file:
+            self.assertEqual([json.loads(line) for line in file], [json.loads(d.to_json()) for d in data])
+
+    def test_unsupported_json_encoder(self) -> None:
+        self.conf.put('loader.filesystem.elasticsearch.json_encoder', 'simplejson')
+        loader = FSElasticsearchJSONLoader()
+        self.assertRaises(Exception, loader.init, Scoped.get_scoped_conf(conf=self.conf, scope=loader.get_scope()))
@@ -20,6 +20,8 @@ from databuilder.loader.file_system_neo4j_csv_loader import FsNeo4jCSVLoader
 from databuilder.models.graph_serializable import (
     GraphNode, GraphRelationship, GraphSerializable,
 )
+from databuilder.publisher.neo4j_csv_publisher import NULL_MARKER
+from databuilder.utils import compression, parquet
 from tests.unit.models.test_graph_serializable import (
     Actor, City, Movie,
 )
@@ -82,6 +84,194 @@ class TestFsNeo4jCSVLoader(unittest.TestCase):
                                           itemgetter('KEY'))
         self.assertEqual(expected_nodes, actual_nodes)
 
+    def test_load_unify_schema(self) -> None:
+        loader = FsNeo4jCSVLoader()
+
+        folder = 'people'
+        conf = self._make_conf(folder).with_fallback(ConfigFactory.from_dict({
+            FsNeo4jCSVLoader.UNIFY_SCHEMA: True,
+            FsNeo4jCSVLoader.MAX_OPEN_FILES: 1
+        }))
+
+        loader.init(conf)
+        loader.load(Person("Taylor", job="Engineer"))
+        loader.load(Person("Griffin", pet="Lion"))
+        loader.load(Movie('Top Gun', [Actor('Tom Cruise')], [City('San Diego')]))
+        loader.close()
+
+        node_dir = conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH)
+        self.assertEqual(sorted(listdir(node_dir)), ['Actor.csv', 'City.csv', 'Movie.csv', 'Person.csv'])
+        with open(join(node_dir, 'Person.csv'), 'r') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows, [
+            {'name': 'Taylor', 'job:NULLABLE': 'Engineer', 'KEY': 'person://Taylor', 'LABEL': 'Person',
+             'pet:NULLABLE': NULL_MARKER},
+            {'name': 'Griffin', 'job:NULLABLE': NULL_MARKER, 'KEY': 'person://Griffin', 'LABEL': 'Person',
+             'pet:NULLABLE': 'Lion'},
+        ])
+        self.assertFalse(os.path.exists(loader._spool_dir))
+
+    def test_load_dedup_nodes(self) -> None:
+        loader = FsNeo4jCSVLoader()
+
+        folder = 'movies'
+        conf = self._make_conf(folder).with_fallback(ConfigFactory.from_dict({
+            FsNeo4jCSVLoader.DEDUP_NODES: True
+        }))
+
+        loader.init(conf)
+        for _ in range(2):
+            actors = [Actor('Tom Cruise'), Actor('Meg Ryan')]
+            cities = [City('San Diego'), City('Oakland')]
+            loader.load(Movie('Top Gun', actors, cities))
+        loader.close()
+
+        expected_node_path = os.path.join(here, f'../resources/fs_neo4j_csv_loader/{folder}/nodes')
+        expected_nodes = self._get_csv_rows(expected_node_path, itemgetter('KEY'))
+        actual_nodes = self._get_csv_rows(conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH),
+                                          itemgetter('KEY'))
+        self.assertEqual(expected_nodes, actual_nodes)
+        self.assertEqual(loader._node_deduplicator.suppressed_count, len(expected_nodes))  # type: ignore
+
+    def test_load_sharded(self) -> None:
+        loader = FsNeo4jCSVLoader()
+
+        folder = 'movies'
+        conf = self._make_conf(folder).with_fallback(ConfigFactory.from_dict({
+            FsNeo4jCSVLoader.SHARD_COUNTS: {'Actor': 2, 'Movie': 3}
+        }))
+
+        loader.init(conf)
+        actors = [Actor(f'Actor {i}') for i in range(10)]
+        loader.load(Movie('Top Gun', actors, [City('San Diego')]))
+        loader.close()
+
+        node_dir = conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH)
+        actor_files = sorted(f for f in listdir(node_dir) if f.startswith('Actor'))
+        self.assertEqual(actor_files, ['Actor_0_shard_0.csv', 'Actor_0_shard_1.csv'])
+        # Labels not in shard_counts are not sharded
+        self.assertIn('City_0.csv', listdir(node_dir))
+
+        for shard, actor_file in enumerate(actor_files):
+            with open(join(node_dir, actor_file), 'r') as f:
+                for row in csv.DictReader(f):
+                    self.assertEqual(loader._get_shard('Actor', row['KEY']), shard)
+
+        # Relations are sharded by start key, with the shard count of start label
+        relation_dir = conf.get_string(FsNeo4jCSVLoader.RELATION_DIR_PATH)
+        movie_shard = loader._get_shard('Movie', 'movie://Top Gun')
+        self.assertIn(f'Movie_Actor_ACTOR_shard_{movie_shard}.csv', listdir(relation_dir))
+
+    def test_load_max_open_files(self) -> None:
+        loader = FsNeo4jCSVLoader()
+
+        folder = 'movies'
+        conf = self._make_conf(folder).with_fallback(ConfigFactory.from_dict({
+            FsNeo4jCSVLoader.MAX_OPEN_FILES: 1,
+            FsNeo4jCSVLoader.COMPRESSION_CODEC: compression.ZSTD
+        }))
+
+        loader.init(conf)
+        for _ in range(2):
+            actors = [Actor('Tom Cruise'), Actor('Meg Ryan')]
+            cities = [City('San Diego'), City('Oakland')]
+            loader.load(Movie('Top Gun', actors, cities))
+        loader.close()
+        self.assertGreater(loader._file_pool.reopen_count, 0)
+
+        # Reopened files are appended, with a single header
+        expected_node_path = os.path.join(here, f'../resources/fs_neo4j_csv_loader/{folder}/nodes')
+        expected_nodes = self._get_csv_rows(expected_node_path, itemgetter('KEY'))
+        actual_nodes = self._get_csv_rows(conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH), itemgetter('KEY'))
+        self.assertEqual(sorted(list(expected_nodes) * 2, key=itemgetter('KEY')), actual_nodes)
+
+    def test_load_compressed(self) -> None:
+        actors = [Actor('Tom Cruise'), Actor('Meg Ryan')]
+        cities = [City('San Diego'), City('Oakland')]
+        movie = Movie('Top Gun', actors, cities)
+
+        loader = FsNeo4jCSVLoader()
+
+        folder = 'movies'
+        conf = self._make_conf(folder).with_fallback(ConfigFactory.from_dict({
+            FsNeo4jCSVLoader.COMPRESSION_CODEC: compression.GZIP,
+            FsNeo4jCSVLoader.COMPRESSION_LEVEL: 1
+        }))
+
+        loader.init(conf)
+        loader.load(movie)
+        loader.close()
+
+        node_dir = conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH)
+        self.assertTrue(all(f.endswith('.csv.gz') for f in listdir(node_dir)))
+        self.assertTrue(all(compression.detect_codec(join(node_dir, f)) == compression.GZIP
+                            for f in listdir(node_dir)))
+
+        expected_node_path = os.path.join(here, f'../resources/fs_neo4j_csv_loader/{folder}/nodes')
+        expected_nodes = self._get_csv_rows(expected_node_path, itemgetter('KEY'))
+        actual_nodes = self._get_csv_rows(node_dir, itemgetter('KEY'))
+        self.assertEqual(expected_nodes, actual_nodes)
+
+    def test_load_parquet(self) -> None:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        actors = [Actor('Tom Cruise'), Actor('Meg Ryan')]
+        cities = [City('San Diego'), City('Oakland')]
+        movie = Movie('Top Gun', actors, cities)
+
+        loader = FsNeo4jCSVLoader()
+
+        folder = 'movies'
+        conf = self._make_conf(folder).with_fallback(ConfigFactory.from_dict({
+            FsNeo4jCSVLoader.FILE_FORMAT: parquet.PARQUET
+        }))
+
+        loader.init(conf)
+        loader.load(movie)
+        loader.close()
+
+        for conf_key, sorting_key_getter in [(FsNeo4jCSVLoader.NODE_DIR_PATH, itemgetter('KEY')),
+                                             (FsNeo4jCSVLoader.RELATION_DIR_PATH, itemgetter('START_KEY', 'END_KEY'))]:
+            actual_dir = conf.get_string(conf_key)
+            self.assertTrue(all(f.endswith('.parquet') for f in listdir(actual_dir)))
+            actual = sorted((collections.OrderedDict(sorted(row.items()))
+                             for f in listdir(actual_dir)
+                             for row in pq.read_table(join(actual_dir, f)).to_pylist()),
+                            key=sorting_key_getter)
+
+            expected_dir = os.path.join(here, '../resources/fs_neo4j_csv_loader', folder, os.path.basename(actual_dir))
+            self.assertEqual(self._get_csv_rows(expected_dir, sorting_key_getter), actual)
+
+    def test_load_parquet_max_open_files(self) -> None:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        loader = FsNeo4jCSVLoader()
+
+        folder = 'movies'
+        conf = self._make_conf(folder).with_fallback(ConfigFactory.from_dict({
+            FsNeo4jCSVLoader.FILE_FORMAT: parquet.PARQUET,
+            FsNeo4jCSVLoader.MAX_OPEN_FILES: 1
+        }))
+
+        loader.init(conf)
+        # Parquet files are not limited by max_open_files, which is warned about
+        with self.assertLogs('databuilder.loader.file_system_neo4j_csv_loader', level='WARNING') as logs:
+            loader.load(Movie('Top Gun', [Actor('Tom Cruise')], [City('San Diego')]))
+        self.assertEqual(len(logs.output), 1)
+        loader.close()
+
+        node_dir = conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH)
+        self.assertEqual(loader._file_pool.open_count, 0)
+        self.assertEqual(sorted(row['KEY'] for f in listdir(node_dir)
+                                for row in pq.read_table(join(node_dir, f)).to_pylist()),
+                         ['actor://Tom Cruise', 'city://San Diego', 'movie://Top Gun'])
+
     def _make_conf(self, test_name: str) -> ConfigTree:
         prefix = '/var/tmp/TestFsNeo4jCSVLoader'
 
@@ -98,7 +288,7 @@ class TestFsNeo4jCSVLoader(unittest.TestCase):
 
         result = []
         for f in files:
-            with open(f, 'r') as f_input:
+            with compression.open_text_reader(f) as f_input:
                 reader = csv.DictReader(f_input)
                 for row in reader:
                     result.append(collections.OrderedDict(sorted(row.items())))
@@ -6,13 +6,13 @@ import unittest
 
 from databuilder.models.table_metadata import ColumnMetadata, TableMetadata
 from databuilder.serializers import neo4_serializer
+from databuilder.utils.dedup import get_dedup_registry
 
 
 class TestTableMetadata(unittest.TestCase):
     def setUp(self) -> None:
         super(TestTableMetadata, self).setUp()
-        TableMetadata.serialized_nodes_keys = set()
-        TableMetadata.serialized_rels_keys = set()
+        get_dedup_registry().clear()
 
     def test_serialize(self) -> None:
         self.table_metadata = TableMetadata('hive', 'gold', 'test_schema1', 'test_table1', 'test_table1', [
@@ -310,6 +310,22 @@ class TestTableMetadata(unittest.TestCase):
             self.assertNotEqual(node_row_serialized.get('LABEL'), 'Tag')
             node_row = self.table_metadata7.next_node()
 
+    def test_cached_keys(self) -> None:
+        column = ColumnMetadata('test_id1', 'description of test_table1', 'bigint', 0)
+        table_metadata = TableMetadata('hive', 'gold', 'test_schema', 'test_table', 'test_table', [column])
+
+        self.assertEqual(table_metadata._get_table_key(), 'hive://gold.test_schema/test_table')
+        self.assertIs(table_metadata._get_table_key(), table_metadata._get_table_key())
+        self.assertEqual(table_metadata._get_col_key(column), 'hive://gold.test_schema/test_table/test_id1')
+        self.assertEqual(table_metadata._get_schema_key(), 'hive://gold.test_schema')
+
+        # Keys are recomputed once the table is renamed, e.g: by a transformer
+        table_metadata.name = 'renamed_table'
+        self.assertEqual(table_metadata._get_table_key(), 'hive://gold.test_schema/renamed_table')
+        self.assertEqual(table_metadata._get_col_key(column), 'hive://gold.test_schema/renamed_table/test_id1')
+        column.name = 'renamed_id1'
+        self.assertEqual(table_metadata._get_col_key(column), 'hive://gold.test_schema/renamed_table/renamed_id1')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,16 +1,20 @@
 # Copyright Contributors to the Amundsen project.
 # SPDX-License-Identifier: Apache-2.0
 
+import gzip
+import io
 import json
+import tempfile
 import unittest
 
 from mock import (
-    MagicMock, mock_open, patch,
+    MagicMock, call, mock_open, patch,
 )
 from pyhocon import ConfigFactory
 
 from databuilder import Scoped
 from databuilder.publisher.elasticsearch_publisher import ElasticsearchPublisher
+from databuilder.utils.document_manifest import read_manifest
 
 
 class TestElasticsearchPublisher(unittest.TestCase):
@@ -115,3 +119,238 @@ class TestElasticsearchPublisher(unittest.TestCase):
                 {'actions': [{"add": {"index": self.test_es_new_index, "alias": self.test_es_alias}},
                              {"remove_index": {"index": 'test_old_index'}}]}
             )
+
+    def test_publish_streaming(self) -> None:
+        """
+        Test Publish functionality in streaming mode
+        """
+        mock_data = '\n'.join(json.dumps({'key': f'table{i}'}) for i in range(3)) + '\n'
+        self.mock_es_client.indices.get_alias.return_value = {'test_old_index': 'DOES_NOT_MATTER'}
+        self.mock_es_client.bulk.return_value = {'errors': False}
+        self.conf.put('publisher.elasticsearch.streaming', True)
+        self.conf.put('publisher.elasticsearch.batch_size', 2)
+
+        with patch('builtins.open', mock_open(read_data=mock_data)):
+            publisher = ElasticsearchPublisher()
+            publisher.init(conf=Scoped.get_scoped_conf(conf=self.conf, scope=publisher.get_scope()))
+            publisher.publish()
+
+            self.mock_es_client.indices.create.assert_called_once_with(
+                index=self.test_es_new_index, body=ElasticsearchPublisher.DEFAULT_ELASTICSEARCH_INDEX_MAPPING)
+
+            lines = [json.loads(line) for call in self.mock_es_client.bulk.call_args_list
+                     for line in call[1]['body'].splitlines()]
+            self.assertEqual(self.mock_es_client.bulk.call_count, 2)
+            self.assertEqual(sorted(line['key'] for line in lines[1::2]), ['table0', 'table1', 'table2'])
+            self.assertEqual(lines[0], {'index': {'_index': self.test_es_new_index, '_type': self.test_doc_type}})
+
+            self.mock_es_client.indices.update_aliases.assert_called_once_with(
+                {'actions': [{"add": {"index": self.test_es_new_index, "alias": self.test_es_alias}},
+                             {"remove_index": {"index": 'test_old_index'}}]}
+            )
+
+    def test_publish_streaming_with_errors(self) -> None:
+        """
+        Test alias is not swapped when documents failed to be indexed in streaming mode
+        """
+        mock_data = json.dumps({'key': 'table0'}) + '\n'
+        self.mock_es_client.bulk.return_value = {'errors': True, 'items': [{'index': {'status': 400}}]}
+        self.conf.put('publisher.elasticsearch.streaming', True)
+
+        with patch('builtins.open', mock_open(read_data=mock_data)):
+            publisher = ElasticsearchPublisher()
+            publisher.init(conf=Scoped.get_scoped_conf(conf=self.conf, scope=publisher.get_scope()))
+            self.assertRaises(Exception, publisher.publish)
+
+            self.mock_es_client.indices.update_aliases.assert_not_called()
+
+    def test_publish_bulk_optimized(self) -> None:
+        """
+        Test refresh and replicas are disabled during the load, and restored before the alias swap
+        """
+        mock_data = json.dumps({'key': 'table0'})
+        self.mock_es_client.indices.get_alias.return_value = {}
+        self.mock_es_client.indices.get_settings.return_value = {
+            self.test_es_new_index: {'settings': {'index': {'number_of_replicas': '2', 'number_of_shards': '5'}}}}
+        self.mock_es_client.cluster.health.return_value = {'status': 'green', 'timed_out': False}
+        self.conf.put('publisher.elasticsearch.bulk_optimized', True)
+        self.conf.put('publisher.elasticsearch.force_merge_max_segments', 1)
+
+        with patch('builtins.open', mock_open(read_data=mock_data)):
+            publisher = ElasticsearchPublisher()
+            publisher.init(conf=Scoped.get_scoped_conf(conf=self.conf, scope=publisher.get_scope()))
+            publisher.publish()
+
+        self.assertEqual(self.mock_es_client.indices.put_settings.call_args_list, [
+            call(index=self.test_es_new_index, body={'index': {'refresh_interval': '-1', 'number_of_replicas': 0}}),
+            call(index=self.test_es_new_index, body={'index': {'refresh_interval': None, 'number_of_replicas': '2'}}),
+        ])
+        self.mock_es_client.indices.forcemerge.assert_called_once_with(index=self.test_es_new_index,
+                                                                       max_num_segments=1, request_timeout=1800)
+        self.mock_es_client.cluster.health.assert_called_once_with(index=self.test_es_new_index,
+                                                                   wait_for_status='yellow', timeout='1800s',
+                                                                   request_timeout=1860)
+        self.mock_es_client.indices.update_aliases.assert_called_once()
+
+        # The calls to load the new index come in order, before the alias swap
+        method_names = [name for name, _, _ in self.mock_es_client.mock_calls]
+        self.assertEqual(method_names, ['indices.create', 'indices.get_settings', 'indices.put_settings', 'bulk',
+                                        'indices.put_settings', 'indices.refresh', 'indices.forcemerge',
+                                        'cluster.health', 'indices.get_alias',
+                                        'indices.update_aliases'])
+
+    def test_publish_bulk_optimized_not_green(self) -> None:
+        """
+        Test alias is not swapped when the new index doesn't become green, which is configured to wait for
+        """
+        mock_data = json.dumps({'key': 'table0'})
+        self.mock_es_client.indices.get_settings.return_value = {
+            self.test_es_new_index: {'settings': {'index': {'number_of_replicas': '1'}}}}
+        self.mock_es_client.cluster.health.return_value = {'status': 'yellow', 'timed_out': True}
+        self.conf.put('publisher.elasticsearch.bulk_optimized', True)
+        self.conf.put('publisher.elasticsearch.wait_for_status', 'green')
+
+        with patch('builtins.open', mock_open(read_data=mock_data)):
+            publisher = ElasticsearchPublisher()
+            publisher.init(conf=Scoped.get_scoped_conf(conf=self.conf, scope=publisher.get_scope()))
+            self.assertRaises(Exception, publisher.publish)
+
+        self.mock_es_client.indices.forcemerge.assert_not_called()
+        self.assertEqual(self.mock_es_client.cluster.health.call_args[1]['wait_for_status'], 'green')
+        self.mock_es_client.indices.update_aliases.assert_not_called()
+
+    def test_publish_incremental(self) -> None:
+        """
+        Test the first incremental publish rebuilds the index, and the next one only sends the changes
+        """
+        self.mock_es_client.bulk.return_value = {'errors': False}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = f'{tmp_dir}/manifest/table_search_index.jsonl'
+            self.conf.put('publisher.elasticsearch.incremental', True)
+            self.conf.put('publisher.elasticsearch.manifest_path', manifest_path)
+            self.conf.put('publisher.elasticsearch.key_field', 'key')
+
+            # No manifest yet, thus it's a full rebuild with the keys as ids
+            mock_data = '\n'.join(json.dumps({'key': f'table{i}', 'description': 'foo'}) for i in range(3))
+            self.mock_es_client.indices.get_alias.return_value = {}
+            self._publish(mock_data)
+
+            self.mock_es_client.indices.create.assert_called_once()
+            self.mock_es_client.indices.update_aliases.assert_called_once()
+            bulk_actions = self.mock_es_client.bulk.call_args[0][0]
+            self.assertEqual([action['index']['_id'] for action in bulk_actions[0::2]], ['table0', 'table1', 'table2'])
+            self.assertEqual(len(read_manifest(manifest_path)), 3)
+
+            # table1 is changed, table2 is gone, and table3 is new
+            self.mock_es_client.reset_mock()
+            self.mock_es_client.indices.get_alias.return_value = {'test_old_index': 'DOES_NOT_MATTER'}
+            mock_data = '\n'.join([json.dumps({'key': 'table0', 'description': 'foo'}),
+                                   json.dumps({'key': 'table1', 'description': 'bar'}),
+                                   json.dumps({'key': 'table3', 'description': 'foo'})])
+            self._publish(mock_data)
+
+            self.mock_es_client.indices.create.assert_not_called()
+            self.mock_es_client.indices.update_aliases.assert_not_called()
+            lines = [json.loads(line) for line in self.mock_es_client.bulk.call_args[1]['body'].splitlines()]
+            meta = {'_index': self.test_es_alias, '_type': self.test_doc_type}
+            self.assertEqual(lines, [{'index': {**meta, '_id': 'table1'}}, {'key': 'table1', 'description': 'bar'},
+                                     {'index': {**meta, '_id': 'table3'}}, {'key': 'table3', 'description': 'foo'},
+                                     {'delete': {**meta, '_id': 'table2'}}])
+            self.assertEqual(set(read_manifest(manifest_path)), {'table0', 'table1', 'table3'})
+
+    def test_publish_incremental_with_errors(self) -> None:
+        """
+        Test failed documents are not recorded in the manifest as published
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = f'{tmp_dir}/table_search_index.jsonl'
+            self.conf.put('publisher.elasticsearch.incremental', True)
+            self.conf.put('publisher.elasticsearch.manifest_path', manifest_path)
+            self.conf.put('publisher.elasticsearch.key_field', 'key')
+            self.conf.put('publisher.elasticsearch.max_error_ratio', 1.0)
+
+            # Full rebuild, where table1 fails
+            self.mock_es_client.indices.get_alias.return_value = {}
+            self.mock_es_client.bulk.return_value = {
+                'errors': True,
+                'items': [{'index': {'_id': 'table0', 'status': 201}},
+                          {'index': {'_id': 'table1', 'status': 400, 'error': 'mapper_parsing_exception'}},
+                          {'index': {'_id': 'table2', 'status': 201}}]}
+            self._publish('\n'.join(json.dumps({'key': f'table{i}', 'description': 'foo'}) for i in range(3)))
+            previous_digests = read_manifest(manifest_path)
+            self.assertEqual(set(previous_digests), {'table0', 'table2'})
+
+            # Incremental, where the update of table0 and the delete of table2 fail
+            self.mock_es_client.reset_mock()
+            self.mock_es_client.indices.get_alias.return_value = {'test_old_index': 'DOES_NOT_MATTER'}
+            self.mock_es_client.bulk.return_value = {
+                'errors': True,
+                'items': [{'index': {'status': 400}}, {'index': {'status': 201}}, {'delete': {'status': 400}}]}
+            self._publish('\n'.join([json.dumps({'key': 'table0', 'description': 'bar'}),
+                                     json.dumps({'key': 'table1', 'description': 'foo'})]))
+
+            # The failed documents keep their previous digests, so that they are sent again by the next run
+            digests = read_manifest(manifest_path)
+            self.assertEqual(set(digests), {'table0', 'table1', 'table2'})
+            self.assertEqual(digests['table0'], previous_digests['table0'])
+            self.assertEqual(digests['table2'], previous_digests['table2'])
+
+    def test_manifest_without_key_field(self) -> None:
+        """
+        Test key_field is required with manifest_path, as it varies by document type
+        """
+        self.conf.put('publisher.elasticsearch.manifest_path', 'manifest.jsonl')
+        with patch('builtins.open', mock_open(read_data='')):
+            publisher = ElasticsearchPublisher()
+            self.assertRaises(Exception, publisher.init,
+                              conf=Scoped.get_scoped_conf(conf=self.conf, scope=publisher.get_scope()))
+
+    def test_publish_manifest_with_dashboard_documents(self) -> None:
+        """
+        Test dashboard documents are tracked by their uri, and a document without the key_field fails clearly
+        """
+        self.mock_es_client.bulk.return_value = {'errors': False}
+        self.mock_es_client.indices.get_alias.return_value = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = f'{tmp_dir}/dashboard_search_index.jsonl'
+            self.conf.put('publisher.elasticsearch.manifest_path', manifest_path)
+            self.conf.put('publisher.elasticsearch.key_field', 'uri')
+
+            self._publish('\n'.join(json.dumps({'uri': f'mode_dashboard://gold.dg/d{i}', 'name': f'd{i}'})
+                                    for i in range(2)))
+            bulk_actions = self.mock_es_client.bulk.call_args[0][0]
+            self.assertEqual([action['index']['_id'] for action in bulk_actions[0::2]],
+                             ['mode_dashboard://gold.dg/d0', 'mode_dashboard://gold.dg/d1'])
+            self.assertEqual(set(read_manifest(manifest_path)),
+                             {'mode_dashboard://gold.dg/d0', 'mode_dashboard://gold.dg/d1'})
+
+            with self.assertRaisesRegex(Exception, 'Document has no uri field'):
+                self._publish(json.dumps({'key': 'table0', 'description': 'foo'}))
+
+    def test_publish_compressed(self) -> None:
+        """
+        Test Publish functionality with gzip compressed file
+        """
+        self.mock_es_client.indices.get_alias.return_value = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = f'{tmp_dir}/test_publisher_file.json.gz'
+            with gzip.open(file_path, 'wt', encoding='utf8') as f:
+                f.write(json.dumps({'key': 'table0', 'description': 'déscription'}) + '\n')
+            self.conf.put('publisher.elasticsearch.file_path', file_path)
+
+            publisher = ElasticsearchPublisher()
+            publisher.init(conf=Scoped.get_scoped_conf(conf=self.conf, scope=publisher.get_scope()))
+            publisher.publish()
+
+        self.mock_es_client.bulk.assert_called_once_with(
+            [{'index': {'_type': self.test_doc_type, '_index': self.test_es_new_index}},
+             {'key': 'table0', 'description': 'déscription'}]
+        )
+
+    def _publish(self, mock_data: str) -> None:
+        with patch('builtins.open', mock_open(read_data=mock_data)):
+            publisher = ElasticsearchPublisher()
+            publisher.init(conf=Scoped.get_scoped_conf(conf=self.conf, scope=publisher.get_scope()))
+        # The manifest is read and written with the real open
+        with patch.object(publisher, 'file_handler', io.StringIO(mock_data)):
+            publisher.publish()
@@ -0,0 +1,118 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import tempfile
+import unittest
+from typing import Any
+
+from mock import MagicMock
+from pyhocon import ConfigFactory, ConfigTree
+
+from databuilder.extractor.base_extractor import Extractor
+from databuilder.job.job import DefaultJob
+from databuilder.loader.elasticsearch_streaming_loader import ElasticsearchStreamingLoader
+from databuilder.models.table_elasticsearch_document import TableESDocument
+from databuilder.publisher.elasticsearch_streaming_publisher import ElasticsearchStreamingPublisher
+from databuilder.task.task import DefaultTask
+from databuilder.utils.document_manifest import read_manifest
+
+
+class TableESDocumentExtractor(Extractor):
+    def init(self, conf: ConfigTree) -> None:
+        self._documents = iter([TableESDocument(database='hive',
+                                                cluster='gold',
+                                                schema='test_schema',
+                                                name=f'test_table{i}',
+                                                key=f'hive://gold.test_schema/test_table{i}',
+                                                last_updated_timestamp=123456789,
+                                                description='test_description',
+                                                column_names=['test_col1'],
+                                                column_descriptions=['test_comment1'],
+                                                total_usage=10,
+                                                unique_usage=5,
+                                                tags=['test_tag1']) for i in range(5)])
+
+    def extract(self) -> Any:
+        return next(self._documents, None)
+
+    def get_scope(self) -> str:
+        return 'extractor.table_es_document'
+
+
+class FailingExtractor(TableESDocumentExtractor):
+    def extract(self) -> Any:
+        document = super(FailingExtractor, self).extract()
+        if document and document.name == 'test_table3':
+            raise RuntimeError('Extraction failed')
+        return document
+
+
+class TestElasticsearchStreamingPublisher(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.mock_es_client = MagicMock()
+        self.mock_es_client.bulk.return_value = {'errors': False}
+        self.mock_es_client.indices.get_alias.return_value = {'test_old_index': 'DOES_NOT_MATTER'}
+        self.conf = ConfigFactory.from_dict({
+            'publisher.elasticsearch_streaming.client': self.mock_es_client,
+            'publisher.elasticsearch_streaming.new_index': 'test_new_index',
+            'publisher.elasticsearch_streaming.alias': 'test_index_alias',
+            'publisher.elasticsearch_streaming.doc_type': 'table',
+            'publisher.elasticsearch_streaming.batch_size': 2,
+            'publisher.elasticsearch_streaming.thread_count': 2,
+        })
+
+    def _launch(self, extractor: Extractor) -> None:
+        publisher = ElasticsearchStreamingPublisher()
+        job = DefaultJob(conf=self.conf,
+                         task=DefaultTask(extractor=extractor, loader=ElasticsearchStreamingLoader(publisher)),
+                         publisher=publisher)
+        job.launch()
+
+    def test_publish(self) -> None:
+        self._launch(TableESDocumentExtractor())
+
+        self.mock_es_client.indices.create.assert_called_once()
+        self.assertEqual(self.mock_es_client.bulk.call_count, 3)
+        lines = [json.loads(line) for call in self.mock_es_client.bulk.call_args_list
+                 for line in call[1]['body'].splitlines()]
+        self.assertEqual(lines[0], {'index': {'_index': 'test_new_index', '_type': 'table'}})
+        self.assertEqual(sorted(line['name'] for line in lines[1::2]), [f'test_table{i}' for i in range(5)])
+
+        self.mock_es_client.indices.update_aliases.assert_called_once_with(
+            {'actions': [{'add': {'index': 'test_new_index', 'alias': 'test_index_alias'}},
+                         {'remove_index': {'index': 'test_old_index'}}]})
+        self.mock_es_client.indices.delete.assert_not_called()
+
+    def test_task_failure(self) -> None:
+        self.assertRaises(RuntimeError, self._launch, FailingExtractor())
+
+        self.mock_es_client.indices.update_aliases.assert_not_called()
+        self.mock_es_client.indices.delete.assert_called_once_with(index='test_new_index', ignore=[404])
+
+    def test_publish_failure(self) -> None:
+        self.mock_es_client.bulk.return_value = {'errors': True, 'items': [{'index': {'status': 400}}] * 2}
+
+        self.assertRaises(Exception, self._launch, TableESDocumentExtractor())
+
+        self.mock_es_client.indices.update_aliases.assert_not_called()
+        self.mock_es_client.indices.delete.assert_called_once_with(index='test_new_index', ignore=[404])
+
+    def test_publish_manifest_without_failed_documents(self) -> None:
+        self.mock_es_client.bulk.return_value = {'errors': True,
+                                                 'items': [{'index': {'status': 201}}, {'index': {'status': 400}}]}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = f'{tmp_dir}/table_search_index.jsonl'
+            self.conf.put('publisher.elasticsearch_streaming.manifest_path', manifest_path)
+            self.conf.put('publisher.elasticsearch_streaming.key_field', 'key')
+            self.conf.put('publisher.elasticsearch_streaming.max_error_ratio', 1.0)
+            self._launch(TableESDocumentExtractor())
+
+            # Each chunk has 2 documents in order, except the last one, and the second one of each chunk fails
+            self.assertEqual(set(read_manifest(manifest_path)), {f'hive://gold.test_schema/test_table{i}'
+                                                                 for i in (0, 2, 4)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from typing import Callable, List
+
+from mock import patch
+from pyhocon import ConfigFactory
+
+from databuilder.publisher import neo4j_csv_publisher
+from databuilder.publisher.neo4j_admin_import_publisher import Neo4jAdminImportPublisher
+from databuilder.utils import parquet
+
+here = os.path.dirname(__file__)
+
+
+class TestNeo4jAdminImportPublisher(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._resource_path = os.path.join(here, '../resources/neo4j_admin_import')
+        self._temp_dir = tempfile.mkdtemp()
+        self._output_dir = os.path.join(self._temp_dir, 'import')
+
+        self._publisher = Neo4jAdminImportPublisher()
+        self._publisher.init(ConfigFactory.from_dict({
+            neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+            neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+            neo4j_csv_publisher.JOB_PUBLISH_TAG: 'unit_test',
+            Neo4jAdminImportPublisher.OUTPUT_DIR: self._output_dir,
+        }))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._temp_dir)
+
+    def _read(self, path: str) -> List[List[str]]:
+        with open(path, 'r', encoding='utf8', newline='') as f:
+            return list(csv.reader(f))
+
+    def test_publish(self) -> None:
+        with patch('time.time', return_value=1000):
+            self._publisher.publish()
+
+        column_rows = self._read(f'{self._output_dir}/nodes/0_Column.csv')
+        self.assertEqual(column_rows, [
+            ['key:ID(Column)', ':LABEL', 'name', 'order_pos:long', 'is_partition:boolean',
+             'published_tag', 'publisher_last_updated_epoch_ms:long'],
+            ['presto://gold.test_schema1/test_table1/test_id1', 'Column', 'test_id1', '1', 'true',
+             'unit_test', '1000000'],
+            ['presto://gold.test_schema1/test_table1/test_id2', 'Column', 'test_id2', '2', 'false',
+             'unit_test', '1000000'],
+        ])
+
+        table_rows = self._read(f'{self._output_dir}/nodes/1_Table.csv')
+        self.assertEqual(table_rows[0], ['key:ID(Table)', ':LABEL', 'name',
+                                         'published_tag', 'publisher_last_updated_epoch_ms:long'])
+
+        forward_rows = self._read(f'{self._output_dir}/relationships/0_Table_Column.csv')
+        self.assertEqual(forward_rows, [
+            [':START_ID(Table)', ':END_ID(Column)', ':TYPE', 'read_count:double',
+             'published_tag', 'publisher_last_updated_epoch_ms:long'],
+            ['presto://gold.test_schema1/test_table1', 'presto://gold.test_schema1/test_table1/test_id1', 'COLUMN',
+             '1.5', 'unit_test', '1000000'],
+            ['presto://gold.test_schema1/test_table1', 'presto://gold.test_schema1/test_table1/test_id2', 'COLUMN',
+             '3', 'unit_test', '1000000'],
+        ])
+
+        reverse_rows = self._read(f'{self._output_dir}/relationships/0_Column_Table.csv')
+        self.assertEqual(reverse_rows[0][:3], [':START_ID(Column)', ':END_ID(Table)', ':TYPE'])
+        self.assertEqual(reverse_rows[1][:3], ['presto://gold.test_schema1/test_table1/test_id1',
+                                               'presto://gold.test_schema1/test_table1', 'BELONG_TO_TABLE'])
+
+        with open(f'{self._output_dir}/{Neo4jAdminImportPublisher.IMPORT_COMMAND_FILE_NAME}', 'r') as f:
+            command = f.read()
+        self.assertIn('neo4j-admin import', command)
+        self.assertIn('--database=neo4j', command)
+        self.assertIn('--skip-duplicate-nodes=true', command)
+        self.assertIn(f'--nodes={self._output_dir}/nodes/0_Column.csv', command)
+        self.assertIn(f'--relationships={self._output_dir}/relationships/0_Column_Table.csv', command)
+
+    def _publish_nodes(self, write_nodes: Callable[[str], None]) -> List[str]:
+        node_dir = os.path.join(self._temp_dir, 'nodes')
+        os.makedirs(node_dir)
+        write_nodes(node_dir)
+
+        publisher = Neo4jAdminImportPublisher()
+        publisher.init(ConfigFactory.from_dict({
+            neo4j_csv_publisher.NODE_FILES_DIR: node_dir,
+            neo4j_csv_publisher.JOB_PUBLISH_TAG: 'unit_test',
+            Neo4jAdminImportPublisher.OUTPUT_DIR: self._output_dir,
+        }))
+        with patch('time.time', return_value=1000):
+            publisher.publish()
+
+        with open(f'{self._output_dir}/nodes/0_Person.csv', 'r', encoding='utf8') as f:
+            return f.read().splitlines()
+
+    def test_publish_null_and_empty_string(self) -> None:
+        def write_nodes(node_dir: str) -> None:
+            with open(os.path.join(node_dir, 'Person.csv'), 'w', encoding='utf8') as f:
+                f.write('"name","job:NULLABLE","KEY","LABEL","age:UNQUOTED:NULLABLE"\n'
+                        f'"","{neo4j_csv_publisher.NULL_MARKER}","person://Taylor","Person","30"\n'
+                        f'"{neo4j_csv_publisher.NULL_MARKER}","","person://Griffin","Person",'
+                        f'"{neo4j_csv_publisher.NULL_MARKER}"\n')
+
+        # Only NULL_MARKER of nullable columns is null, which is an unquoted empty field
+        self.assertEqual(self._publish_nodes(write_nodes), [
+            '"key:ID(Person)",":LABEL","name","job","age:long","published_tag","publisher_last_updated_epoch_ms:long"',
+            '"person://Taylor","Person","",,"30","unit_test","1000000"',
+            f'"person://Griffin","Person","{neo4j_csv_publisher.NULL_MARKER}","",,"unit_test","1000000"',
+        ])
+
+    def test_publish_parquet(self) -> None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        def write_nodes(node_dir: str) -> None:
+            writer = parquet.ParquetRowWriter(os.path.join(node_dir, 'Person.parquet'))
+            writer.writerow({'name': 'Taylor', 'KEY': 'person://Taylor', 'LABEL': 'Person',
+                             'age:UNQUOTED:NULLABLE': 30, 'is_active:UNQUOTED': True})
+            writer.writerow({'name': '', 'KEY': 'person://Griffin', 'LABEL': 'Person',
+                             'age:UNQUOTED:NULLABLE': None, 'is_active:UNQUOTED': False})
+            writer.close()
+
+        self.assertEqual(self._publish_nodes(write_nodes), [
+            '"key:ID(Person)",":LABEL","name","age:long","is_active:boolean","published_tag",'
+            '"publisher_last_updated_epoch_ms:long"',
+            '"person://Taylor","Person","Taylor","30","true","unit_test","1000000"',
+            '"person://Griffin","Person","",,"false","unit_test","1000000"',
+        ])
+
+    def test_output_directory_exists(self) -> None:
+        os.makedirs(self._output_dir)
+        self.assertRaises(RuntimeError, self._publisher.init, ConfigFactory.from_dict({
+            neo4j_csv_publisher.JOB_PUBLISH_TAG: 'unit_test',
+            Neo4jAdminImportPublisher.OUTPUT_DIR: self._output_dir,
+        }))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,31 @@
 # Copyright Contributors to the Amundsen project.
 # SPDX-License-Identifier: Apache-2.0
 
+import json
 import logging
 import os
+import shutil
+import tempfile
 import unittest
 import uuid
+from typing import (
+    List, Optional, Tuple,
+)
 
 from mock import MagicMock, patch
 from neo4j import GraphDatabase
+from neo4j.exceptions import TransientError
 from pyhocon import ConfigFactory
 
+from databuilder.loader.file_system_neo4j_csv_loader import FsNeo4jCSVLoader
+from databuilder.models.graph_serializable import (
+    GraphNode, GraphRelationship, GraphSerializable,
+)
 from databuilder.publisher import neo4j_csv_publisher
 from databuilder.publisher.neo4j_csv_publisher import Neo4jCsvPublisher
+from databuilder.publisher.neo4j_preprocessor import DeleteRelationPreprocessor
+from databuilder.publisher.neo4j_publish_snapshot import Neo4jPublishSnapshot
+from databuilder.utils import compression, parquet
 
 here = os.path.dirname(__file__)
 
@@ -53,6 +67,10 @@ class TestPublish(unittest.TestCase):
             # 2 node files, 1 relation file
             self.assertEqual(mock_commit.call_count, 1)
 
+            # Statement is rendered once per Table, Column and Table-Column relation
+            self.assertEqual(publisher._statement_cache_misses, 3)
+            self.assertEqual(publisher._statement_cache_hits, 3)
+
     def test_preprocessor(self) -> None:
         with patch.object(GraphDatabase, 'driver') as mock_driver:
             mock_session = MagicMock()
@@ -89,6 +107,777 @@ class TestPublish(unittest.TestCase):
             # 2 node files, 1 relation file
             self.assertEqual(mock_commit.call_count, 1)
 
+    def test_batch_preprocessor(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            mock_run = MagicMock()
+            mock_transaction.run = mock_run
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.RELATION_PREPROCESSOR: DeleteRelationPreprocessor(),
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            # 4 nodes, a single delete statement for 2 relations, 2 relations
+            self.assertEqual(mock_run.call_count, 7)
+            delete_call = mock_run.call_args_list[4]
+            self.assertIn('UNWIND $rows AS row', delete_call[0][0].decode('utf-8'))
+            self.assertEqual(len(delete_call[1]['parameters']['rows']), 2)
+
+    def test_preprocessor_without_batch(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            publisher = Neo4jCsvPublisher()
+            publisher.init(ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.RELATION_PREPROCESSOR: _PerRelationPreprocessor(),
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}))
+            # The config holds a copy of the preprocessor
+            preprocessor = publisher._relation_preprocessor
+            publisher.publish()
+
+            # A preprocessor that doesn't extend RelationPreprocessor is called per relation
+            self.assertEqual([relation['end_key'] for relation in preprocessor.relations],
+                             ['presto://gold.test_schema1/test_table1/test_id1',
+                              'presto://gold.test_schema1/test_table1/test_id2'])
+            statements = [call[0][0] for call in mock_transaction.run.call_args_list]
+            self.assertEqual(statements.count(b'MATCH (f:Foo) RETURN f'), 2)
+
+    def test_publisher_unwind_batch(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            mock_run = MagicMock()
+            mock_transaction.run = mock_run
+            mock_commit = MagicMock()
+            mock_transaction.commit = mock_commit
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 100,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            node_calls = [call for call in mock_run.call_args_list if b'MERGE (node:' in call[0][0]]
+            # 2 node files with 2 rows each, one UNWIND statement per file
+            self.assertEqual(len(node_calls), 2)
+            for node_call in node_calls:
+                self.assertIn(b'UNWIND $rows AS row', node_call[0][0])
+                self.assertEqual(len(node_call[1]['parameters']['rows']), 2)
+
+            column_call = next(call for call in node_calls if b'Column' in call[0][0])
+            self.assertIn(b'node.order_pos = row.order_pos', column_call[0][0])
+            self.assertEqual(column_call[1]['parameters']['rows'][0]['order_pos'], 1)
+
+            self.assertEqual(mock_commit.call_count, 1)
+
+    def test_publisher_unwind_batch_relation(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            mock_run = MagicMock()
+            mock_run.return_value.single.return_value = {'count': 2}
+            mock_transaction.run = mock_run
+            mock_commit = MagicMock()
+            mock_transaction.commit = mock_commit
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 100,
+                 neo4j_csv_publisher.NEO4J_RELATIONSHIP_CREATION_CONFIRM: True,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            # 2 node statements, 1 relation statement
+            self.assertEqual(mock_run.call_count, 3)
+            rel_call = mock_run.call_args_list[-1]
+            self.assertIn(b'MERGE (n1)-[r1:COLUMN]->(n2)-[r2:BELONG_TO_TABLE]->(n1)', rel_call[0][0])
+            self.assertEqual(len(rel_call[1]['parameters']['rows']), 2)
+
+            mock_run.return_value.single.return_value = {'count': 1}
+            publisher._relation_files_iter = iter(publisher._relation_files)
+            publisher._node_files_iter = iter([])
+            self.assertRaises(RuntimeError, publisher.publish)
+
+    def test_publisher_unwind_batch_relation_deadlock(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver, \
+                patch.object(neo4j_csv_publisher.time, 'sleep') as mock_sleep:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            batch_sizes = []
+
+            def run(stmt: bytes, parameters: dict) -> MagicMock:
+                if b'MATCH (n1' in stmt:
+                    batch_sizes.append(len(parameters['rows']))
+                    if len(parameters['rows']) > 1:
+                        raise TransientError('deadlock detected')
+                return MagicMock()
+
+            mock_transaction.run = MagicMock(side_effect=run)
+            mock_commit = MagicMock()
+            mock_transaction.commit = mock_commit
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 100,
+                 neo4j_csv_publisher.NEO4J_DEADLOCK_NODE_LABELS: ['Column'],
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            # Whole batch fails and each half succeeds on its own
+            self.assertEqual(batch_sizes, [2, 1, 1])
+            mock_sleep.assert_not_called()
+            # pending commit before the batch, one per half, and the final commit
+            self.assertEqual(mock_commit.call_count, 4)
+
+    def test_publisher_relation_deadlock_retries_per_row(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver, \
+                patch.object(neo4j_csv_publisher.time, 'sleep') as mock_sleep:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_transaction.closed.return_value = False
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            # The first row deadlocks in any batch with other rows, and once on its own
+            failures = {'single': 1}
+
+            def run(stmt: bytes, parameters: dict) -> MagicMock:
+                rows = parameters['rows']
+                if rows[0]['END_KEY'] == 'column://0':
+                    if len(rows) > 1:
+                        raise TransientError('deadlock detected')
+                    if failures['single']:
+                        failures['single'] -= 1
+                        raise TransientError('deadlock detected')
+                return MagicMock()
+
+            mock_transaction.run = MagicMock(side_effect=run)
+
+            publisher = Neo4jCsvPublisher()
+            publisher.init(ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}))
+
+            # Bisecting 64 rows down to the first row takes more steps than the retries
+            batch = [{'START_LABEL': 'Table', 'START_KEY': 'table://0', 'END_LABEL': 'Column',
+                      'END_KEY': f'column://{i}', 'TYPE': 'COLUMN', 'REVERSE_TYPE': 'BELONG_TO_TABLE'}
+                     for i in range(64)]
+            publisher._publish_relation_batch_with_retry(batch, tx=mock_transaction,
+                                                         retries=neo4j_csv_publisher.RETRIES_NUMBER)
+
+            mock_sleep.assert_called_once()
+            self.assertEqual(mock_transaction.run.call_args[1]['parameters']['rows'], batch[32:])
+            self.assertEqual(publisher._count, 64)
+
+    def test_publisher_parallel(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            mock_run = MagicMock()
+            mock_transaction.run = mock_run
+            mock_commit = MagicMock()
+            mock_transaction.commit = mock_commit
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_NODE_PUBLISH_WORKERS: 2,
+                 neo4j_csv_publisher.NEO4J_RELATION_PUBLISH_WORKERS: 2,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            self.assertEqual(mock_run.call_count, 6)
+            self.assertEqual(publisher._count, 6)
+            self.assertEqual(publisher._statement_cache_misses, 3)
+            self.assertEqual(publisher._statement_cache_hits, 3)
+
+            # 2 node files with different labels, 1 relation file, each published by a worker
+            self.assertEqual(mock_commit.call_count, 3)
+
+    def test_publisher_resume_from_checkpoint(self) -> None:
+        temp_dir = tempfile.mkdtemp()
+        checkpoint_file = os.path.join(temp_dir, 'checkpoint.json')
+        try:
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_session = MagicMock()
+                mock_driver.return_value.session.return_value = mock_session
+
+                mock_transaction = MagicMock()
+                mock_session.begin_transaction.return_value = mock_transaction
+
+                statements = []
+
+                def run(stmt: bytes, parameters: dict) -> MagicMock:
+                    statements.append(stmt)
+                    if len(statements) == 6:
+                        raise RuntimeError('Cluster failover')
+                    return MagicMock()
+
+                mock_transaction.run = MagicMock(side_effect=run)
+
+                conf = ConfigFactory.from_dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                     neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.NEO4J_TRANSACTION_SIZE: 2,
+                     neo4j_csv_publisher.NEO4J_CHECKPOINT_FILE: checkpoint_file,
+                     neo4j_csv_publisher.NEO4J_RESUME_FROM_CHECKPOINT: True,
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: 'publish_tag'}
+                )
+                publisher = Neo4jCsvPublisher()
+                publisher.init(conf)
+                self.assertRaises(RuntimeError, publisher.publish)
+
+                # Committed after 2nd and 4th node row, where the 4th one is not counted yet.
+                first_node_file, second_node_file = publisher._node_files
+                with open(checkpoint_file, 'r') as f:
+                    checkpoint = json.load(f)
+                self.assertEqual(checkpoint['committed_files'], [first_node_file])
+                self.assertEqual(checkpoint['in_progress'], {second_node_file: {'phase': 'merge', 'offset': 1}})
+
+                statements.clear()
+                publisher = Neo4jCsvPublisher()
+                publisher.init(conf)
+                publisher.publish()
+
+                # 1 remaining node row and 2 relation rows
+                self.assertEqual(len(statements), 3)
+                self.assertFalse(os.path.exists(checkpoint_file))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_publisher_unwind_batch_relation_deadlock_on_commit(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver, \
+                patch.object(neo4j_csv_publisher.AdaptiveTransactionSizer, 'on_transient_error',
+                             autospec=True, return_value=50) as mock_on_transient_error:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            batch_sizes = []
+
+            def run(stmt: bytes, parameters: dict) -> MagicMock:
+                if b'MATCH (n1' in stmt:
+                    batch_sizes.append(len(parameters['rows']))
+                return MagicMock()
+
+            def commit() -> None:
+                # Statements are sent on commit, where the deadlock surfaces
+                if batch_sizes == [2]:
+                    raise TransientError('deadlock detected')
+
+            mock_transaction.run = MagicMock(side_effect=run)
+            mock_transaction.commit = MagicMock(side_effect=commit)
+            mock_transaction.closed.return_value = False
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 100,
+                 neo4j_csv_publisher.NEO4J_TRANSACTION_SIZE: 100,
+                 neo4j_csv_publisher.NEO4J_ADAPTIVE_TRANSACTION_SIZE: True,
+                 neo4j_csv_publisher.NEO4J_DEADLOCK_NODE_LABELS: ['Column'],
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            # The batch failed on commit is bisected, and the transient error shrinks the transaction size
+            self.assertEqual(batch_sizes, [2, 1, 1])
+            mock_transaction.rollback.assert_called_once()
+            mock_on_transient_error.assert_called_once()
+
+    def test_commit_failure_discards_uncommitted(self) -> None:
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_session = MagicMock()
+                mock_driver.return_value.session.return_value = mock_session
+
+                publisher = Neo4jCsvPublisher()
+                publisher.init(ConfigFactory.from_dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                     neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.NEO4J_DIFF_SNAPSHOT_FILE: os.path.join(temp_dir, 'snapshot'),
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}))
+
+                tx = MagicMock()
+                tx.closed.return_value = False
+                publisher._execute_statement('MERGE (n)', tx=tx, count=2)
+                publisher._uncommitted_hashes = {'b': 'hash_b'}
+
+                tx.commit.side_effect = TransientError('deadlock detected')
+                self.assertRaises(TransientError, publisher._commit_transaction, tx)
+
+                tx.rollback.assert_called_once()
+                self.assertEqual(publisher._uncommitted_count, 0)
+                # The statements rolled back are not counted, so that they are counted once when retried
+                self.assertEqual(publisher._count, 0)
+                self.assertEqual(publisher._uncommitted_hashes, {})
+
+                # The next commit doesn't record what's failed
+                with patch.object(publisher._snapshot, 'update') as mock_update:
+                    publisher._commit_transaction(MagicMock())
+                    mock_update.assert_called_once_with({})
+                publisher._close_snapshot()
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_publisher_adaptive_transaction_size(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            mock_run = MagicMock()
+            mock_transaction.run = mock_run
+            mock_commit = MagicMock()
+            mock_transaction.commit = mock_commit
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_TRANSACTION_SIZE: 2,
+                 neo4j_csv_publisher.NEO4J_ADAPTIVE_TRANSACTION_SIZE: True,
+                 neo4j_csv_publisher.NEO4J_MIN_TRANSACTION_SIZE: 1,
+                 neo4j_csv_publisher.NEO4J_MAX_TRANSACTION_SIZE: 3,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            self.assertEqual(mock_run.call_count, 6)
+            # Commits after 2nd statement, grows up to the max size, commits after 5th statement and the final commit
+            self.assertEqual(mock_commit.call_count, 3)
+            self.assertEqual(publisher._transaction_size, 3)
+
+    def test_publisher_diff_snapshot(self) -> None:
+        temp_dir = tempfile.mkdtemp()
+        try:
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 10,
+                 neo4j_csv_publisher.NEO4J_DIFF_SNAPSHOT_FILE: os.path.join(temp_dir, 'snapshot'),
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+
+            def publish() -> tuple:
+                with patch.object(GraphDatabase, 'driver') as mock_driver:
+                    mock_session = MagicMock()
+                    mock_driver.return_value.session.return_value = mock_session
+                    mock_transaction = MagicMock()
+                    mock_session.begin_transaction.return_value = mock_transaction
+
+                    publisher = Neo4jCsvPublisher()
+                    publisher.init(conf)
+                    publisher.publish()
+                    return publisher, [call[0][0].decode('utf-8') for call in mock_transaction.run.call_args_list]
+
+            publisher, stmts = publish()
+            self.assertEqual((publisher._unchanged_count, publisher._changed_count), (0, 6))
+            self.assertTrue(all('ON MATCH SET node.name = row.name' in stmt for stmt in stmts[:2]))
+
+            # Nothing changed since the previous publish, only tag and timestamp are set on match
+            publisher, stmts = publish()
+            self.assertEqual((publisher._unchanged_count, publisher._changed_count), (6, 0))
+            self.assertEqual(len(stmts), 3)
+            for stmt in stmts:
+                match_set = stmt.split('ON MATCH SET')[1]
+                self.assertIn('published_tag', match_set)
+                self.assertNotIn('row.name', match_set)
+                # Properties are still set when the node or relationship does not exist
+                self.assertIn('ON CREATE SET', stmt)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_publisher_diff_snapshot_rollback(self) -> None:
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_session = MagicMock()
+                mock_driver.return_value.session.return_value = mock_session
+                mock_transaction = MagicMock()
+                mock_session.begin_transaction.return_value = mock_transaction
+                # Fails on the relation file, after node files are executed but before they're committed
+                mock_transaction.run.side_effect = [MagicMock()] * 5 + [RuntimeError('failed')]
+
+                publisher = Neo4jCsvPublisher()
+                publisher.init(ConfigFactory.from_dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                     neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.NEO4J_DIFF_SNAPSHOT_FILE: os.path.join(temp_dir, 'snapshot'),
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}))
+                self.assertRaises(RuntimeError, publisher.publish)
+
+            # Rolled back rows are not recorded in the snapshot
+            snapshot = Neo4jPublishSnapshot(path=os.path.join(temp_dir, 'snapshot'))
+            node_key = Neo4jCsvPublisher._get_node_snapshot_key({'LABEL': 'Table',
+                                                                 'KEY': 'presto://gold.test_schema1/test_table1'})
+            self.assertIsNone(snapshot.get(node_key))
+            snapshot.close()
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_publisher_compressed_files(self) -> None:
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for sub_dir in ('nodes', 'relations'):
+                os.makedirs(os.path.join(temp_dir, sub_dir))
+                for file_name in os.listdir(os.path.join(self._resource_path, sub_dir)):
+                    with open(os.path.join(self._resource_path, sub_dir, file_name), 'r') as f_input, \
+                            compression.open_text_writer(os.path.join(temp_dir, sub_dir, f'{file_name}.gz'),
+                                                         codec=compression.GZIP) as f_output:
+                        f_output.write(f_input.read())
+
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_session = MagicMock()
+                mock_driver.return_value.session.return_value = mock_session
+
+                mock_transaction = MagicMock()
+                mock_session.begin_transaction.return_value = mock_transaction
+
+                publisher = Neo4jCsvPublisher()
+                publisher.init(ConfigFactory.from_dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.NODE_FILES_DIR: f'{temp_dir}/nodes',
+                     neo4j_csv_publisher.RELATION_FILES_DIR: f'{temp_dir}/relations',
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}))
+                publisher.publish()
+
+                self.assertEqual(mock_transaction.run.call_count, 6)
+                self.assertEqual(publisher.labels, {'Table', 'Column'})
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_publisher_parquet_files(self) -> None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(temp_dir, 'nodes'))
+            writer = parquet.ParquetRowWriter(os.path.join(temp_dir, 'nodes', 'Column_0.parquet'), row_group_size=1)
+            for i in range(3):
+                writer.writerow({'KEY': f'presto://gold.test_schema1/test_table1/test_id{i}', 'name': f'test_id{i}',
+                                 'order_pos:UNQUOTED': i, 'LABEL': 'Column'})
+            writer.close()
+
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_session = MagicMock()
+                mock_driver.return_value.session.return_value = mock_session
+
+                mock_transaction = MagicMock()
+                mock_session.begin_transaction.return_value = mock_transaction
+
+                publisher = Neo4jCsvPublisher()
+                publisher.init(ConfigFactory.from_dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.NODE_FILES_DIR: f'{temp_dir}/nodes',
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 10,
+                     neo4j_csv_publisher.NEO4J_CSV_READ_CHUNK_SIZE: 2,
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}))
+                publisher.publish()
+
+                self.assertEqual(publisher.labels, {'Column'})
+                self.assertEqual(mock_transaction.run.call_count, 1)
+                rows = mock_transaction.run.call_args[1]['parameters']['rows']
+                # Values keep their native types
+                self.assertEqual([row['order_pos'] for row in rows], [0, 1, 2])
+                self.assertEqual(rows[0]['name'], 'test_id0')
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_read_csv_records_in_chunks(self) -> None:
+        publisher = Neo4jCsvPublisher()
+        publisher._csv_read_chunk_size = 1
+
+        records = list(publisher._read_csv_records(f'{self._resource_path}/nodes/test_column.csv'))
+        self.assertEqual(records, [
+            {'KEY': 'presto://gold.test_schema1/test_table1/test_id1', 'name': 'test_id1',
+             'order_pos:UNQUOTED': 1, 'type': 'bigint', 'LABEL': 'Column'},
+            {'KEY': 'presto://gold.test_schema1/test_table1/test_id2', 'name': 'test_id2',
+             'order_pos:UNQUOTED': 2, 'type': 'bigint', 'LABEL': 'Column'},
+        ])
+
+        chunks = list(publisher._read_csv_chunks(f'{self._resource_path}/nodes/test_column.csv',
+                                                 usecols=[neo4j_csv_publisher.NODE_LABEL_KEY]))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(list(chunks[0].columns), [neo4j_csv_publisher.NODE_LABEL_KEY])
+
+    def test_read_records_with_null_marker(self) -> None:
+        publisher = Neo4jCsvPublisher()
+        publisher._csv_read_chunk_size = 10
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            csv_file = os.path.join(temp_dir, 'Person.csv')
+            with open(csv_file, 'w') as f:
+                f.write('"name","job:NULLABLE","KEY","LABEL","pet:NULLABLE","motto"\n'
+                        f'"Taylor","Engineer","person://Taylor","Person","{neo4j_csv_publisher.NULL_MARKER}","a"\n'
+                        f'"Griffin","{neo4j_csv_publisher.NULL_MARKER}","person://Griffin","Person","Lion",'
+                        f'"{neo4j_csv_publisher.NULL_MARKER}"\n')
+
+            # NULL_MARKER is a value as is, unless the column is nullable
+            self.assertEqual(list(publisher._read_csv_records(csv_file)), [
+                {'name': 'Taylor', 'job:NULLABLE': 'Engineer', 'KEY': 'person://Taylor', 'LABEL': 'Person',
+                 'pet:NULLABLE': None, 'motto': 'a'},
+                {'name': 'Griffin', 'job:NULLABLE': None, 'KEY': 'person://Griffin', 'LABEL': 'Person',
+                 'pet:NULLABLE': 'Lion', 'motto': neo4j_csv_publisher.NULL_MARKER},
+            ])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_publisher_unified_csv_types(self) -> None:
+        temp_dir = tempfile.mkdtemp()
+        try:
+            loader = FsNeo4jCSVLoader()
+            loader.init(ConfigFactory.from_dict({
+                FsNeo4jCSVLoader.NODE_DIR_PATH: f'{temp_dir}/nodes',
+                FsNeo4jCSVLoader.RELATION_DIR_PATH: f'{temp_dir}/relations',
+                FsNeo4jCSVLoader.SHOULD_DELETE_CREATED_DIR: False,
+                FsNeo4jCSVLoader.UNIFY_SCHEMA: True,
+            }))
+            loader.load(_Nodes([
+                GraphNode(key='column://col1', label='Column',
+                          attributes={'name': 'col1', 'sort_order': 1, 'is_nullable': True}),
+                GraphNode(key='column://col2', label='Column', attributes={'name': 'col2', 'description': 'foo'}),
+                GraphNode(key='column://col3', label='Column', attributes={'name': 'col3'}),
+            ]))
+            loader.close()
+
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_session = MagicMock()
+                mock_driver.return_value.session.return_value = mock_session
+
+                mock_transaction = MagicMock()
+                mock_session.begin_transaction.return_value = mock_transaction
+
+                publisher = Neo4jCsvPublisher()
+                publisher.init(ConfigFactory.from_dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.NODE_FILES_DIR: f'{temp_dir}/nodes',
+                     neo4j_csv_publisher.RELATION_FILES_DIR: f'{temp_dir}/relations',
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 10,
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}))
+                publisher.publish()
+
+                # Rows of the file are in a single statement regardless of their absent properties
+                mock_transaction.run.assert_called_once()
+                stmt = mock_transaction.run.call_args[0][0].decode('utf-8')
+                self.assertIn('node.sort_order = coalesce(row.sort_order, node.sort_order)', stmt)
+                self.assertIn('node.name = row.name', stmt)
+
+                rows = {row['KEY']: row for row in mock_transaction.run.call_args[1]['parameters']['rows']}
+                # Optional unquoted values keep their types, although the column has NULL_MARKER
+                self.assertEqual(rows['column://col1']['sort_order'], 1)
+                self.assertIsInstance(rows['column://col1']['sort_order'], int)
+                self.assertIs(rows['column://col1']['is_nullable'], True)
+                self.assertEqual(rows['column://col2']['description'], 'foo')
+                self.assertIsNone(rows['column://col2']['sort_order'])
+                self.assertIsNone(rows['column://col3']['description'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_partition_files(self) -> None:
+        groups = Neo4jCsvPublisher._partition_files({
+            'table_column': {('Table', None), ('Column', None)},
+            'user': {('User', None)},
+            'column_tag': {('Column', None), ('Tag', None)},
+            'badge': {('Badge', None)},
+            'tag_badge': {('Tag', None), ('Badge', None)},
+        })
+        self.assertEqual(sorted(sorted(group) for group in groups),
+                         [['badge', 'column_tag', 'table_column', 'tag_badge'], ['user']])
+
+    def test_partition_sharded_files(self) -> None:
+        groups = Neo4jCsvPublisher._partition_files({
+            'column_shard_0': {('Column', 0)},
+            'column_shard_1': {('Column', 1)},
+            'column_description_shard_1': {('Column', 1)},
+            'user_shard_0': {('User', 0)},
+            'user': {('User', None)},
+        })
+        self.assertEqual(sorted(sorted(group) for group in groups),
+                         [['column_description_shard_1', 'column_shard_1'], ['column_shard_0'],
+                          ['user', 'user_shard_0']])
+
+        self.assertEqual(Neo4jCsvPublisher._get_file_shard('/tmp/nodes/Column_0_shard_12.csv.gz'), 12)
+        self.assertIsNone(Neo4jCsvPublisher._get_file_shard('/tmp/shard_1.d/Column_0.csv'))
+
+    def test_get_sharded_relation_units(self) -> None:
+        publisher = Neo4jCsvPublisher()
+        publisher._csv_read_chunk_size = 10
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            file_units = {}
+            for shard in range(2):
+                relation_file = os.path.join(temp_dir, f'Table_Column_COLUMN_shard_{shard}.csv')
+                with open(relation_file, 'w') as f:
+                    f.write('"START_LABEL","END_LABEL","START_KEY","END_KEY","TYPE","REVERSE_TYPE"\n'
+                            f'"Table","Column","table{shard}","column{shard}","COLUMN","COLUMN_OF"\n')
+                file_units[relation_file] = publisher._get_relation_units(relation_file)
+
+            # Only start nodes are partitioned by the shard, thus the end label is a unit as a whole
+            self.assertEqual(sorted(file_units.values()), [{('Table', 0), ('Column', None)},
+                                                           {('Table', 1), ('Column', None)}])
+            self.assertEqual(len(Neo4jCsvPublisher._partition_files(file_units)), 1)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_publisher_unwind_batch_size(self) -> None:
+        publisher = Neo4jCsvPublisher()
+        publisher._unwind_batch_size = 2
+        records = [{'LABEL': 'Table', 'KEY': f'key{i}'} for i in range(5)]
+        records.append({'LABEL': 'Column', 'KEY': 'key5'})
+
+        batches = list(publisher._batch_records(records, key_func=lambda record: record['LABEL']))
+        self.assertEqual([len(batch) for _, batch, _ in batches], [2, 2, 1, 1])
+        self.assertEqual(batches[-1][1][0]['LABEL'], 'Column')
+        # Number of leading records handled once each batch is executed
+        self.assertEqual([handled for _, _, handled in batches], [2, 4, 5, 6])
+
+        records.insert(1, {'LABEL': 'Column', 'KEY': 'key6'})
+        batches = list(publisher._batch_records(records, key_func=lambda record: record['LABEL']))
+        self.assertEqual([handled for _, _, handled in batches], [1, 1, 5, 7])
+
+
+class _PerRelationPreprocessor(object):
+    """
+    A relation preprocessor that doesn't extend RelationPreprocessor, thus has no preprocess_cypher_batch
+    """
+
+    def __init__(self) -> None:
+        self.relations: List[dict] = []
+
+    def preprocess_cypher(self, **relation: str) -> Tuple[str, dict]:
+        self.relations.append(relation)
+        return 'MATCH (f:Foo) RETURN f', {}
+
+    def is_perform_preprocess(self) -> bool:
+        return True
+
+
+class _Nodes(GraphSerializable):
+    def __init__(self, nodes: List[GraphNode]) -> None:
+        self._node_iter = iter(nodes)
+
+    def create_next_node(self) -> Optional[GraphNode]:
+        return next(self._node_iter, None)
+
+    def create_next_relation(self) -> Optional[GraphRelationship]:
+        return None
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -51,6 +51,35 @@ class TestNeo4jPreprocessor(unittest.TestCase):
 
         self.assertEqual(expected, actual)
 
+    def testDeleteRelationPreprocessorBatch(self) -> None:
+        preprocessor = DeleteRelationPreprocessor(label_tuples=[('foo_label', 'bar_label')])
+
+        relations = [{'start_label': 'foo_label', 'end_label': 'bar_label', 'start_key': f'foo_key{i}',
+                      'end_key': f'bar_key{i}', 'relation': 'foo_relation', 'reverse_relation': 'bar_relation'}
+                     for i in range(3)]
+        relations.append({'start_label': 'baz_label', 'end_label': 'bar_label', 'start_key': 'baz_key',
+                          'end_key': 'bar_key', 'relation': 'baz_relation', 'reverse_relation': 'bar_relation'})
+
+        actual = preprocessor.preprocess_cypher_batch(relations)
+
+        # A single statement for the pair of labels, and the relation that is filtered out is not deleted
+        expected = [(textwrap.dedent("""
+    UNWIND $rows AS row
+    MATCH (n1:foo_label {key: row.start_key })-[r]-(n2:bar_label {key: row.end_key })
+
+    WITH row, collect(r)[..2] AS rels
+    FOREACH (r IN rels | DELETE r)
+    RETURN count(*) as count;
+    """), {'rows': [{'start_key': 'foo_key0', 'end_key': 'bar_key0'},
+                    {'start_key': 'foo_key1', 'end_key': 'bar_key1'},
+                    {'start_key': 'foo_key2', 'end_key': 'bar_key2'}]})]
+
+        self.assertEqual(expected, actual)
+
+    def testRelationPreprocessorBatchDefault(self) -> None:
+        preprocessor = NoopRelationPreprocessor()
+        self.assertEqual(preprocessor.preprocess_cypher_batch([]), [])
+
     def testDeleteRelationPreprocessorFilter(self) -> None:
         preprocessor = DeleteRelationPreprocessor(label_tuples=[('foo', 'bar')])
 
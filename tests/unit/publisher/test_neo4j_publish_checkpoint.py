@@ -0,0 +1,54 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from databuilder.publisher.neo4j_publish_checkpoint import (
+    MERGE_PHASE, PREPROCESS_PHASE, Neo4jPublishCheckpoint,
+)
+
+
+class TestNeo4jPublishCheckpoint(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._temp_dir, 'checkpoint.json')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._temp_dir)
+
+    def test_resume(self) -> None:
+        checkpoint = Neo4jPublishCheckpoint(path=self._path, publish_tag='tag')
+        checkpoint.commit(committed_files=[], in_progress_file='nodes/Table_0.csv', offset=10)
+        checkpoint.commit(committed_files=['nodes/Table_0.csv'],
+                          in_progress_file='relations/Table_Column_COLUMN.csv',
+                          phase=PREPROCESS_PHASE)
+
+        resumed = Neo4jPublishCheckpoint(path=self._path, publish_tag='tag', resume=True)
+        self.assertTrue(resumed.is_committed('nodes/Table_0.csv'))
+        self.assertIsNone(resumed.get_progress('nodes/Table_0.csv'))
+        self.assertEqual(resumed.get_progress('relations/Table_Column_COLUMN.csv'), (PREPROCESS_PHASE, 0))
+
+        resumed.remove()
+        self.assertFalse(os.path.exists(self._path))
+
+    def test_resume_different_publish_tag(self) -> None:
+        checkpoint = Neo4jPublishCheckpoint(path=self._path, publish_tag='tag')
+        checkpoint.commit(committed_files=['nodes/Table_0.csv'], in_progress_file='nodes/Column_0.csv', offset=3)
+
+        resumed = Neo4jPublishCheckpoint(path=self._path, publish_tag='another_tag', resume=True)
+        self.assertFalse(resumed.is_committed('nodes/Table_0.csv'))
+        self.assertIsNone(resumed.get_progress('nodes/Column_0.csv'))
+
+        not_resumed = Neo4jPublishCheckpoint(path=self._path, publish_tag='tag')
+        self.assertFalse(not_resumed.is_committed('nodes/Table_0.csv'))
+
+        resumed = Neo4jPublishCheckpoint(path=self._path, publish_tag='tag', resume=True)
+        self.assertEqual(resumed.get_progress('nodes/Column_0.csv'), (MERGE_PHASE, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
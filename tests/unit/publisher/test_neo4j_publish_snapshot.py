@@ -0,0 +1,43 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from databuilder.publisher.neo4j_publish_snapshot import Neo4jPublishSnapshot
+
+
+class TestNeo4jPublishSnapshot(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._temp_dir, 'snapshot')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._temp_dir)
+
+    def test_content_hash(self) -> None:
+        record = {'KEY': 'key1', 'LABEL': 'Table', 'name': 'test_table1', 'order_pos:UNQUOTED': 1}
+        reordered = {'order_pos:UNQUOTED': '1', 'name': 'test_table1', 'LABEL': 'Table', 'KEY': 'key1'}
+        self.assertEqual(Neo4jPublishSnapshot.content_hash(record), Neo4jPublishSnapshot.content_hash(reordered))
+
+        changed = dict(record, name='test_table2')
+        self.assertNotEqual(Neo4jPublishSnapshot.content_hash(record), Neo4jPublishSnapshot.content_hash(changed))
+
+    def test_update(self) -> None:
+        snapshot = Neo4jPublishSnapshot(path=self._path)
+        self.assertIsNone(snapshot.get('key1'))
+        snapshot.update({'key1': 'hash1', 'key2': 'hash2'})
+        snapshot.update({'key2': 'hash3'})
+        snapshot.close()
+
+        reopened = Neo4jPublishSnapshot(path=self._path)
+        self.assertEqual(reopened.get('key1'), 'hash1')
+        self.assertEqual(reopened.get('key2'), 'hash3')
+        reopened.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
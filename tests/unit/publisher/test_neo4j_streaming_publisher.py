@@ -0,0 +1,161 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import unittest
+import uuid
+from typing import Any, List
+
+from mock import MagicMock, patch
+from neo4j import GraphDatabase
+from pyhocon import ConfigFactory, ConfigTree
+
+from databuilder.extractor.base_extractor import Extractor
+from databuilder.job.job import DefaultJob
+from databuilder.loader.neo4j_streaming_loader import Neo4jStreamingLoader
+from databuilder.publisher import neo4j_csv_publisher, neo4j_streaming_publisher
+from databuilder.publisher.neo4j_streaming_publisher import Neo4jStreamingPublisher
+from databuilder.task.task import DefaultTask
+from tests.unit.models.test_graph_serializable import (
+    Actor, City, Movie,
+)
+
+
+class MovieExtractor(Extractor):
+    def init(self, conf: ConfigTree) -> None:
+        self._movies = iter([Movie(f'Movie {i}', [Actor(f'Actor {i}')], [City('San Diego')]) for i in range(5)])
+
+    def extract(self) -> Any:
+        return next(self._movies, None)
+
+    def get_scope(self) -> str:
+        return 'extractor.movie'
+
+
+class FailingExtractor(MovieExtractor):
+    def extract(self) -> Any:
+        raise RuntimeError('Extraction failed')
+
+
+class PartlyFailingExtractor(MovieExtractor):
+    def extract(self) -> Any:
+        record = super(PartlyFailingExtractor, self).extract()
+        if record is None:
+            raise RuntimeError('Extraction failed')
+        return record
+
+
+class TestNeo4jStreamingPublisher(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(level=logging.INFO)
+        self._conf = ConfigFactory.from_dict({
+            f'loader.neo4j_streaming.{Neo4jStreamingLoader.BATCH_SIZE}': 4,
+            f'publisher.neo4j_streaming.{neo4j_csv_publisher.NEO4J_END_POINT_KEY}': 'dummy://999.999.999.999:7687/',
+            f'publisher.neo4j_streaming.{neo4j_csv_publisher.NEO4J_USER}': 'neo4j_user',
+            f'publisher.neo4j_streaming.{neo4j_csv_publisher.NEO4J_PASSWORD}': 'neo4j_password',
+            f'publisher.neo4j_streaming.{neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE}': 100,
+            f'publisher.neo4j_streaming.{neo4j_streaming_publisher.NEO4J_STREAM_QUEUE_SIZE}': 1,
+            f'publisher.neo4j_streaming.{neo4j_csv_publisher.JOB_PUBLISH_TAG}': str(uuid.uuid4()),
+        })
+
+    def test_publish(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+            mock_transaction = MagicMock()
+            mock_transaction.closed.return_value = False
+            mock_session.begin_transaction.return_value = mock_transaction
+            mock_transaction.commit.side_effect = lambda: setattr(mock_transaction.closed, 'return_value', True)
+
+            statements: List[bytes] = []
+            mock_transaction.run.side_effect = lambda stmt, parameters: statements.append(stmt)
+
+            publisher = Neo4jStreamingPublisher()
+            job = DefaultJob(conf=self._conf,
+                             task=DefaultTask(extractor=MovieExtractor(), loader=Neo4jStreamingLoader(publisher)),
+                             publisher=publisher)
+            job.launch()
+
+            self.assertEqual(publisher.labels, {'Movie', 'Actor', 'City'})
+            self.assertEqual(mock_transaction.commit.call_count, 1)
+            mock_transaction.rollback.assert_not_called()
+            # A movie has 3 nodes and 2 relations, thus each batch is a movie. Nodes come before relations per batch.
+            batches = [statements[i:i + 5] for i in range(0, len(statements), 5)]
+            self.assertEqual(len(batches), 5)
+            for batch in batches:
+                self.assertEqual([b'MERGE (node:' in stmt for stmt in batch], [True] * 3 + [False] * 2)
+
+            rows = mock_transaction.run.call_args_list[0][1]['parameters']['rows']
+            self.assertEqual(rows, [{'name': 'Movie 0', 'KEY': 'movie://Movie 0', 'LABEL': 'Movie'}])
+
+    def test_task_failure(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+            mock_transaction = MagicMock()
+            mock_transaction.closed.return_value = False
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            publisher = Neo4jStreamingPublisher()
+            job = DefaultJob(conf=self._conf,
+                             task=DefaultTask(extractor=FailingExtractor(), loader=Neo4jStreamingLoader(publisher)),
+                             publisher=publisher)
+            self.assertRaises(RuntimeError, job.launch)
+
+            mock_transaction.commit.assert_not_called()
+            mock_transaction.rollback.assert_called_once()
+            self.assertFalse(publisher._thread.is_alive())  # type: ignore
+
+    def test_task_failure_with_remaining_records(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+            mock_transaction = MagicMock()
+            mock_transaction.closed.return_value = False
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            # All the records are still in the loader when the extractor fails, and they are not handed off
+            self._conf.put(f'loader.neo4j_streaming.{Neo4jStreamingLoader.BATCH_SIZE}', 100)
+            publisher = Neo4jStreamingPublisher()
+            job = DefaultJob(conf=self._conf,
+                             task=DefaultTask(extractor=PartlyFailingExtractor(),
+                                              loader=Neo4jStreamingLoader(publisher)),
+                             publisher=publisher)
+            with patch.object(publisher, 'put') as mock_put:
+                self.assertRaisesRegex(RuntimeError, 'Extraction failed', job.launch)
+            mock_put.assert_not_called()
+            mock_transaction.run.assert_not_called()
+
+    def test_put_after_abort(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            publisher = Neo4jStreamingPublisher()
+            publisher.init(self._conf.get_config('publisher.neo4j_streaming'))
+            publisher.start()
+            publisher.close()
+
+            self.assertTrue(publisher.is_aborted())
+            self.assertRaises(RuntimeError, publisher.put, [], [])
+
+    def test_publish_failure(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+            mock_transaction = MagicMock()
+            mock_transaction.closed.return_value = False
+            mock_transaction.run.side_effect = RuntimeError('Neo4j is down')
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            publisher = Neo4jStreamingPublisher()
+            job = DefaultJob(conf=self._conf,
+                             task=DefaultTask(extractor=MovieExtractor(), loader=Neo4jStreamingLoader(publisher)),
+                             publisher=publisher)
+            self.assertRaises(RuntimeError, job.launch)
+            mock_transaction.commit.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import unittest
+
+from databuilder.publisher.neo4j_transaction_sizer import AdaptiveTransactionSizer
+
+
+class TestAdaptiveTransactionSizer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._sizer = AdaptiveTransactionSizer(initial_size=500,
+                                               min_size=100,
+                                               max_size=2000,
+                                               target_commit_latency_sec=1.0,
+                                               max_payload_bytes=1000000)
+
+    def test_grow_on_fast_commit(self) -> None:
+        # Growth is bounded by doubling at a time, and by max_size
+        self.assertEqual(self._sizer.on_commit(statements=500, latency_sec=0.1, payload_bytes=1000), 1000)
+        self.assertEqual(self._sizer.on_commit(statements=1000, latency_sec=0.8, payload_bytes=1000), 1250)
+        self.assertEqual(self._sizer.on_commit(statements=1250, latency_sec=0.0, payload_bytes=1000), 2000)
+
+    def test_shrink_on_slow_commit(self) -> None:
+        self.assertEqual(self._sizer.on_commit(statements=500, latency_sec=1.25, payload_bytes=1000), 400)
+        self.assertEqual(self._sizer.on_commit(statements=400, latency_sec=100, payload_bytes=1000), 200)
+        self.assertEqual(self._sizer.on_commit(statements=200, latency_sec=100, payload_bytes=1000), 100)
+
+    def test_shrink_on_large_payload(self) -> None:
+        self.assertEqual(self._sizer.on_commit(statements=500, latency_sec=0.1, payload_bytes=2000000), 250)
+
+    def test_shrink_on_transient_error(self) -> None:
+        self.assertEqual(self._sizer.on_transient_error(), 250)
+        self.assertEqual(self._sizer.on_transient_error(), 125)
+        self.assertEqual(self._sizer.on_transient_error(), 100)
+
+    def test_invalid_bounds(self) -> None:
+        self.assertRaises(Exception, AdaptiveTransactionSizer, initial_size=500, min_size=1000, max_size=100,
+                          target_commit_latency_sec=1.0, max_payload_bytes=1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import unittest
+
+from databuilder.models.graph_node import GraphNode
+from databuilder.models.graph_relationship import GraphRelationship
+from databuilder.serializers import neo4_serializer
+
+
+class TestNeo4Serializer(unittest.TestCase):
+
+    def test_node_values(self) -> None:
+        nodes = [
+            GraphNode(key='table://a', label='Table', attributes={'name': 'a', 'is_view': True, 'order': 1}),
+            GraphNode(key='table://b', label='Table', attributes={'name': 'b', 'is_view': False, 'order': 2}),
+            GraphNode(key='table://c', label='Table', attributes={'name': 'c', 'is_view': 'no', 'order': 3.0}),
+            GraphNode(key='table://d', label='Table', attributes={}),
+        ]
+        for node in nodes:
+            header = neo4_serializer.get_node_header(node)
+            self.assertEqual(dict(zip(header, neo4_serializer.get_node_values(node))),
+                             neo4_serializer.serialize_node(node))
+            self.assertEqual(header, tuple(neo4_serializer.serialize_node(node)))
+
+        # Nodes of the same shape share the header
+        self.assertIs(neo4_serializer.get_node_header(nodes[0]), neo4_serializer.get_node_header(nodes[1]))
+        self.assertIsNot(neo4_serializer.get_node_header(nodes[0]), neo4_serializer.get_node_header(nodes[2]))
+
+    def test_relationship_values(self) -> None:
+        relationship = GraphRelationship(start_label='Table', end_label='Column', start_key='table://a',
+                                         end_key='table://a/col', type='COLUMN', reverse_type='COLUMN_OF',
+                                         attributes={'weight': 2, 'note': 'x'})
+
+        header = neo4_serializer.get_relationship_header(relationship)
+        self.assertEqual(header, tuple(neo4_serializer.serialize_relationship(relationship)))
+        self.assertEqual(dict(zip(header, neo4_serializer.get_relationship_values(relationship))),
+                         neo4_serializer.serialize_relationship(relationship))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,7 @@ import logging
 import shutil
 import tempfile
 import unittest
-from typing import Any
+from typing import Any, List
 
 from mock import patch
 from pyhocon import ConfigFactory, ConfigTree
@@ -14,8 +14,10 @@ from pyhocon import ConfigFactory, ConfigTree
 from databuilder.extractor.base_extractor import Extractor
 from databuilder.job.job import DefaultJob
 from databuilder.loader.base_loader import Loader
+from databuilder.models.table_metadata import TableMetadata
 from databuilder.task.task import DefaultTask
 from databuilder.transformer.base_transformer import Transformer
+from databuilder.utils.dedup import get_dedup_registry
 
 LOGGER = logging.getLogger(__name__)
 
@@ -107,6 +109,48 @@ class TestJobStatsd(unittest.TestCase):
             self.assertEqual(mock_statsd.return_value.incr.call_count, 1)
 
 
+class TestJobDedupRegistry(unittest.TestCase):
+
+    def test_job(self) -> None:
+        # Each job emits the database, cluster and schema nodes once, regardless of the jobs run before
+        for _ in range(2):
+            loader = NodeLabelLoader()
+            job = DefaultJob(ConfigFactory.from_dict({}), DefaultTask(TableExtractor(), loader))
+            job.launch()
+
+            self.assertEqual(loader.labels.count('Database'), 1)
+            self.assertEqual(loader.labels.count('Schema'), 1)
+            self.assertEqual(loader.labels.count('Table'), 2)
+            self.assertEqual(len(job.dedup_registry), 0)
+
+        self.assertIsNot(get_dedup_registry(), job.dedup_registry)
+
+
+class TableExtractor(Extractor):
+    def init(self, conf: ConfigTree) -> None:
+        self.iter = iter([TableMetadata('hive', 'gold', 'test_schema', f'test_table{i}', None) for i in range(2)])
+
+    def extract(self) -> Any:
+        return next(self.iter, None)
+
+    def get_scope(self) -> str:
+        return 'extractor.table'
+
+
+class NodeLabelLoader(Loader):
+    def init(self, conf: ConfigTree) -> None:
+        self.labels: List[str] = []
+
+    def load(self, record: Any) -> None:
+        node = record.next_node()
+        while node:
+            self.labels.append(node.label)
+            node = record.next_node()
+
+    def get_scope(self) -> str:
+        return 'loader.node_label'
+
+
 class SuperHeroExtractor(Extractor):
     def __init__(self) -> None:
         pass
@@ -0,0 +1,59 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from databuilder.utils import compression
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._temp_dir)
+
+    def _round_trip(self, codec: str) -> None:
+        path = os.path.join(self._temp_dir, 'test.csv' + compression.get_extension(codec))
+        content = '"KEY","name"\r\n"key1","multi\nline ü"\r\n'
+        with compression.open_text_writer(path, codec=codec, level=3) as f:
+            f.write(content)
+
+        self.assertEqual(compression.detect_codec(path), codec)
+        with compression.open_text_reader(path) as f:
+            self.assertEqual(f.read(), content)
+
+    def test_gzip(self) -> None:
+        self._round_trip(compression.GZIP)
+
+    def test_zstd(self) -> None:
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            self.skipTest('zstandard is not installed')
+        self._round_trip(compression.ZSTD)
+
+    def test_uncompressed(self) -> None:
+        self._round_trip(None)  # type: ignore
+
+    def test_encoding(self) -> None:
+        for codec in [compression.GZIP, None]:
+            path = os.path.join(self._temp_dir, 'test.csv' + compression.get_extension(codec))
+            with compression.open_text_writer(path, codec=codec) as f:
+                f.write('"name"\r\n"ü"\r\n')
+
+            with compression.open_text_reader(path, encoding='utf8') as f:
+                self.assertEqual(f.read(), '"name"\r\n"ü"\r\n')
+            with compression.open_text_reader(path, encoding='latin-1') as f:
+                self.assertEqual(f.read(), '"name"\r\n"Ã¼"\r\n')
+
+    def test_unsupported_codec(self) -> None:
+        self.assertRaises(Exception, compression.get_extension, 'lzma')
+
+
+if __name__ == '__main__':
+    unittest.main()
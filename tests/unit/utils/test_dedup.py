@@ -0,0 +1,87 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import threading
+import unittest
+
+from databuilder.utils.dedup import (
+    BloomFilter, DedupRegistry, RecordDeduplicator, get_dedup_registry, set_dedup_registry,
+)
+
+
+class TestRecordDeduplicator(unittest.TestCase):
+
+    def test_exact(self) -> None:
+        deduplicator = RecordDeduplicator(max_exact_keys=10, bloom_filter_capacity=10, bloom_filter_error_rate=0.01)
+
+        self.assertFalse(deduplicator.is_duplicate({'LABEL': 'User', 'KEY': 'user1', 'name': 'foo'}))
+        # Same node with different properties is not a duplicate
+        self.assertFalse(deduplicator.is_duplicate({'LABEL': 'User', 'KEY': 'user1', 'name': 'bar'}))
+        self.assertTrue(deduplicator.is_duplicate({'name': 'foo', 'KEY': 'user1', 'LABEL': 'User'}))
+        self.assertFalse(deduplicator.is_duplicate({'LABEL': 'Tag', 'KEY': 'user1', 'name': 'foo'}))
+        self.assertEqual(deduplicator.suppressed_count, 1)
+
+    def test_bloom_filter_fallback(self) -> None:
+        deduplicator = RecordDeduplicator(max_exact_keys=2, bloom_filter_capacity=100, bloom_filter_error_rate=0.0001)
+
+        records = [{'LABEL': 'User', 'KEY': f'user{i}'} for i in range(50)]
+        self.assertFalse(any(deduplicator.is_duplicate(record) for record in records))
+        self.assertTrue(all(deduplicator.is_duplicate(record) for record in records))
+        self.assertEqual(deduplicator.suppressed_count, 50)
+        self.assertEqual(len(deduplicator._exact_keys), 2)
+
+    def test_bloom_filter(self) -> None:
+        bloom_filter = BloomFilter(capacity=2000, error_rate=0.001)
+        digests = [hashlib.sha1(str(i).encode('utf-8')).digest() for i in range(2000)]
+
+        self.assertFalse(any(bloom_filter.add(digest) for digest in digests[:1000]))
+        self.assertTrue(all(bloom_filter.add(digest) for digest in digests[:1000]))
+        false_positives = sum(bloom_filter.add(digest) for digest in digests[1000:])
+        self.assertLess(false_positives, 10)
+
+    def test_invalid_bloom_filter(self) -> None:
+        self.assertRaises(Exception, BloomFilter, capacity=0, error_rate=0.01)
+        self.assertRaises(Exception, BloomFilter, capacity=10, error_rate=1)
+
+
+class TestDedupRegistry(unittest.TestCase):
+
+    def test_is_new(self) -> None:
+        registry = DedupRegistry(max_keys=2)
+
+        self.assertTrue(registry.is_new(('Database', 'database://hive')))
+        self.assertTrue(registry.is_new(('Cluster', 'hive://gold')))
+        self.assertFalse(registry.is_new(('Database', 'database://hive')))
+
+        # The least recently seen key, Cluster, is forgotten beyond max_keys
+        self.assertTrue(registry.is_new(('Schema', 'hive://gold.test_schema')))
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(registry.evicted_count, 1)
+        self.assertFalse(registry.is_new(('Database', 'database://hive')))
+        self.assertTrue(registry.is_new(('Cluster', 'hive://gold')))
+
+        registry.clear()
+        self.assertEqual(len(registry), 0)
+        self.assertTrue(registry.is_new(('Database', 'database://hive')))
+
+    def test_set_dedup_registry(self) -> None:
+        process_registry = get_dedup_registry()
+        registry = DedupRegistry()
+        set_dedup_registry(registry)
+        try:
+            self.assertIs(get_dedup_registry(), registry)
+
+            # Other threads keep using the process-wide registry
+            other_thread_registries = []
+            thread = threading.Thread(target=lambda: other_thread_registries.append(get_dedup_registry()))
+            thread.start()
+            thread.join()
+            self.assertEqual(other_thread_registries, [process_registry])
+        finally:
+            set_dedup_registry(None)
+        self.assertIs(get_dedup_registry(), process_registry)
+
+
+if __name__ == '__main__':
+    unittest.main()
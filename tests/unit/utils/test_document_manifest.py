@@ -0,0 +1,31 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import tempfile
+import unittest
+
+from databuilder.utils.document_manifest import (
+    document_digest, read_manifest, write_manifest,
+)
+
+
+class TestDocumentManifest(unittest.TestCase):
+
+    def test_document_digest(self) -> None:
+        self.assertEqual(document_digest({'key': 'table1', 'tags': ['a', 'b']}),
+                         document_digest({'tags': ['a', 'b'], 'key': 'table1'}))
+        self.assertNotEqual(document_digest({'key': 'table1', 'tags': ['a', 'b']}),
+                            document_digest({'key': 'table1', 'tags': ['b', 'a']}))
+
+    def test_write_and_read(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = f'{tmp_dir}/manifest/table.jsonl'
+            digests = {'hive://gold.schema/table\t1': 'abc', 'hive://gold.schema/täble2': 'def'}
+            write_manifest(path, digests)
+            self.assertEqual(read_manifest(path), digests)
+            self.assertEqual(os.listdir(f'{tmp_dir}/manifest'), ['table.jsonl'])
+
+
+if __name__ == '__main__':
+    unittest.main()
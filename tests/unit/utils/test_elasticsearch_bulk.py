@@ -0,0 +1,130 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import unittest
+from typing import (
+    Any, Dict, List,
+)
+
+from elasticsearch.exceptions import ConnectionError, TransportError
+from mock import MagicMock
+
+from databuilder.utils.elasticsearch_bulk import BulkIndexer
+
+ACTION = {'index': {'_index': 'test_index', '_type': 'table'}}
+
+
+def _bulk_response(statuses: List[int]) -> Dict[str, Any]:
+    return {'errors': any(status >= 300 for status in statuses),
+            'items': [{'index': {'status': status, 'error': 'error' if status >= 300 else None}}
+                      for status in statuses]}
+
+
+class TestBulkIndexer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.mock_client = MagicMock()
+        self.bodies: List[List[Dict]] = []
+
+    def _record_body(self, body: str) -> None:
+        self.bodies.append([json.loads(line) for line in body.splitlines()])
+
+    def test_chunks(self) -> None:
+        def bulk(body: str) -> Dict[str, Any]:
+            self._record_body(body)
+            return _bulk_response([201] * (len(body.splitlines()) // 2))
+
+        self.mock_client.bulk.side_effect = bulk
+        indexer = BulkIndexer(self.mock_client, thread_count=2, chunk_size=2, initial_backoff=0)
+        try:
+            for i in range(5):
+                indexer.add(ACTION, {'key': i} if i % 2 else json.dumps({'key': i}) + '\n')
+            indexer.flush()
+        finally:
+            indexer.close()
+
+        self.assertEqual(sorted(len(body) for body in self.bodies), [2, 4, 4])
+        keys = sorted(line['key'] for body in self.bodies for line in body if 'key' in line)
+        self.assertEqual(keys, list(range(5)))
+        self.assertEqual(indexer.success_count, 5)
+
+    def test_max_chunk_bytes(self) -> None:
+        self.mock_client.bulk.return_value = {'errors': False}
+        indexer = BulkIndexer(self.mock_client, thread_count=1, chunk_size=100, max_chunk_bytes=300)
+        try:
+            for i in range(4):
+                indexer.add(ACTION, {'key': 'x' * 50})
+            indexer.flush()
+        finally:
+            indexer.close()
+
+        self.assertEqual(self.mock_client.bulk.call_count, 2)
+
+    def test_retry(self) -> None:
+        responses = [_bulk_response([201, 429, 503]), _bulk_response([201, 429]), _bulk_response([201])]
+
+        def bulk(body: str) -> Dict[str, Any]:
+            self._record_body(body)
+            return responses.pop(0)
+
+        self.mock_client.bulk.side_effect = bulk
+        indexer = BulkIndexer(self.mock_client, thread_count=1, initial_backoff=0)
+        try:
+            for i in range(3):
+                indexer.add(ACTION, {'key': i})
+            indexer.flush()
+        finally:
+            indexer.close()
+
+        self.assertEqual([[line['key'] for line in body[1::2]] for body in self.bodies], [[0, 1, 2], [1, 2], [2]])
+        self.assertEqual(indexer.success_count, 3)
+        self.assertEqual(indexer.retry_count, 3)
+
+    def test_retry_connection_error(self) -> None:
+        self.mock_client.bulk.side_effect = [ConnectionError('N/A', 'Connection refused', None), {'errors': False}]
+        indexer = BulkIndexer(self.mock_client, thread_count=1, initial_backoff=0)
+        try:
+            indexer.add(ACTION, {'key': 0})
+            indexer.flush()
+        finally:
+            indexer.close()
+
+        self.assertEqual(self.mock_client.bulk.call_count, 2)
+        self.assertEqual(indexer.success_count, 1)
+
+    def test_request_failure(self) -> None:
+        self.mock_client.bulk.side_effect = TransportError(400, 'illegal_argument_exception', None)
+        indexer = BulkIndexer(self.mock_client, thread_count=1, initial_backoff=0)
+        try:
+            indexer.add(ACTION, {'key': 0})
+            self.assertRaises(TransportError, indexer.flush)
+        finally:
+            indexer.close()
+
+        self.assertEqual(self.mock_client.bulk.call_count, 1)
+
+    def test_max_error_ratio(self) -> None:
+        self.mock_client.bulk.return_value = _bulk_response([201, 201, 201, 400])
+
+        indexer = BulkIndexer(self.mock_client, thread_count=1, max_error_ratio=0.25, initial_backoff=0)
+        try:
+            for i in range(4):
+                indexer.add({'index': {**ACTION['index'], '_id': f'id{i}'}}, {'key': i})
+            indexer.flush()
+        finally:
+            indexer.close()
+        self.assertEqual(indexer.error_count, 1)
+        self.assertEqual(indexer.failed_ids, {'id3'})
+
+        indexer = BulkIndexer(self.mock_client, thread_count=1, max_error_ratio=0.1, initial_backoff=0)
+        try:
+            for i in range(4):
+                indexer.add(ACTION, {'key': i})
+            self.assertRaises(Exception, indexer.flush)
+        finally:
+            indexer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
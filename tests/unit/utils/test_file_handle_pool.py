@@ -0,0 +1,75 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from typing import IO
+
+from databuilder.utils import compression
+from databuilder.utils.file_handle_pool import FileHandlePool, PooledDictWriter
+
+
+class TestFileHandlePool(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._dir)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._dir, name)
+
+    @staticmethod
+    def _open(path: str, append: bool) -> IO:
+        return open(path, 'a' if append else 'w')
+
+    def test_eviction_and_append_on_reopen(self) -> None:
+        pool = FileHandlePool(max_open_files=2, opener=self._open)
+
+        pool.get(self._path('a')).write('a1')
+        pool.get(self._path('b')).write('b1')
+        pool.get(self._path('a')).write('a2')
+        # b is the least recently used one
+        pool.get(self._path('c')).write('c1')
+        self.assertEqual(list(pool._open_files), [self._path('a'), self._path('c')])
+        pool.get(self._path('b')).write('b2')
+        pool.close()
+
+        for name, expected in [('a', 'a1a2'), ('b', 'b1b2'), ('c', 'c1')]:
+            with open(self._path(name)) as f:
+                self.assertEqual(f.read(), expected)
+
+        self.assertEqual(pool.open_count, 4)
+        self.assertEqual(pool.reopen_count, 1)
+        self.assertEqual(pool.evict_count, 2)
+        self.assertFalse(pool._open_files)
+
+    def test_invalid_max_open_files(self) -> None:
+        self.assertRaises(Exception, FileHandlePool, max_open_files=0, opener=self._open)
+
+    def test_pooled_dict_writer(self) -> None:
+        def opener(path: str, append: bool) -> IO:
+            return compression.open_text_writer(path, codec=compression.GZIP, append=append)
+
+        pool = FileHandlePool(max_open_files=1, opener=opener)
+        writers = [PooledDictWriter(pool, self._path(f'{i}.csv.gz'), fieldnames=['KEY', 'name']) for i in range(3)]
+        for writer in writers:
+            writer.writeheader()
+        for i in range(10):
+            for writer in writers:
+                writer.writerow({'KEY': str(i), 'name': f'name{i}'})
+        pool.close()
+
+        for i in range(3):
+            with compression.open_text_reader(self._path(f'{i}.csv.gz')) as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(rows, [{'KEY': str(i), 'name': f'name{i}'} for i in range(10)])
+        self.assertEqual(pool.evict_count, 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
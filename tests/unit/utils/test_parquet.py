@@ -0,0 +1,83 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import shutil
+import tempfile
+import unittest
+from typing import (
+    Any, Dict, List,
+)
+
+from mock import patch
+
+from databuilder.utils import parquet
+
+
+class TestParquetRowWriter(unittest.TestCase):
+
+    def setUp(self) -> None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        self._temp_dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._temp_dir, 'test.parquet')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._temp_dir)
+
+    def _write(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        writer = parquet.ParquetRowWriter(self._path, row_group_size=2)
+        for row in rows:
+            writer.writerow(row)
+        writer.close()
+
+        self.assertTrue(parquet.is_parquet(self._path))
+        return [record for batch in parquet.iter_record_batches(self._path, batch_size=10)
+                for record in batch.to_pylist()]
+
+    def test_write_rows(self) -> None:
+        rows = [{'KEY': f'key{i}', 'order_pos:UNQUOTED': i} for i in range(5)]
+        self.assertEqual(self._write(rows), rows)
+
+    def test_promote_int_to_double(self) -> None:
+        records = self._write([{'KEY': 'key1', 'value': 1},
+                               {'KEY': 'key2', 'value': 2},
+                               {'KEY': 'key3', 'value': 1.5}])
+        self.assertEqual([record['value'] for record in records], [1.0, 2.0, 1.5])
+
+    def test_promote_null(self) -> None:
+        records = self._write([{'KEY': 'key1', 'is_view': None},
+                               {'KEY': 'key2', 'is_view': None},
+                               {'KEY': 'key3', 'is_view': True},
+                               {'KEY': 'key4', 'is_view': None},
+                               {'KEY': 'key5', 'is_view': False}])
+        self.assertEqual([record['is_view'] for record in records], [None, None, True, None, False])
+
+    def test_rewrite_in_batches(self) -> None:
+        writer = parquet.ParquetRowWriter(self._path, row_group_size=2)
+        for i in range(6):
+            writer.writerow({'KEY': f'key{i}', 'value': i})
+        with patch.object(parquet, 'iter_record_batches', wraps=parquet.iter_record_batches) as mock_iter:
+            writer.writerow({'KEY': 'key6', 'value': 6.5})
+            writer.close()
+
+        # The row groups written so far are read back one at a time, and the moved file is removed
+        mock_iter.assert_called_once()
+        self.assertEqual(mock_iter.call_args[1]['batch_size'], 2)
+        self.assertEqual(os.listdir(self._temp_dir), ['test.parquet'])
+        records = [record for batch in parquet.iter_record_batches(self._path, batch_size=10)
+                   for record in batch.to_pylist()]
+        self.assertEqual([record['value'] for record in records], [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.5])
+
+    def test_incompatible_types(self) -> None:
+        writer = parquet.ParquetRowWriter(self._path, row_group_size=2)
+        writer.writerow({'KEY': 'key1', 'value': 1})
+        writer.writerow({'KEY': 'key2', 'value': 2})
+        writer.writerow({'KEY': 'key3', 'value': 'three'})
+        self.assertRaises(TypeError, writer.close)
+
+
+if __name__ == '__main__':
+    unittest.main()